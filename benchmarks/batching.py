@@ -0,0 +1,84 @@
+"""
+Throughput benchmark: per-message XADD/XACK vs. pipelined batch mode in BaseAgent.
+
+Runs a pass-through agent (1 XADD per input, like a specialist) against the
+Redis configured in the environment (REDIS_HOST / REDIS_PORT) and prints
+messages/sec for each mode.
+
+    uv run python -m benchmarks.batching --messages 5000
+"""
+import contextlib
+import io
+import time
+import click
+
+from src.agents.base import BaseAgent
+from src.core.redis_client import RedisClient
+
+BENCH_INPUT = "bench.batching.in"
+BENCH_OUTPUT = "bench.batching.out"
+BENCH_GROUP = "bench-group"
+
+
+class PassThroughAgent(BaseAgent):
+    """Forwards every message to BENCH_OUTPUT and stops after `expected` messages."""
+
+    def __init__(self, expected, fanout, **agent_kwargs):
+        super().__init__(BENCH_INPUT, BENCH_GROUP, "bench-1", **agent_kwargs)
+        self.expected = expected
+        self.fanout = fanout
+        self.processed = 0
+
+    def process_message(self, message_id, data):
+        for _ in range(self.fanout):
+            self.emit(BENCH_OUTPUT, data)
+        self.processed += 1
+        if self.processed >= self.expected:
+            self.stop()
+
+
+def seed(r, messages):
+    r.delete(BENCH_INPUT, BENCH_OUTPUT)
+    pipe = r.pipeline(transaction=False)
+    for i in range(messages):
+        pipe.xadd(BENCH_INPUT, {"doc_id": "bench", "chunk_id": f"p-{i}", "text": "x" * 200})
+    pipe.execute()
+
+
+def run_mode(r, messages, fanout, **agent_kwargs):
+    seed(r, messages)
+
+    # Agents log every message; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = PassThroughAgent(messages, fanout, **agent_kwargs)
+        start = time.perf_counter()
+        agent.run()
+        elapsed = time.perf_counter() - start
+
+    assert r.xlen(BENCH_OUTPUT) == messages * fanout
+    return messages / elapsed
+
+
+@click.command()
+@click.option("--messages", default=2000, help="Messages per run")
+@click.option("--fanout", default=1, help="XADDs per message (4 mimics the coordinator)")
+@click.option("--batch-size", default=100, help="Batch size for the batched runs")
+@click.option("--flush-interval", default=0.05, help="Flush interval for the batched runs (s)")
+def main(messages, fanout, batch_size, flush_interval):
+    r = RedisClient.get_instance()
+    modes = [
+        ("unbatched", dict(batched=False, batch_size=10)),
+        ("batched", dict(batched=True, batch_size=batch_size, flush_interval=flush_interval)),
+        ("batched+multi", dict(batched=True, transactional=True, batch_size=batch_size, flush_interval=flush_interval)),
+    ]
+
+    print(f"{'mode':<16}{'msgs/sec':>12}")
+    try:
+        for name, kwargs in modes:
+            print(f"{name:<16}{run_mode(r, messages, fanout, **kwargs):>12.0f}")
+    finally:
+        r.delete(BENCH_INPUT, BENCH_OUTPUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Chunking benchmark: one chunk per paragraph vs. the token-aware chunker.
+
+Builds a large synthetic .docx (headings, many short paragraphs and some very
+long ones), then prints chunk count, chunk size spread in estimated tokens and
+parse+chunk throughput for each strategy. Needs no Redis.
+
+    uv run python -m benchmarks.chunking --paragraphs 20000
+"""
+import os
+import random
+import tempfile
+import time
+import click
+from docx import Document
+
+from src.ingestion.chunking import Chunk, chunk_paragraphs, estimate_tokens
+from src.ingestion.producer import iter_docx_paragraphs
+
+WORDS = "the a mesh agent stream review chunk token document paragraph sentence redis consumer group".split()
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))).capitalize() + "."
+
+
+def build_docx(path, paragraphs, seed=7):
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 200 == 0:
+            doc.add_heading(f"Section {i // 200}", level=1)
+        # Mostly one-liners, with the occasional wall of text
+        sentences = rng.randint(60, 120) if rng.random() < 0.02 else rng.randint(1, 3)
+        doc.add_paragraph(" ".join(sentence(rng) for _ in range(sentences)))
+    doc.save(path)
+
+
+def per_paragraph(path):
+    for p in iter_docx_paragraphs(path):
+        yield Chunk(p.text, p.offset, p.offset + len(p.text), 0, 0, tokens=estimate_tokens(p.text))
+
+
+def measure(chunks):
+    start = time.perf_counter()
+    sizes = [chunk.tokens for chunk in chunks]
+    elapsed = time.perf_counter() - start
+    return len(sizes), min(sizes), sum(sizes) / len(sizes), max(sizes), elapsed
+
+
+@click.command()
+@click.option("--paragraphs", default=20000, help="Body paragraphs in the synthetic document")
+@click.option("--target-tokens", default=None, type=int, help="Chunker target (default CHUNK_TARGET_TOKENS)")
+@click.option("--max-tokens", default=None, type=int, help="Chunker max (default CHUNK_MAX_TOKENS)")
+def main(paragraphs, target_tokens, max_tokens):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.docx")
+        build_docx(path, paragraphs)
+        print(f"synthetic docx: {paragraphs} paragraphs, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        strategies = [
+            ("per-paragraph", lambda: per_paragraph(path)),
+            ("token-aware", lambda: chunk_paragraphs(iter_docx_paragraphs(path), target_tokens, max_tokens)),
+        ]
+        print(f"{'strategy':<16}{'chunks':>10}{'min':>8}{'mean':>8}{'max':>8}{'paras/sec':>12}")
+        for name, chunks in strategies:
+            count, low, mean, high, elapsed = measure(chunks())
+            print(f"{name:<16}{count:>10}{low:>8}{mean:>8.0f}{high:>8}{paragraphs / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Memory report: Redis MEMORY USAGE of one large document with inline payloads vs. claim-check.
+
+Pushes a synthetic document through the coordinator, the four specialists and the
+aggregator in-process (calling their handlers directly, without the simulated model
+latency or the suggestion cache), then sums the memory the run added to each stream
+plus the document's payload and aggregation keys. The entries and keys it added are
+removed afterwards.
+
+Needs a real Redis (MEMORY USAGE); run it against an idle instance, or point
+REDIS_DB at a scratch database, since it writes to the mesh streams.
+
+    uv run python -m benchmarks.claim_check --paragraphs 2000
+"""
+import contextlib
+import io
+import random
+import click
+import shortuuid
+
+from src.agents.aggregator import AggregatorAgent
+from src.agents.coordinator import CoordinatorAgent
+from src.agents.routing import Router
+from src.agents.specialists import SPECIALTIES, SpecialistAgent, review_chunk
+from src.core.codec import decode_entries
+from src.core.documents import open_docs_key, register_document, meta_key, results_key, chunks_key, routes_key, retracted_key
+from src.core.redis_client import RedisClient, STREAM_DOC_TASKS, STREAM_REVIEW_SUMMARY, stream_for, physical_streams
+from src.ingestion.chunking import chunk_paragraphs, paragraphs_from_text
+from src.ingestion.diffing import new_chunk_id
+from src.ingestion.producer import send_chunks
+
+WORDS = "the a mesh agent stream review chunk token document paragraph sentence redis consumer group".split()
+
+
+def synthetic_text(paragraphs, seed=11):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(paragraphs):
+        sentences = (" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                     for _ in range(rng.randint(2, 6)))
+        lines.append(" ".join(sentences))
+    return "\n".join(lines)
+
+
+def all_streams():
+    streams = [STREAM_DOC_TASKS, STREAM_REVIEW_SUMMARY]
+    for input_stream, output_stream, _ in SPECIALTIES.values():
+        streams += [input_stream, output_stream]
+    return [physical for stream in streams for physical in physical_streams(stream)]
+
+
+def last_ids(r, streams):
+    ids = {}
+    for stream in streams:
+        entries = decode_entries(RedisClient.get_binary_instance().xrevrange(stream, count=1))
+        ids[stream] = entries[0][0] if entries else "0"
+    return ids
+
+
+def new_entries(r, stream, after, doc_id):
+    # Read raw: entries may be packed by the codec (MESH_CODEC=msgpack)
+    entries = decode_entries(RedisClient.get_binary_instance().xrange(stream, min=f"({after}" if after != "0" else "-"))
+    return [(i, d) for i, d in entries if d.get("doc_id") == doc_id]
+
+
+def stream_memory(r, streams):
+    return {stream: r.memory_usage(stream, samples=0) or 0 for stream in streams}
+
+
+def run_document(r, text, claim_check):
+    doc_id = f"mem-{shortuuid.uuid()[:8]}"
+    chunks = [(new_chunk_id(), chunk) for chunk in chunk_paragraphs(paragraphs_from_text(text))]
+
+    pipe = r.pipeline()
+    register_document(pipe, doc_id, [(chunk_id, "", c.start, c.end) for chunk_id, c in chunks])
+    pipe.execute()
+    send_chunks(r, doc_id, chunks, claim_check=claim_check)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        coordinator = CoordinatorAgent(router=Router())
+        coordinator.cache = None
+        for message_id, data in new_entries(r, stream_for(STREAM_DOC_TASKS, doc_id), "0", doc_id):
+            coordinator.process_message(message_id, data)
+
+        for specialty, (input_stream, output_stream, group) in SPECIALTIES.items():
+            agent = SpecialistAgent(specialty, input_stream, output_stream, group, f"{specialty}-mem", claim_check=claim_check)
+            for _, data in new_entries(r, stream_for(input_stream, doc_id), "0", doc_id):
+                agent.emit(output_stream, review_chunk(specialty, agent.consumer_name, data, agent.payloads, None, claim_check))
+
+        aggregator = AggregatorAgent(consumer_name="aggregator-mem")
+        for _, output_stream, _ in SPECIALTIES.values():
+            for message_id, data in new_entries(r, stream_for(output_stream, doc_id), "0", doc_id):
+                aggregator.process_message(message_id, data, output_stream)
+
+    return doc_id, len(chunks)
+
+
+def cleanup(r, streams, before, doc_id, payload_keys):
+    for stream in streams:
+        ids = [i for i, _ in new_entries(r, stream, before[stream], doc_id)]
+        if ids:
+            r.xdel(stream, *ids)
+    keys = [meta_key(doc_id), results_key(doc_id), chunks_key(doc_id), routes_key(doc_id), retracted_key(doc_id)]
+    r.delete(*keys, *payload_keys)
+    r.zrem(open_docs_key(doc_id), doc_id)
+
+
+def measure(r, text, claim_check):
+    streams = all_streams()
+    before_ids = last_ids(r, streams)
+    before = stream_memory(r, streams)
+
+    doc_id, chunk_count = run_document(r, text, claim_check)
+
+    after = stream_memory(r, streams)
+    usage = {stream: after[stream] - before[stream] for stream in streams}
+
+    payload_keys = set()
+    for stream in streams:
+        for _, data in new_entries(r, stream, before_ids[stream], doc_id):
+            payload_keys.update(v for k, v in data.items() if k.endswith("_ref"))
+    usage["payload:*"] = sum(r.memory_usage(key, samples=0) or 0 for key in payload_keys)
+    usage["doc:{id}:*"] = sum(r.memory_usage(key, samples=0) or 0
+                             for key in (meta_key(doc_id), results_key(doc_id), chunks_key(doc_id), routes_key(doc_id)))
+
+    cleanup(r, streams, before_ids, doc_id, payload_keys)
+    return chunk_count, usage
+
+
+@click.command()
+@click.option("--paragraphs", default=2000, help="Paragraphs in the synthetic document")
+def main(paragraphs):
+    r = RedisClient.get_instance()
+    text = synthetic_text(paragraphs)
+    print(f"document: {paragraphs} paragraphs, {len(text) / 1e6:.2f} MB of text")
+
+    chunk_count, inline = measure(r, text, claim_check=False)
+    _, claim_check = measure(r, text, claim_check=True)
+    print(f"chunks: {chunk_count}\n")
+
+    print(f"{'key':<28}{'inline KB':>12}{'claim-check KB':>16}")
+    for key in inline:
+        print(f"{key:<28}{inline[key] / 1024:>12.0f}{claim_check[key] / 1024:>16.0f}")
+    total_inline, total_claim = sum(inline.values()), sum(claim_check.values())
+    print(f"{'total':<28}{total_inline / 1024:>12.0f}{total_claim / 1024:>16.0f}")
+    print(f"\nclaim-check uses {total_claim / total_inline:.0%} of the inline footprint")
+
+
+if __name__ == "__main__":
+    main()
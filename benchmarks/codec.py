@@ -0,0 +1,75 @@
+"""
+Codec benchmark: flat string fields vs. the packed msgpack entry.
+
+Encodes and decodes the three message kinds the mesh exchanges (a chunk task, a
+specialist suggestion and a document summary) with each codec and prints the
+encoded size (field names + values, as sent in the XADD) and encode / decode time
+per message. Decoding includes validating the pydantic model. Needs no Redis.
+
+    uv run python -m benchmarks.codec --suggestions 200
+"""
+import time
+import click
+
+from src.core.codec import encode, decode, decode_model, decode_summary, summary_message
+from src.core.models import DocumentChunk, Suggestion, ReviewSummary, ProcessingStatus
+
+TEXT = ("Redis Streams give every agent its own consumer group, so chunks fan out to the "
+        "specialists and their suggestions are gathered again by the aggregator. ") * 4
+
+
+def chunk_message():
+    chunk = DocumentChunk(doc_id="doc-bench", chunk_id="c1f0a2b3", text=TEXT)
+    return chunk.model_dump(mode="json") | {
+        "start": 1024, "end": 1024 + len(TEXT), "paragraphs": "3-5", "heading": "Overview",
+        "tokens": 148, "heading_only": "0", "timestamp": time.time(),
+    }
+
+
+def suggestion(i=0):
+    return Suggestion(
+        doc_id="doc-bench", chunk_id=f"chunk-{i}", type="grammar", original_text=TEXT[:50] + "...",
+        suggested_text=TEXT + "\n[AI SERVICE: GRAMMAR DONE]", explanation="This is a dummy explanation from the grammar agent.",
+        source_agent="grammar-1", start=i * 600, end=i * 600 + len(TEXT),
+    )
+
+
+def summary(suggestions):
+    return summary_message(ReviewSummary(
+        doc_id="doc-bench", total_chunks=suggestions, processed_chunks=suggestions,
+        suggestions=[suggestion(i) for i in range(suggestions)], status=ProcessingStatus.COMPLETED,
+    ), time.time())
+
+
+def size(fields):
+    as_bytes = lambda v: v if isinstance(v, bytes) else str(v).encode("utf-8")
+    return sum(len(as_bytes(k)) + len(as_bytes(v)) for k, v in fields.items())
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+@click.command()
+@click.option("--suggestions", default=200, help="Suggestions in the benchmarked summary")
+@click.option("--repeat", default=2000, help="Iterations per measurement (a tenth of it for summaries)")
+def main(suggestions, repeat):
+    cases = [
+        ("chunk", chunk_message(), decode, repeat),
+        ("suggestion", suggestion(), lambda f: decode_model(Suggestion, f), repeat),
+        (f"summary[{suggestions}]", summary(suggestions), decode_summary, max(1, repeat // 10)),
+    ]
+    print(f"{'message':<16}{'codec':<9}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+    for name, message, decoder, n in cases:
+        for codec in ("flat", "msgpack"):
+            fields = encode(message, codec)
+            encode_us = timed(lambda: encode(message, codec), n)
+            decode_us = timed(lambda: decoder(fields), n)
+            print(f"{name:<16}{codec:<9}{size(fields):>10}{encode_us:>12.1f}{decode_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
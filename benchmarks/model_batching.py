@@ -0,0 +1,100 @@
+"""
+Throughput benchmark: one model call per chunk vs. micro-batched specialist inference.
+
+Runs a BatchedSpecialistAgent against the fake backend (fixed overhead + per-chunk
+cost per call, no real model) with increasing --model-batch sizes, over the same
+seeded input stream, and prints chunks/sec, model calls and the average chunk
+latency (entry written to suggestion posted) for each. Uses the Redis configured
+in the environment and its own bench.* streams.
+
+    uv run python -m benchmarks.model_batching --chunks 200 --overhead-ms 100 --item-ms 10
+"""
+import contextlib
+import io
+import time
+import click
+
+from src.agents.inference import FakeBackend
+from src.agents.specialists import BatchedSpecialistAgent
+from src.core.redis_client import RedisClient
+
+BENCH_INPUT = "bench.inference.in"
+BENCH_OUTPUT = "bench.inference.out"
+BENCH_GROUP = "bench-group"
+
+
+class CountingBackend(FakeBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def review(self, specialty, texts):
+        self.calls += 1
+        return super().review(specialty, texts)
+
+
+class BenchSpecialist(BatchedSpecialistAgent):
+    """Grammar-like specialist on the bench streams that stops after `expected` chunks."""
+
+    def __init__(self, expected, **agent_kwargs):
+        super().__init__("grammar", BENCH_INPUT, BENCH_OUTPUT, BENCH_GROUP, "bench-1", **agent_kwargs)
+        self.cache = None
+        self.expected = expected
+        self.posted = 0
+
+    def run_batch(self):
+        size = len(self._batch)
+        super().run_batch()
+        self.posted += size
+        if self.posted >= self.expected:
+            self.stop()
+
+
+def seed(r, chunks):
+    r.delete(BENCH_INPUT, BENCH_OUTPUT)
+    pipe = r.pipeline(transaction=False)
+    for i in range(chunks):
+        pipe.xadd(BENCH_INPUT, {"doc_id": "bench", "chunk_id": f"p-{i}", "text": "x" * 200})
+    pipe.execute()
+
+
+def run_size(r, chunks, model_batch, wait_ms, overhead_ms, item_ms):
+    seed(r, chunks)
+    backend = CountingBackend(overhead_ms=overhead_ms, item_ms=item_ms)
+
+    # Agents log every message; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = BenchSpecialist(chunks, max_batch=model_batch, max_wait_ms=wait_ms, backend=backend, claim_check=False)
+        start = time.perf_counter()
+        agent.run()
+        elapsed = time.perf_counter() - start
+
+    # All chunks were written up front: the mean latency includes waiting for earlier batches
+    outputs = RedisClient.get_binary_instance().xrange(BENCH_OUTPUT)
+    assert len(outputs) == chunks
+    written = [int(message_id.split(b"-")[0]) for message_id, _ in outputs]
+    seeded = int(RedisClient.get_binary_instance().xrange(BENCH_INPUT, count=1)[0][0].split(b"-")[0])
+    latency = sum(ms - seeded for ms in written) / chunks
+    return chunks / elapsed, backend.calls, latency
+
+
+@click.command()
+@click.option("--chunks", default=200, help="Chunks per run")
+@click.option("--sizes", default="1,4,16,32", help="Comma-separated --model-batch sizes to compare")
+@click.option("--wait-ms", default=50.0, help="Max wait for a partial batch (ms)")
+@click.option("--overhead-ms", default=100.0, help="Fake backend: fixed cost per call (ms)")
+@click.option("--item-ms", default=10.0, help="Fake backend: cost per chunk in a call (ms)")
+def main(chunks, sizes, wait_ms, overhead_ms, item_ms):
+    r = RedisClient.get_instance()
+    print(f"fake backend: {overhead_ms:.0f} ms per call + {item_ms:.0f} ms per chunk, {chunks} chunks\n")
+    print(f"{'model batch':<14}{'chunks/sec':>12}{'calls':>8}{'avg latency ms':>16}")
+    try:
+        for size in (int(s) for s in sizes.split(",")):
+            rate, calls, latency = run_size(r, chunks, size, wait_ms, overhead_ms, item_ms)
+            print(f"{size:<14}{rate:>12.1f}{calls:>8}{latency:>16.0f}")
+    finally:
+        r.delete(BENCH_INPUT, BENCH_OUTPUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 import json
-from src.core.redis_client import RedisClient
+from src.core.codec import decode, decode_summary
+from src.core.redis_client import RedisClient, STREAM_REVIEW_SUMMARY, physical_streams
 
-r = RedisClient.get_instance()
-messages = r.xrevrange("doc.review.summary", count=5)
+# Entries may be packed (binary), so read them raw and let the codec decode either format
+r = RedisClient.get_binary_instance()
+# Latest 5 summaries across every partition of the summary stream
+messages = [entry for stream in physical_streams(STREAM_REVIEW_SUMMARY) for entry in r.xrevrange(stream, count=5)]
+messages = sorted(messages, key=lambda entry: tuple(map(int, entry[0].split(b"-"))), reverse=True)[:5]
 
-for msg_id, data in messages:
-    print(f"ID: {msg_id}")
-    raw_data = data.get('data')
-    if raw_data:
-        inner_data = json.loads(raw_data)
+for msg_id, fields in messages:
+    print(f"ID: {msg_id.decode()}")
+    summary = decode_summary(fields)
+    if summary:
+        print(f"  Document: {summary.doc_id} ({summary.status.value})")
+        print(f"  Chunks: {summary.processed_chunks}/{summary.total_chunks}")
+        for suggestion in summary.suggestions:
+            print(f"    [{suggestion.type.value}/{suggestion.severity}] {suggestion.source_agent}: "
+                  f"{suggestion.suggested_text[:60]!r}")
+    elif "data" in (data := decode(fields)):
+        # Per-suggestion entries written by older aggregators
+        inner_data = json.loads(data["data"])
         print(f"  Source: {inner_data.get('source_agent')}")
         print(f"  Suggested: {inner_data.get('suggested_text')}")
     else:
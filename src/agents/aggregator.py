@@ -1,7 +1,10 @@
+import os
 import time
 import json
 import redis
 from .base import BaseAgent
+from src.core.documents import DocumentStore
+from src.core.models import Suggestion, ProcessingStatus
 from src.core.redis_client import (
     RedisClient,
     STREAM_SUGGESTIONS_GRAMMAR,
@@ -12,81 +15,72 @@ from src.core.redis_client import (
     GROUP_AGGREGATOR
 )
 
+# How often the aggregator looks for documents whose results stopped arriving
+TIMEOUT_CHECK_INTERVAL = float(os.getenv("AGGREGATOR_TIMEOUT_CHECK_INTERVAL", 10))
+
 class AggregatorAgent(BaseAgent):
-    def __init__(self, consumer_name="aggregator-1"):
-        # We don't use the single stream init of BaseAgent fully, but we call super to get redis client
-        # Pass dummy stream/group to super to avoid errors? No, BaseAgent init does creating group.
-        # We'll just init with one stream, and then add the others.
+    # The last stage: time since upload is the end-to-end latency of each result
+    end_to_end = True
+
+    def __init__(self, consumer_name="aggregator-1", **agent_kwargs):
+        # BaseAgent sets up the group on the first stream; the others are added below
+        # and the shared run loop reads all of them in one XREADGROUP.
         super().__init__(
-            stream_name=STREAM_SUGGESTIONS_GRAMMAR, 
-            consumer_group=GROUP_AGGREGATOR, 
-            consumer_name=consumer_name
+            stream_name=STREAM_SUGGESTIONS_GRAMMAR,
+            consumer_group=GROUP_AGGREGATOR,
+            consumer_name=consumer_name,
+            **agent_kwargs
         )
-        
+
         self.input_streams = [
             STREAM_SUGGESTIONS_GRAMMAR,
             STREAM_SUGGESTIONS_CLARITY,
             STREAM_SUGGESTIONS_TONE,
             STREAM_SUGGESTIONS_STRUCTURE
         ]
-        
+
         # Ensure groups exist for all input streams
         for stream in self.input_streams:
             if stream == STREAM_SUGGESTIONS_GRAMMAR: continue # Already done by super
-            try:
-                self.redis_client.xgroup_create(stream, self.consumer_group, id="0", mkstream=True)
-                print(f"[{self.consumer_name}] Created consumer group '{self.consumer_group}' on '{stream}'")
-            except redis.exceptions.ResponseError as e:
-                if "BUSYGROUP" in str(e):
-                    pass
-                else:
-                    raise e
-                    
+            self.ensure_group(stream)
+
+        # State lives in Redis, so replicas share it and a restart loses nothing
+        self.store = DocumentStore(self.redis_client)
+        self._last_timeout_check = 0.0
+
     def run(self):
         print(f"[{self.consumer_name}] Aggregator Starting up... Listening on {self.input_streams}")
-        
-        streams_dict = {stream: ">" for stream in self.input_streams}
+        super().run()
 
-        while self.should_run:
-            try:
-                messages = self.redis_client.xreadgroup(
-                    groupname=self.consumer_group,
-                    consumername=self.consumer_name,
-                    streams=streams_dict,
-                    count=10,
-                    block=2000,
-                )
-
-                if messages:
-                    for stream, msgs in messages:
-                        for message_id, data in msgs:
-                            print(f"[{self.consumer_name}] Received suggestion from {stream} (ID: {message_id})")
-                            
-                            try:
-                                self.process_message(message_id, data, stream)
-                                self.redis_client.xack(stream, self.consumer_group, message_id)
-                            except Exception as e:
-                                print(f"[{self.consumer_name}] Error processing {message_id}: {e}")
-                                continue
-            except Exception as e:
-                print(f"[{self.consumer_name}] Critical error: {e}")
-                time.sleep(1)
+    def dispatch(self, stream, message_id, data):
+        print(f"[{self.consumer_name}] Received suggestion from {stream} (ID: {message_id})")
+        self.process_message(message_id, data, stream)
 
     def process_message(self, message_id, data, source_stream):
         """
-        Aggregate suggestions.
-        For now, we just format them and push to the final summary stream.
+        Aggregate suggestions per document.
+        Each result is recorded in the document's Redis state (before the ACK), and a single
+        ReviewSummary is emitted once all chunks x specialties have reported.
         """
-        doc_id = data.get("doc_id", "unknown")
-        # In a real system, we might buffer these by doc_id and release a batch.
-        # Here, we stream them to the final output immediately.
-        
-        summary_payload = {
-            "type": "final_suggestion",
-            "original_stream": source_stream,
-            "data": json.dumps(data) if not isinstance(data, str) else data,
-            "processed_at": time.time()
-        }
-        
-        self.redis_client.xadd(STREAM_REVIEW_SUMMARY, summary_payload)
-        print(f"[{self.consumer_name}] -> Pushed to {STREAM_REVIEW_SUMMARY}")
+        suggestion = Suggestion(**{k: v for k, v in data.items() if k in Suggestion.model_fields})
+
+        if self.store.record(suggestion):
+            self.emit_summary(suggestion.doc_id, ProcessingStatus.COMPLETED)
+
+    def emit_summary(self, doc_id, status):
+        summary = self.store.finalize(doc_id, status)
+        if summary:
+            print(f"[{self.consumer_name}] -> Summary for {doc_id} ({status.value}, "
+                  f"{summary.processed_chunks}/{summary.total_chunks} chunks) pushed to {STREAM_REVIEW_SUMMARY}")
+
+    def process_pending_messages(self):
+        super().process_pending_messages()
+
+        # Documents whose results stopped arriving get a partial summary
+        if time.monotonic() - self._last_timeout_check < TIMEOUT_CHECK_INTERVAL:
+            return
+        self._last_timeout_check = time.monotonic()
+
+        for doc_id in self.store.expired(partitions=self.membership.assigned if self.membership else None):
+            status = ProcessingStatus.COMPLETED if self.store.is_complete(doc_id) else ProcessingStatus.TIMED_OUT
+            self.emit_summary(doc_id, status)
@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+import redis
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+
+from src.core.codec import encode, decode_messages
+from src.core.redis_client import RedisClient, stream_for, physical_streams
+from src.core.retention import xadd_kwargs
+from src.core.tracing import StageTracer, add_write, propagate
+from .reading import StreamReading
+from .recovery import PendingRecovery
+
+# Max messages a single async agent keeps in flight at once
+CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", 8))
+
+class AsyncBaseAgent(StreamReading, ABC):
+    """
+    asyncio counterpart of BaseAgent.
+
+    `process_message` is a coroutine, and up to `concurrency` of them run at the
+    same time: the read loop keeps pulling new entries (and each task ACKs its own
+    entry as soon as it finishes) while slow calls, e.g. to a model, are awaited.
+    """
+
+    def __init__(self, stream_name: str, consumer_group: str, consumer_name: str, concurrency: int = None):
+        self.stream_name = stream_name
+        self.consumer_group = consumer_group
+        self.consumer_name = consumer_name
+        self.redis_client = RedisClient.get_async_instance()
+        self.stream_client = RedisClient.get_async_binary_instance()
+        self.should_run = True
+
+        self.input_streams = [self.stream_name]
+        self.concurrency = concurrency if concurrency is not None else CONCURRENCY
+        self._in_flight: Dict[asyncio.Task, str] = {}  # task -> message ID
+        self.recovery: PendingRecovery = None
+
+        # Same read side as BaseAgent; membership heartbeats and lane stats go through the sync client, in a thread
+        self._init_reading(RedisClient.get_instance())
+
+        # Stage timings, also published from the sync client in a thread; each task has its own span
+        self.tracer = StageTracer(RedisClient.get_instance(), consumer_group.removesuffix("-group"))
+
+    async def ensure_group(self, stream: str):
+        """Create this agent's consumer group on `stream` (every lane and partition of it) if it does not exist yet."""
+        for physical in physical_streams(stream):
+            try:
+                await self.redis_client.xgroup_create(physical, self.consumer_group, id="0", mkstream=True)
+                print(f"[{self.consumer_name}] Created consumer group '{self.consumer_group}' on '{physical}'")
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" in str(e):
+                    pass
+                else:
+                    raise e
+
+    async def emit(self, stream: str, payload: Dict[str, Any]):
+        """Write an output message (to its document's lane and partition)."""
+        stream = stream_for(stream, payload.get("doc_id", ""), payload.get("priority"), payload.get("tenant"))
+        started = time.perf_counter()
+        await self.redis_client.xadd(stream, encode(propagate(payload)), **xadd_kwargs(stream))
+        add_write(time.perf_counter() - started)
+
+    async def rebalance(self):
+        """Same as BaseAgent.rebalance, heartbeating in a thread."""
+        if self._heartbeat_due() and await asyncio.to_thread(self.membership.heartbeat):
+            self._reassigned()
+
+    async def read(self, count: int, block: int):
+        """Same as BaseAgent.read, on the asyncio client."""
+        if not self._read_groups:
+            await asyncio.sleep(block / 1000)
+            return []
+        plan, reply = self.read_plan(count, block), None
+        try:
+            while True:
+                reply = await self._xreadgroup(*plan.send(reply))
+        except StopIteration as done:
+            return done.value
+
+    async def _xreadgroup(self, streams: List[str], count: int, block: Optional[int]):
+        return await self.stream_client.xreadgroup(
+            groupname=self.consumer_group,
+            consumername=self.consumer_name,
+            streams={stream: ">" for stream in streams},
+            count=count,
+            block=block,
+        )
+
+    async def handle_message(self, stream: str, message_id: str, data: Dict[str, Any]):
+        """Process one message and ACK it; failures stay in the PEL."""
+        span = self.tracer.start(message_id, data)
+        try:
+            await self.process_message(message_id, data)
+            span.processed()
+            await self.redis_client.xack(stream, self.consumer_group, message_id)
+            self.tracer.finish(span)
+            print(f"[{self.consumer_name}] Message {message_id} ACKed")
+        except Exception as e:
+            self.tracer.failed(span)
+            print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
+
+    async def run_async(self):
+        print(f"[{self.consumer_name}] Async agent starting up (concurrency={self.concurrency})...")
+        for stream in self.input_streams:
+            await self.ensure_group(stream)
+
+        while self.should_run:
+            try:
+                await self.rebalance()
+
+                # All slots busy: wait for any task to finish before reading more,
+                # so we never claim entries we can't start on right away.
+                if len(self._in_flight) >= self.concurrency:
+                    await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                messages = await self.read(self.concurrency - len(self._in_flight), 2000)
+
+                for stream, msgs in decode_messages(messages):
+                    for message_id, data in msgs:
+                        print(f"[{self.consumer_name}] Processing message {message_id} from {stream}")
+                        self.lane_stats.observe(stream, message_id)
+                        self._spawn(stream, message_id, data)
+
+                if self.lane_stats.flush_due():
+                    await asyncio.to_thread(self.lane_stats.flush)
+                if self.tracer.flush_due():
+                    await asyncio.to_thread(self.tracer.flush)
+
+                await self.process_pending_messages()
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"[{self.consumer_name}] Critical error in loop: {e}")
+                await asyncio.sleep(1)  # Backoff
+
+        # Let in-flight work finish (and ACK) before exiting
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await asyncio.to_thread(self.lane_stats.flush)
+        await asyncio.to_thread(self.tracer.flush)
+        if self.membership:
+            await asyncio.to_thread(self.membership.leave)
+
+    def _spawn(self, stream: str, message_id: str, data: Dict[str, Any]):
+        task = asyncio.create_task(self.handle_message(stream, message_id, data))
+        self._in_flight[task] = message_id
+        task.add_done_callback(lambda done: self._in_flight.pop(done, None))
+
+    async def process_pending_messages(self):
+        """Same recovery as BaseAgent; PendingRecovery uses the sync client, so its Redis calls run in a thread."""
+        if self.recovery is None:
+            self.recovery = PendingRecovery(
+                RedisClient.get_instance(), self.consumer_group, self.consumer_name, self._streams
+            )
+
+        if self.recovery.sweep_due():
+            await asyncio.to_thread(self.recovery.sweep)
+
+        # Retries share the concurrency budget; the rest stay queued until slots free up
+        free = self.concurrency - len(self._in_flight)
+        if free <= 0 or not self.recovery.retry_due():
+            return
+        in_flight_ids = set(self._in_flight.values())
+        for stream, message_id, data in await asyncio.to_thread(self.recovery.due_retries, free):
+            if message_id in in_flight_ids:
+                continue  # Still being worked on by one of our tasks
+            print(f"[{self.consumer_name}] Retrying message {message_id} from {stream}")
+            self._spawn(stream, message_id, data)
+
+    def run(self):
+        """Blocking entry point, so async agents start the same way as sync ones."""
+        asyncio.run(self.run_async())
+
+    @abstractmethod
+    async def process_message(self, message_id: str, data: Dict[str, Any]):
+        """Logic specific to the agent."""
+        pass
+
+    def stop(self):
+        self.should_run = False
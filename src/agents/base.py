@@ -3,103 +3,389 @@ import time
 import json
 import uuid
 import click
-import redis
 import shortuuid
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Tuple, Callable
 
-from src.core.redis_client import RedisClient
+from src.core.codec import encode, decode_messages
+from src.core.redis_client import RedisClient, stream_for, physical_streams
+from src.core.transport import Transport, transport_for
+from src.core.tracing import StageTracer, Span, activate, add_write, propagate
+from .reading import StreamReading
+from .recovery import PendingRecovery
 
-class BaseAgent(ABC):
-    def __init__(self, stream_name: str, consumer_group: str, consumer_name: str):
+# Batch-processing defaults (overridable per agent via constructor / CLI flags)
+BATCH_SIZE = int(os.getenv("AGENT_BATCH_SIZE", 10))
+FLUSH_INTERVAL = float(os.getenv("AGENT_FLUSH_INTERVAL", 0.05))  # seconds
+BATCHED = os.getenv("AGENT_BATCHED", "false").lower() in ("1", "true", "yes")
+TRANSACTIONAL = os.getenv("AGENT_TRANSACTIONAL", "false").lower() in ("1", "true", "yes")
+
+# Worker-pool defaults: 0 workers = process messages inline in the read loop
+WORKERS = int(os.getenv("AGENT_WORKERS", 0))
+POOL = os.getenv("AGENT_POOL", "thread")  # "thread" or "process"
+TASK_TIMEOUT = float(os.getenv("AGENT_TASK_TIMEOUT", 300))  # seconds before a worker is considered stuck
+
+# Agent instance owned by a process-pool worker (built once per process by _init_process_worker)
+_worker_agent = None
+
+def _init_process_worker(factory: Callable[[], "BaseAgent"]):
+    global _worker_agent
+    _worker_agent = factory()
+
+def _run_in_process_worker(stream: str, message_id: str, data: Dict[str, Any]):
+    return _worker_agent.collect_outputs(stream, message_id, data)
+
+class BaseAgent(StreamReading, ABC):
+    # Whether this stage also records end_to_end (upload -> handled) per message
+    end_to_end = False
+
+    def __init__(
+        self,
+        stream_name: str,
+        consumer_group: str,
+        consumer_name: str,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        batched: Optional[bool] = None,
+        transactional: Optional[bool] = None,
+        workers: Optional[int] = None,
+        pool: Optional[str] = None,
+        worker_factory: Optional[Callable[[], "BaseAgent"]] = None,
+        task_timeout: Optional[float] = None,
+    ):
         self.stream_name = stream_name
         self.consumer_group = consumer_group
         self.consumer_name = consumer_name
         self.redis_client = RedisClient.get_instance()
         self.should_run = True
 
-        # Ensure consumer group
+        # Streams read by the run loop. Multi-stream agents (e.g. the aggregator) extend this.
+        self.input_streams = [self.stream_name]
+
+        # Partitions owned, priority lanes and the order streams are read in (see StreamReading)
+        self._init_reading(self.redis_client)
+
+        # Queue / process / write time per message, named after the group ("grammar-group" -> "grammar")
+        self.tracer = StageTracer(self.redis_client, consumer_group.removesuffix("-group"))
+
+        # Batch mode: outputs (XADD) and acknowledgements (XACK) of a whole read batch
+        # are buffered and flushed in a single pipeline instead of one round trip each.
+        self.batch_size = batch_size if batch_size is not None else BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else FLUSH_INTERVAL
+        self.batched = batched if batched is not None else BATCHED
+        self.transactional = transactional if transactional is not None else TRANSACTIONAL
+        self._pending_writes: List[Tuple[str, Dict[str, Any]]] = []
+        self._pending_acks: List[Tuple[str, str]] = []
+        self._pending_spans: List[Span] = []
+        self._batch_started: Optional[float] = None
+
+        # Worker pool: each read batch is handed to a thread/process pool and every message
+        # is ACKed as soon as its own work finishes. Workers never touch Redis for outputs:
+        # they return them and the read loop writes them (see collect_outputs).
+        self.workers = workers if workers is not None else WORKERS
+        self.pool = pool or POOL
+        self.worker_factory = worker_factory
+        self.task_timeout = task_timeout if task_timeout is not None else TASK_TIMEOUT
+        self._executor: Optional[Executor] = None
+        self._in_flight: Dict[Future, Tuple[str, str, float, Span]] = {}
+        self._local = threading.local()
+
+        # Created on first use so multi-stream agents can set input_streams first
+        self.recovery: Optional[PendingRecovery] = None
+
+        self.ensure_group(self.stream_name)
+
+    def ensure_group(self, stream: str):
+        """Create this agent's consumer group on `stream` (every lane and partition of it) if it does not exist yet."""
+        for physical in physical_streams(stream):
+            if transport_for(physical).create_group(physical, self.consumer_group):
+                print(f"[{self.consumer_name}] Created consumer group '{self.consumer_group}' on '{physical}'")
+
+    def rebalance(self):
+        """Pick the streams to read; with partitions, heartbeat and follow assignment changes."""
+        if self._heartbeat_due() and self.membership.heartbeat():
+            self._reassigned()
+
+    def read(self, count: int, block: int):
+        """XREADGROUP up to `count` new entries, lane by lane, one call per cluster slot (see read_plan)."""
+        if not self._read_groups:
+            time.sleep(block / 1000)  # More replicas than partitions: idle until a rebalance
+            return []
+        plan, reply = self.read_plan(count, block), None
+        try:
+            while True:
+                reply = self._xreadgroup(*plan.send(reply))
+        except StopIteration as done:
+            return done.value
+
+    def _xreadgroup(self, streams: List[str], count: int, block: Optional[int]):
+        # An agent's input streams all live on one transport
+        return transport_for(streams[0]).read_group(self.consumer_group, self.consumer_name, streams, count, block)
+
+    def emit(self, stream: str, payload: Dict[str, Any]):
+        """Write an output message (to its document's lane and partition). Buffered until the next flush in batch mode."""
+        stream = stream_for(stream, payload.get("doc_id", ""), payload.get("priority"), payload.get("tenant"))
+        payload = propagate(payload)
+        outputs = getattr(self._local, "outputs", None)
+        if outputs is not None:
+            # Running inside a pool worker: hand the output back to the read loop
+            outputs.append((stream, payload))
+        elif self.batched:
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+            self._pending_writes.append((stream, payload))
+        else:
+            started = time.perf_counter()
+            transport_for(stream).add(stream, encode(payload))
+            add_write(time.perf_counter() - started)
+
+    def ack(self, stream: str, message_id: str):
+        """Acknowledge an input message. Buffered until the next flush in batch mode."""
+        if self.batched:
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+            self._pending_acks.append((stream, message_id))
+        else:
+            started = time.perf_counter()
+            transport_for(stream).ack(stream, self.consumer_group, message_id)
+            add_write(time.perf_counter() - started)
+
+    def done(self, span: Span):
+        """Record a handled message's timings once its outputs and ACK are written (at the flush in batch mode)."""
+        if self.batched:
+            self._pending_spans.append(span)
+        else:
+            self.tracer.finish(span, self.end_to_end)
+
+    def flush(self):
+        """Send all buffered XADDs and XACKs in one pipeline per transport (MULTI/EXEC if transactional)."""
+        if not self._pending_writes and not self._pending_acks:
+            return
+
+        writes, acks, spans = self._pending_writes, self._pending_acks, self._pending_spans
+        self._pending_writes, self._pending_acks, self._pending_spans = [], [], []
+        self._batch_started = None
+
+        # One XACK per input stream, carrying all IDs of the batch
+        batches: Dict[Transport, Tuple[List, Dict[str, List[str]]]] = {}
+        for stream, payload in writes:
+            batches.setdefault(transport_for(stream), ([], {}))[0].append((stream, encode(payload)))
+        for stream, message_id in acks:
+            batches.setdefault(transport_for(stream), ([], {}))[1].setdefault(stream, []).append(message_id)
+
+        # If this raises, nothing was ACKed and the inputs stay in the PEL for redelivery.
+        if len(batches) == 1:
+            for transport, (adds, ids_by_stream) in batches.items():
+                transport.write(adds, ids_by_stream, self.consumer_group, self.transactional)
+        else:
+            # Outputs on another transport (local mode): write them all before any ACK
+            for transport, (adds, _) in batches.items():
+                if adds:
+                    transport.write(adds, None, self.consumer_group, self.transactional)
+            for transport, (_, ids_by_stream) in batches.items():
+                if ids_by_stream:
+                    transport.write([], ids_by_stream, self.consumer_group, self.transactional)
+        for span in spans:
+            self.tracer.finish(span, self.end_to_end)
+        print(f"[{self.consumer_name}] Flushed {len(writes)} writes / {len(acks)} ACKs")
+
+    def _flush_due(self) -> bool:
+        if self._batch_started is None:
+            return False
+        if len(self._pending_acks) >= self.batch_size:
+            return True
+        return time.monotonic() - self._batch_started >= self.flush_interval
+
+    def _block_ms(self) -> int:
+        """How long XREADGROUP may block without delaying a pending flush or finished workers."""
+        block = 2000
+        if self._in_flight:
+            block = 100
+        if self._batch_started is not None:
+            remaining = self.flush_interval - (time.monotonic() - self._batch_started)
+            block = min(block, int(remaining * 1000))
+        return max(1, block)
+
+    def _read_count(self) -> int:
+        """Entries to request: a full batch inline, or whatever the pool can take."""
+        if self._executor is None:
+            return self.batch_size
+        # Keep up to 2x workers queued so the pool never idles between reads
+        return max(0, min(self.batch_size, 2 * self.workers - len(self._in_flight)))
+
+    def collect_outputs(self, stream: str, message_id: str, data: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run `dispatch` and return the outputs it emits instead of writing them (pool workers)."""
+        self._local.outputs = []
         try:
-            self.redis_client.xgroup_create(self.stream_name, self.consumer_group, id="0", mkstream=True)
-            print(f"[{self.consumer_name}] Created consumer group '{self.consumer_group}' on '{self.stream_name}'")
-        except redis.exceptions.ResponseError as e:
-            if "BUSYGROUP" in str(e):
-                # print(f"[{self.consumer_name}] Group '{self.consumer_group}' already exists.")
-                pass
-            else:
-                raise e
+            self.dispatch(stream, message_id, data)
+            return self._local.outputs
+        finally:
+            self._local.outputs = None
+
+    def _start_pool(self):
+        if self.pool == "process":
+            if self.worker_factory is None:
+                raise ValueError("A process pool needs a worker_factory to build the agent in each worker")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(self.worker_factory,)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.consumer_name)
+        print(f"[{self.consumer_name}] Started {self.pool} pool with {self.workers} workers")
+
+    def _submit(self, stream: str, message_id: str, data: Dict[str, Any]):
+        span = self.tracer.start(message_id, data)
+        activate(None)  # Made current again when its outputs are written (_reap_workers)
+        if self.pool == "process":
+            future = self._executor.submit(_run_in_process_worker, stream, message_id, data)
+        else:
+            future = self._executor.submit(self.collect_outputs, stream, message_id, data)
+        self._in_flight[future] = (stream, message_id, time.monotonic(), span)
+
+    def _reap_workers(self):
+        """Write outputs and ACK every finished message; stop tracking stuck ones."""
+        now = time.monotonic()
+        for future, (stream, message_id, started, span) in list(self._in_flight.items()):
+            if future.done():
+                del self._in_flight[future]
+                try:
+                    outputs = future.result()
+                except Exception as e:
+                    self.tracer.failed(span)
+                    print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
+                    continue
+                # Finished some time since the last reap; outputs get the message's trace context
+                span.processed()
+                activate(span)
+                for out_stream, payload in outputs:
+                    self.emit(out_stream, payload)
+                self.ack(stream, message_id)
+                self.done(span)
+                activate(None)
+                if not self.batched:
+                    print(f"[{self.consumer_name}] Message {message_id} ACKed")
+            elif now - started > self.task_timeout:
+                # Can't kill a running worker; free its slot and leave the entry in the PEL
+                del self._in_flight[future]
+                future.cancel()
+                self.tracer.failed(span)
+                print(f"[{self.consumer_name}] Message {message_id} stuck for {now - started:.0f}s, leaving it pending")
+
+    def _stop_pool(self):
+        self._reap_workers()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._in_flight.clear()
+
+    def dispatch(self, stream: str, message_id: str, data: Dict[str, Any]):
+        """Route a message to `process_message`. Multi-stream agents override this."""
+        self.process_message(message_id, data)
+
+    def handle_message(self, stream: str, message_id: str, data: Dict[str, Any]) -> bool:
+        """Process one message and ACK it. Returns False (and leaves it in the PEL) on failure."""
+        # Remember the buffer position so a failing message doesn't leave half of its outputs behind
+        writes_before = len(self._pending_writes)
+        span = self.tracer.start(message_id, data)
+        try:
+            # Process the message (abstract)
+            self.dispatch(stream, message_id, data)
+            span.processed()
+
+            # Acknowledge the message
+            self.ack(stream, message_id)
+            self.done(span)
+            if not self.batched:
+                print(f"[{self.consumer_name}] Message {message_id} ACKed")
+            return True
+
+        except Exception as e:
+            del self._pending_writes[writes_before:]
+            self.tracer.failed(span)
+            print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
+            # Left in the PEL: PendingRecovery reclaims it after min idle and retries or dead-letters it
+            return False
+
+    def _start_message(self, stream: str, message_id: str, data: Dict[str, Any]):
+        if self._executor is not None:
+            self._submit(stream, message_id, data)
+        else:
+            self.handle_message(stream, message_id, data)
 
     def run(self):
         print(f"[{self.consumer_name}] Agent Starting up...")
+        if self.workers > 0:
+            self._start_pool()
 
         while self.should_run:
             try:
+                self.rebalance()
+
+                if self._executor is not None:
+                    self._reap_workers()
+                    if self._read_count() == 0:
+                        # Pool is saturated: wait briefly for a worker instead of reading more
+                        wait(list(self._in_flight), timeout=0.1, return_when=FIRST_COMPLETED)
+                        if self._flush_due():
+                            self.flush()
+                        continue
+
                 # Read from stream using consumer group
                 # Using '>' ID to get new messages
-                # Blocking for 2000ms
-                messages = self.redis_client.xreadgroup(
-                    groupname=self.consumer_group,
-                    consumername=self.consumer_name,
-                    streams={self.stream_name: ">"},
-                    count=10,
-                    block=2000,
-                )
+                # Blocking for 2000ms (less if a batch is waiting to be flushed)
+                messages = self.read(self._read_count(), self._block_ms())
 
                 if messages:
-                    for stream, msgs in messages:
+                    for stream, msgs in decode_messages(messages):
                         for message_id, data in msgs:
                             print(f"[{self.consumer_name}] Processing message {message_id} from {stream}")
-                            
-                            try:
-                                # Process the message (abstract)
-                                self.process_message(message_id, data)
-                                
-                                # Acknowledge the message
-                                self.redis_client.xack(stream, self.consumer_group, message_id)
-                                print(f"[{self.consumer_name}] Message {message_id} ACKed")
-                            
-                            except Exception as e:
-                                print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
-                                # In a real implementation, we might retry or move to DLQ
-                                continue
-                else:
-                    # Periodically check PEL for stalled messages
-                    self.process_pending_messages()
+                            self.lane_stats.observe(stream, message_id)
+                            self._start_message(stream, message_id, data)
+                elif not self._in_flight:
+                    self.flush()
+
+                if self.lane_stats.flush_due():
+                    self.lane_stats.flush()
+                if self.tracer.flush_due():
+                    self.tracer.flush()
+
+                # Retry stalled messages (checked every iteration so a busy agent still recovers)
+                self.process_pending_messages()
+
+                if self._flush_due():
+                    self.flush()
 
             except Exception as e:
                 print(f"[{self.consumer_name}] Critical error in loop: {e}")
                 time.sleep(1)  # Backoff
 
+        if self._executor is not None:
+            self._stop_pool()
+        self.flush()
+        self.lane_stats.flush()
+        self.tracer.flush()
+        if self.membership:
+            self.membership.leave()
+
     def process_pending_messages(self):
-        """Check for messages that are pending (not ACKed) and retry them."""
-        # This is simplified. In production, check delivery count and DLQ if too many retries.
-        try:
-            # Check PEL for this consumer
-            pending = self.redis_client.xpending_range(
-                self.stream_name, 
-                self.consumer_group, 
-                min="-", 
-                max="+", 
-                count=10, 
-                consumername=self.consumer_name
+        """Retry reclaimed PEL entries whose backoff elapsed, and periodically sweep for stalled ones."""
+        if self.recovery is None:
+            self.recovery = PendingRecovery(
+                self.redis_client, self.consumer_group, self.consumer_name, self._streams
             )
-            
-            for msg in pending:
-                # msg (payload): {'message_id': '...', 'consumer': '...', 'time_since_delivered': ..., 'times_delivered': ...}
-                msg_id = msg['message_id']
-                
-                # Retrieve the full message content
-                # XCLAIM generic approach or just XREADGROUP with ID '0' (history)
-                # But XREADGROUP with ID '0' gets pending messages for me.
-                pass
-            
-            # Actually, a better pattern is to start with ID '0' in XREADGROUP to process any pending messages on startup/idle
-            # For simplicity in this loop, we'll just log.
-            # Implementing robust PEL handling requires fetching the message again via XRANGE or XCLAIM
-            pass
-            
-        except Exception as e:
-            pass  # Fail silently for demo
+
+        if self.recovery.sweep_due():
+            self.recovery.sweep()
+
+        in_flight_ids = {message_id for _, message_id, _, _ in self._in_flight.values()}
+        for stream, message_id, data in self.recovery.due_retries():
+            if message_id in in_flight_ids:
+                continue  # Still being worked on by our own pool
+            print(f"[{self.consumer_name}] Retrying message {message_id} from {stream}")
+            self._start_message(stream, message_id, data)
 
     @abstractmethod
     def process_message(self, message_id: str, data: Dict[str, Any]):
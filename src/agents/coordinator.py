@@ -1,16 +1,21 @@
 import json
 from .base import BaseAgent
+from .specialists import SPECIALTIES, cached_suggestion
+from .routing import Router, load_router
+from src.core.cache import SuggestionCache, CACHE_ENABLED
+from src.core.documents import DocumentStore
 from src.core.redis_client import (
     RedisClient, STREAM_DOC_TASKS, GROUP_COORDINATOR,
     STREAM_DOC_GRAMMAR, STREAM_DOC_CLARITY, STREAM_DOC_TONE, STREAM_DOC_STRUCTURE
 )
 
 class CoordinatorAgent(BaseAgent):
-    def __init__(self, consumer_name="coordinator-1"):
+    def __init__(self, consumer_name="coordinator-1", router: Router = None, **agent_kwargs):
         super().__init__(
             stream_name=STREAM_DOC_TASKS,
             consumer_group=GROUP_COORDINATOR,
-            consumer_name=consumer_name
+            consumer_name=consumer_name,
+            **agent_kwargs
         )
         self.output_streams = {
             "grammar": STREAM_DOC_GRAMMAR,
@@ -18,32 +23,49 @@ class CoordinatorAgent(BaseAgent):
             "tone": STREAM_DOC_TONE,
             "structure": STREAM_DOC_STRUCTURE
         }
+        # Chunks whose content was already reviewed skip the specialists entirely
+        self.cache = SuggestionCache(self.redis_client) if CACHE_ENABLED else None
+        # Decides which specialists each chunk actually needs
+        self.router = router or load_router()
+        self.store = DocumentStore(self.redis_client)
 
     def process_message(self, message_id, data):
         """
         Receives a DocumentChunk.
-        Fans out the task to different streams for processing.
+        Fans out the task to the specialist streams the router selects for it.
         """
-        # data is a dict like {"doc_id": "...", "text": "...", "chunk_id": "..."}
-        # In Redis streams, data is stringified. If using json.dumps, ensure parsing.
-        # But Redis XADD values are strings. We need to respect that.
-
-        # Let's assume input data IS the payload.
-        # Just fan out to all specialist streams
-        
         doc_id = data.get("doc_id", "unknown")
         chunk_id = data.get("chunk_id", "unknown")
         
-        print(f"[{self.consumer_name}] Fanning out task for doc {doc_id} chunk {chunk_id}")
+        routes = self.router.route(data, self.output_streams)
+        print(f"[{self.consumer_name}] Fanning out task for doc {doc_id} chunk {chunk_id} to {routes}")
+
+        # Tell the aggregator how many results this chunk will produce, before any of them exist
+        self.store.route(doc_id, chunk_id, len(routes))
+        if not routes:
+            self.store.close_if_complete(doc_id)
+            return
+
+        cached = self.cache.get_many(data, routes) if self.cache else {}
+
+        for task_type in routes:
+            stream_name = self.output_streams[task_type]
+            hit = cached.get(task_type)
+            if hit is not None:
+                # Short-circuit straight to the suggestion stream the specialist would have written
+                _, suggestion_stream, _ = SPECIALTIES[task_type]
+                self.emit(suggestion_stream, cached_suggestion(hit, data))
+                print(f"[{self.consumer_name}] -> Cache hit, pushed to {suggestion_stream}")
+                continue
 
-        for task_type, stream_name in self.output_streams.items():
             # Add metadata for the specialist
             payload = data.copy()
             payload["task_type"] = task_type
-            payload["parent_msg_id"] = message_id 
+            payload["parent_msg_id"] = message_id
+            payload["routes"] = ",".join(routes)
             
-            # Write to specialist stream
-            self.redis_client.xadd(stream_name, payload)
+            # Write to specialist stream (buffered in batch mode)
+            self.emit(stream_name, payload)
             print(f"[{self.consumer_name}] -> Pushed to {stream_name}")
 
 if __name__ == "__main__":
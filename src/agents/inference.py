@@ -0,0 +1,64 @@
+import os
+import time
+import random
+import importlib
+from typing import Dict, List
+
+# Model backend of the batched specialists: a name from BACKENDS or "package.module:ClassName"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fake")
+# Latency model of the fake backend: one call costs a fixed overhead plus a per-chunk cost
+INFERENCE_OVERHEAD_MS = float(os.getenv("INFERENCE_OVERHEAD_MS", 400))
+INFERENCE_ITEM_MS = float(os.getenv("INFERENCE_ITEM_MS", 50))
+INFERENCE_JITTER = float(os.getenv("INFERENCE_JITTER", 0.2))  # +/- fraction of random variation
+
+def dummy_analysis(specialty: str, text: str) -> Dict[str, str]:
+    """The placeholder review of a chunk (what a model would return)."""
+    return {
+        "suggested_text": f"{text}\n[AI SERVICE: {specialty.upper()} DONE]",
+        "explanation": f"This is a dummy explanation from the {specialty} agent.",
+        "severity": random.choice(["low", "medium", "high"]),
+    }
+
+class ReviewBackend:
+    """
+    A model endpoint that reviews several chunks in one call. Subclass and override
+    `review`; it returns one analysis (suggested_text, explanation, severity) per text.
+    """
+
+    def review(self, specialty: str, texts: List[str]) -> List[Dict[str, str]]:
+        return [dummy_analysis(specialty, text) for text in texts]
+
+class FakeBackend(ReviewBackend):
+    """
+    Simulated batched endpoint: a call takes overhead + per-item cost x batch size (with
+    jitter), like a GPU server whose per-call cost dominates for small batches.
+    """
+
+    def __init__(self, overhead_ms: float = None, item_ms: float = None, jitter: float = None):
+        self.overhead_ms = INFERENCE_OVERHEAD_MS if overhead_ms is None else overhead_ms
+        self.item_ms = INFERENCE_ITEM_MS if item_ms is None else item_ms
+        self.jitter = INFERENCE_JITTER if jitter is None else jitter
+
+    def latency(self, items: int) -> float:
+        """Seconds one call with `items` chunks takes."""
+        base = (self.overhead_ms + self.item_ms * items) / 1000
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def review(self, specialty, texts):
+        time.sleep(self.latency(len(texts)))
+        return super().review(specialty, texts)
+
+BACKENDS = {
+    "dummy": ReviewBackend,  # no latency at all
+    "fake": FakeBackend,
+}
+
+def load_backend(name: str = None) -> ReviewBackend:
+    """Build a backend by registry name, or import one given as "package.module:ClassName"."""
+    name = name or INFERENCE_BACKEND
+    if ":" in name:
+        module, _, cls = name.partition(":")
+        return getattr(importlib.import_module(module), cls)()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (expected one of {sorted(BACKENDS)} or module:Class)")
+    return BACKENDS[name]()
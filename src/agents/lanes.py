@@ -0,0 +1,85 @@
+import os
+import time
+import redis
+from typing import Dict, List, Optional, Tuple
+
+from src.core.redis_client import LANES, LANE_NAMES, physical_streams, stream_lane, tagged, id_ms
+from src.core.tracing import bucket_field, histogram_report
+
+# Queue wait per lane: the time between an entry's XADD (its stream ID) and the agent
+# reading it, counted per consumer group into a small histogram.
+LANE_STATS_KEY = tagged("mesh.stats.lanes")  # hash: "<group>:<lane>:<count|wait_ms|le_<ms>|le_inf>"
+LANE_STATS_INTERVAL = float(os.getenv("LANE_STATS_INTERVAL", 5))  # seconds between publishes
+WAIT_BUCKETS_MS = (10, 50, 100, 500, 1000, 5000, 10000, 60000)
+
+def lane_streams(input_streams: List[str], partitions=None) -> Dict[str, List[str]]:
+    """The physical streams of `input_streams` (in the given partitions) per lane, highest priority first."""
+    by_lane = {
+        lane: [s for stream in input_streams for s in physical_streams(stream, partitions, [lane])]
+        for lane in LANE_NAMES
+    }
+    return {lane: streams for lane, streams in by_lane.items() if streams}
+
+class LaneScheduler:
+    """
+    Smooth weighted round-robin over the priority lanes: with weights 4:1 the interactive
+    lane is read first on 4 reads out of 5 and the batch lane on the fifth, so batch work
+    keeps moving under a steady interactive load. Lanes with nothing waiting cost a read.
+    """
+
+    def __init__(self, weights: Dict[str, int] = None):
+        self.weights = weights or LANES
+        self._current = {lane: 0 for lane in self.weights}
+
+    def order(self) -> List[str]:
+        """The lanes to read this time: the one whose turn it is, then the rest by priority."""
+        total = sum(self.weights.values())
+        for lane, weight in self.weights.items():
+            self._current[lane] += weight
+        first = max(self._current, key=self._current.get)
+        self._current[first] -= total
+        return [first] + [lane for lane in self.weights if lane != first]
+
+class LaneStats:
+    """Collects queue waits in memory and publishes them to LANE_STATS_KEY every `interval` seconds."""
+
+    def __init__(self, redis_client: redis.Redis, consumer_group: str, interval: float = None):
+        self.redis_client = redis_client
+        self.consumer_group = consumer_group
+        self.interval = interval if interval is not None else LANE_STATS_INTERVAL
+        self._pending: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+    def observe(self, stream: str, message_id: str, now: float = None):
+        lane = stream_lane(stream)
+        if lane is None:
+            return  # Not a work stream
+        wait = max(0, (now or time.time()) * 1000 - id_ms(message_id))
+        bucket = bucket_field(wait, WAIT_BUCKETS_MS)
+        prefix = f"{self.consumer_group}:{lane}"
+        for field, value in ((f"{prefix}:count", 1), (f"{prefix}:wait_ms", wait), (f"{prefix}:{bucket}", 1)):
+            self._pending[field] = self._pending.get(field, 0) + value
+
+    def flush_due(self) -> bool:
+        return bool(self._pending) and time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for field, value in pending.items():
+            if field.endswith(":wait_ms"):
+                pipe.hincrbyfloat(LANE_STATS_KEY, field, round(value, 3))
+            else:
+                pipe.hincrby(LANE_STATS_KEY, field, int(value))
+        try:
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print(f"[lanes] Could not publish lane stats: {e}")
+
+def lane_report(redis_client: redis.Redis) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """(group, lane) -> count, average and approximate p50 / p95 / p99 queue wait in ms."""
+    report = histogram_report(redis_client.hgetall(LANE_STATS_KEY), WAIT_BUCKETS_MS, sum_name="wait_ms")
+    return dict(sorted(report.items()))
@@ -0,0 +1,81 @@
+import os
+import time
+import socket
+import redis
+from redis.crc import key_slot
+from typing import Dict, List, Optional
+
+from src.core.redis_client import REDIS_MODE, STREAM_PARTITIONS, tagged
+
+# Partition assignment for STREAM_PARTITIONS > 1. Every replica heartbeats into its consumer
+# group's member set; partition p belongs to the (p mod #members)-th live member, so each
+# partition (and therefore each document) is consumed by one replica at a time.
+PARTITION_HEARTBEAT = float(os.getenv("PARTITION_HEARTBEAT", 5))  # seconds between heartbeats
+PARTITION_MEMBER_TTL = float(os.getenv("PARTITION_MEMBER_TTL", 15))  # silent this long = gone
+PARTITION_POLL_MS = int(os.getenv("PARTITION_POLL_MS", 200))  # idle block per slot in cluster mode
+
+MEMBERS_PREFIX = "mesh:members:"  # zset per consumer group: member -> last heartbeat
+
+def member_id(consumer_name: str) -> str:
+    """Unique per process, since replicas of a deployment share their consumer name."""
+    return f"{consumer_name}@{socket.gethostname()}:{os.getpid()}"
+
+def assign(members: List[str], member: str, partitions: int) -> List[int]:
+    """Partitions owned by `member`: partition p goes to sorted(members)[p % len(members)]."""
+    members = sorted(set(members) | {member})
+    return [p for p in range(partitions) if members[p % len(members)] == member]
+
+def slot_groups(streams: List[str]) -> List[List[str]]:
+    """Split streams into groups one XREADGROUP may read together (a cluster command can't span slots)."""
+    if REDIS_MODE != "cluster":
+        return [list(streams)] if streams else []
+    groups: Dict[int, List[str]] = {}
+    for stream in streams:
+        groups.setdefault(key_slot(stream.encode("utf-8")), []).append(stream)
+    return list(groups.values())
+
+class PartitionMembership:
+    """Keeps a consumer in its group's member set and tracks the partitions it owns."""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        consumer_group: str,
+        consumer_name: str,
+        partitions: int = None,
+        heartbeat: float = None,
+        ttl: float = None,
+    ):
+        self.redis_client = redis_client
+        self.key = tagged(MEMBERS_PREFIX + consumer_group)
+        self.member = member_id(consumer_name)
+        self.partitions = partitions or STREAM_PARTITIONS
+        self.heartbeat_interval = heartbeat if heartbeat is not None else PARTITION_HEARTBEAT
+        self.ttl = ttl if ttl is not None else PARTITION_MEMBER_TTL
+        self.assigned: Optional[List[int]] = None
+        self._last_heartbeat = 0.0
+
+    def heartbeat_due(self) -> bool:
+        return time.monotonic() - self._last_heartbeat >= self.heartbeat_interval
+
+    def heartbeat(self) -> bool:
+        """Refresh our membership and recompute the assignment. Returns True if it changed."""
+        self._last_heartbeat = time.monotonic()
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(self.key, {self.member: now})
+        pipe.zremrangebyscore(self.key, "-inf", now - self.ttl)
+        pipe.zrange(self.key, 0, -1)
+        members = pipe.execute()[-1]
+
+        assigned = assign(members, self.member, self.partitions)
+        changed = assigned != self.assigned
+        self.assigned = assigned
+        return changed
+
+    def leave(self):
+        """Drop out right away so the others take over our partitions on their next heartbeat."""
+        try:
+            self.redis_client.zrem(self.key, self.member)
+        except redis.exceptions.RedisError:
+            pass  # We expire from the set after `ttl` anyway
@@ -0,0 +1,88 @@
+from typing import Dict, Generator, List, Optional, Tuple
+
+import redis
+
+from src.core.redis_client import STREAM_PARTITIONS
+from .lanes import LaneScheduler, LaneStats, lane_streams
+from .partitions import PartitionMembership, slot_groups, PARTITION_POLL_MS
+
+# One XREADGROUP of a read: (streams, count per stream, block ms or None)
+ReadCall = Tuple[List[str], int, Optional[int]]
+
+class StreamReading:
+    """
+    The read side shared by BaseAgent and AsyncBaseAgent: which physical streams to read
+    (partitions owned, lanes, cluster slots) and in what order. `read_plan` yields the
+    XREADGROUP calls of one read; each agent runs them with its own (sync or async) client.
+    """
+
+    def _init_reading(self, redis_client: redis.Redis):
+        """Set up membership and lanes; `redis_client` is a sync client (heartbeats and stats)."""
+        # Partitioned streams: the partitions of input_streams this replica currently owns
+        self.membership: Optional[PartitionMembership] = None
+        if STREAM_PARTITIONS > 1:
+            self.membership = PartitionMembership(redis_client, self.consumer_group, self.consumer_name)
+        self._streams: List[str] = []
+        self._read_groups: List[List[str]] = []
+        self._rotation = 0
+
+        # Priority lanes: which lane is read first, and the queue wait observed per lane
+        self.lanes = LaneScheduler()
+        self.lane_stats = LaneStats(redis_client, self.consumer_group)
+        self._lane_groups: Dict[str, List[List[str]]] = {}
+
+    def assigned_streams(self) -> Dict[str, List[str]]:
+        """The physical streams to read per lane: every partition, or the ones our membership owns."""
+        return lane_streams(self.input_streams, self.membership.assigned if self.membership else None)
+
+    def _assign(self):
+        by_lane = self.assigned_streams()
+        self._streams = [s for streams in by_lane.values() for s in streams]
+        self._read_groups = slot_groups(self._streams)
+        self._lane_groups = {lane: slot_groups(streams) for lane, streams in by_lane.items()}
+
+    def _heartbeat_due(self) -> bool:
+        """Whether rebalance must heartbeat (assigning the streams first if there is no membership)."""
+        if self.membership is None:
+            if not self._streams:
+                self._assign()
+            return False
+        return self.membership.heartbeat_due()
+
+    def _reassigned(self):
+        """Our partitions changed: read the new ones."""
+        self._assign()
+        # Entries still pending on partitions we gave up are reclaimed by their new owner
+        self.recovery = None
+        print(f"[{self.consumer_name}] Assigned partitions {self.membership.assigned}")
+
+    def read_plan(self, count: int, block: int) -> Generator[ReadCall, list, list]:
+        """
+        The XREADGROUPs of one read of up to `count` entries, each sent the reply of the
+        previous one; returns the messages. First a non-blocking pass over the lanes in
+        weighted order, every stream (fair queue / partition) of a lane getting an equal
+        share of the budget; if that finds nothing, block on everything (one slot), or
+        briefly on one slot in turn.
+        """
+        if len(self._streams) > 1:
+            messages, budget = [], count
+            for lane in self.lanes.order():
+                for streams in self._lane_groups.get(lane, []):
+                    if budget <= 0:
+                        return messages
+                    read = (yield streams, self._per_stream(budget, streams), None) or []
+                    budget -= sum(len(entries) for _, entries in read)
+                    messages += read
+            if messages:
+                return messages
+        if len(self._read_groups) == 1:
+            streams = self._read_groups[0]
+            return (yield streams, self._per_stream(count, streams), block)
+        self._rotation = (self._rotation + 1) % len(self._read_groups)
+        streams = self._read_groups[self._rotation]
+        return (yield streams, self._per_stream(count, streams), min(block, PARTITION_POLL_MS))
+
+    @staticmethod
+    def _per_stream(count: int, streams: List[str]) -> int:
+        # COUNT applies per stream: split the budget so a read never takes much more than `count`
+        return max(1, count // len(streams))
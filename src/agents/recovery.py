@@ -0,0 +1,175 @@
+import os
+import time
+import heapq
+import itertools
+import redis
+from typing import Dict, Any, List, Tuple
+
+from src.core.codec import encode, decode_entries
+from src.core.redis_client import tagged
+from src.core.transport import transport_for
+
+# Pending-entry recovery settings
+RECOVERY_MIN_IDLE_MS = int(os.getenv("RECOVERY_MIN_IDLE_MS", 60000))  # idle time before an entry counts as stalled
+RECOVERY_MAX_DELIVERIES = int(os.getenv("RECOVERY_MAX_DELIVERIES", 5))  # attempts before dead-lettering
+RECOVERY_BACKOFF_BASE = float(os.getenv("RECOVERY_BACKOFF_BASE", 1.0))  # seconds, doubled per attempt
+RECOVERY_BACKOFF_MAX = float(os.getenv("RECOVERY_BACKOFF_MAX", 30.0))  # keep below min idle (see below)
+RECOVERY_INTERVAL = float(os.getenv("RECOVERY_INTERVAL", 5.0))  # seconds between XAUTOCLAIM sweeps
+RECOVERY_BATCH = int(os.getenv("RECOVERY_BATCH", 50))  # entries claimed per stream per sweep
+
+# Operator-visible counters, HINCRBY'd as "<group>:<counter>"
+RECOVERY_STATS_KEY = tagged("mesh.stats.recovery")
+
+def dead_letter_stream(stream: str) -> str:
+    """Per-stream dead-letter stream, following the spec's doc.failed.* naming."""
+    if stream.startswith("doc."):
+        return "doc.failed." + stream[len("doc."):]
+    return f"{stream}.failed"
+
+class PendingRecovery:
+    """
+    Takes over stalled PEL entries and retries them, dead-lettering poison messages.
+
+    Every `interval` seconds each input stream is swept with XAUTOCLAIM: entries idle
+    for more than `min_idle_ms` (failed here, or owned by a crashed consumer) move to
+    this consumer. Entries delivered more than `max_deliveries` times are copied to
+    the stream's dead-letter stream and ACKed; the rest are queued for retry with
+    exponential backoff. While an entry waits for its retry it sits idle in our PEL,
+    so the backoff is capped below `min_idle_ms` to stop other replicas re-claiming it.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        consumer_group: str,
+        consumer_name: str,
+        streams: List[str],
+        min_idle_ms: int = None,
+        max_deliveries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+        interval: float = None,
+        count: int = None,
+    ):
+        self.redis_client = redis_client
+        self.consumer_group = consumer_group
+        self.consumer_name = consumer_name
+        self.streams = list(streams)
+        self.min_idle_ms = min_idle_ms if min_idle_ms is not None else RECOVERY_MIN_IDLE_MS
+        self.max_deliveries = max_deliveries if max_deliveries is not None else RECOVERY_MAX_DELIVERIES
+        self.backoff_base = backoff_base if backoff_base is not None else RECOVERY_BACKOFF_BASE
+        self.backoff_max = min(
+            backoff_max if backoff_max is not None else RECOVERY_BACKOFF_MAX,
+            self.min_idle_ms / 1000 / 2
+        )
+        self.interval = interval if interval is not None else RECOVERY_INTERVAL
+        self.count = count if count is not None else RECOVERY_BATCH
+
+        self.counters = {"reclaimed": 0, "retried": 0, "dead_lettered": 0}
+        self._cursors = {stream: "0-0" for stream in self.streams}
+        self._retry_queue: List[Tuple[float, int, str, str, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        self._last_sweep = 0.0
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt after `attempts` failed deliveries."""
+        if attempts <= 0:
+            return 0.0
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+
+    def sweep_due(self) -> bool:
+        return time.monotonic() - self._last_sweep >= self.interval
+
+    def sweep(self):
+        """XAUTOCLAIM stalled entries on every stream and sort them into retry / dead-letter."""
+        self._last_sweep = time.monotonic()
+        for stream in self.streams:
+            try:
+                self._sweep_stream(stream)
+            except redis.exceptions.ResponseError as e:
+                print(f"[{self.consumer_name}] Recovery sweep failed on {stream}: {e}")
+
+    def _sweep_stream(self, stream: str):
+        next_cursor, entries = transport_for(stream).claim(
+            stream,
+            self.consumer_group,
+            self.consumer_name,
+            min_idle_ms=self.min_idle_ms,
+            start_id=self._cursors[stream],
+            count=self.count,
+        )
+        claimed = decode_entries(entries)
+        self._cursors[stream] = next_cursor
+
+        claimed = [(message_id, data) for message_id, data in claimed if data is not None]
+        if not claimed:
+            return
+
+        deliveries = self._delivery_counts(stream, claimed)
+        stats = {"reclaimed": len(claimed), "dead_lettered": 0}
+        for message_id, data in claimed:
+            # XAUTOCLAIM counts as a delivery, so `times_delivered - 1` attempts have been made
+            attempts = deliveries.get(message_id, 1) - 1
+            if attempts >= self.max_deliveries:
+                self.dead_letter(stream, message_id, data, attempts)
+                stats["dead_lettered"] += 1
+            else:
+                due = time.monotonic() + self.backoff(attempts)
+                heapq.heappush(self._retry_queue, (due, next(self._seq), stream, message_id, data))
+
+        self.counters["reclaimed"] += stats["reclaimed"]
+        self._record("reclaimed", stats["reclaimed"])
+        print(f"[{self.consumer_name}] Reclaimed {stats['reclaimed']} stalled entries from {stream} "
+              f"({stats['dead_lettered']} dead-lettered)")
+
+    def _delivery_counts(self, stream: str, claimed: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, int]:
+        return transport_for(stream).delivery_counts(stream, self.consumer_group, [message_id for message_id, _ in claimed])
+
+    def dead_letter(self, stream: str, message_id: str, data: Dict[str, Any], attempts: int):
+        """Move an entry to the dead-letter stream and ACK it (in one transaction on one transport)."""
+        payload = dict(data)
+        payload.update({
+            "dlq_source_stream": stream,
+            "dlq_message_id": message_id,
+            "dlq_group": self.consumer_group,
+            "dlq_attempts": attempts,
+            "dlq_at": time.time(),
+        })
+        dlq, transport = dead_letter_stream(stream), transport_for(stream)
+        if transport_for(dlq) is transport:
+            transport.write([(dlq, encode(payload))], {stream: [message_id]}, self.consumer_group, transactional=True)
+        else:
+            # Local streams dead-letter to Redis, where they can be inspected: add first, then ACK
+            transport_for(dlq).add(dlq, encode(payload))
+            transport.ack(stream, self.consumer_group, message_id)
+
+        self.counters["dead_lettered"] += 1
+        self._record("dead_lettered", 1)
+        print(f"[{self.consumer_name}] Dead-lettered {message_id} from {stream} after {attempts} attempts")
+
+    def retry_due(self) -> bool:
+        """Whether a reclaimed entry's backoff has elapsed (no Redis call)."""
+        return bool(self._retry_queue) and self._retry_queue[0][0] <= time.monotonic()
+
+    def due_retries(self, limit: int = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Pop reclaimed entries whose backoff has elapsed (at most `limit`), as (stream, message_id, data)."""
+        now = time.monotonic()
+        due = []
+        while self._retry_queue and self._retry_queue[0][0] <= now and (limit is None or len(due) < limit):
+            _, _, stream, message_id, data = heapq.heappop(self._retry_queue)
+            due.append((stream, message_id, data))
+
+        if due:
+            self.counters["retried"] += len(due)
+            self._record("retried", len(due))
+        return due
+
+    def _record(self, counter: str, amount: int):
+        if amount:
+            try:
+                self.redis_client.hincrby(RECOVERY_STATS_KEY, f"{self.consumer_group}:{counter}", amount)
+            except redis.exceptions.RedisError:
+                pass  # Local counters are still accurate
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters, waiting=len(self._retry_queue))
@@ -0,0 +1,75 @@
+import os
+import importlib
+from typing import Dict, Any, List, Iterable
+
+from src.ingestion.chunking import estimate_tokens
+
+# Which router the coordinator uses: a name from ROUTERS or "package.module:ClassName".
+# "all" (the default) fans every chunk out to every requested specialist; "rules" opts in to RuleRouter.
+ROUTER = os.getenv("ROUTER", "all")
+ROUTING_SHORT_TOKENS = int(os.getenv("ROUTING_SHORT_TOKENS", 20))  # below this, no structure review
+ROUTING_TONE_LANGUAGES = os.getenv("ROUTING_TONE_LANGUAGES", "en").split(",")  # "*" = every language
+
+def chunk_features(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Cheap features of a chunk entry, mostly precomputed by the chunker."""
+    tokens = data.get("tokens")
+    return {
+        "tokens": int(tokens) if tokens else estimate_tokens(data.get("text", "")),
+        "heading_only": data.get("heading_only") == "1",
+        "language": data.get("language", "en"),
+    }
+
+def requested_specialties(data: Dict[str, Any], specialties: Iterable[str]) -> List[str]:
+    """The subset of `specialties` the document opted into ("specialties" field; all if absent)."""
+    requested = data.get("specialties")
+    if not requested:
+        return list(specialties)
+    wanted = {s.strip() for s in requested.split(",")}
+    return [s for s in specialties if s in wanted]
+
+class Router:
+    """Decides which specialists review a chunk. Subclass and override `select`."""
+
+    def route(self, data: Dict[str, Any], specialties: Iterable[str]) -> List[str]:
+        candidates = requested_specialties(data, specialties)
+        return self.select(chunk_features(data), candidates)
+
+    def select(self, features: Dict[str, Any], specialties: List[str]) -> List[str]:
+        return specialties
+
+class RuleRouter(Router):
+    """
+    - a chunk that is only a heading gets a grammar pass only;
+    - short chunks skip structure review;
+    - tone is only reviewed for languages in `tone_languages`.
+    """
+
+    def __init__(self, short_tokens: int = None, tone_languages: List[str] = None):
+        self.short_tokens = short_tokens if short_tokens is not None else ROUTING_SHORT_TOKENS
+        self.tone_languages = tone_languages or ROUTING_TONE_LANGUAGES
+
+    def select(self, features, specialties):
+        if features["heading_only"]:
+            return [s for s in specialties if s == "grammar"]
+
+        skip = set()
+        if features["tokens"] < self.short_tokens:
+            skip.add("structure")
+        if "*" not in self.tone_languages and features["language"] not in self.tone_languages:
+            skip.add("tone")
+        return [s for s in specialties if s not in skip]
+
+ROUTERS = {
+    "all": Router,
+    "rules": RuleRouter,
+}
+
+def load_router(name: str = None) -> Router:
+    """Build a router by registry name, or import one given as "package.module:ClassName"."""
+    name = name or ROUTER
+    if ":" in name:
+        module, _, cls = name.partition(":")
+        return getattr(importlib.import_module(module), cls)()
+    if name not in ROUTERS:
+        raise ValueError(f"Unknown router '{name}' (expected one of {sorted(ROUTERS)} or module:Class)")
+    return ROUTERS[name]()
@@ -1,10 +1,25 @@
+import os
 import time
 import json
 import random
+import asyncio
 from datetime import datetime
 from .base import BaseAgent
+from .async_base import AsyncBaseAgent
+from .inference import ReviewBackend, dummy_analysis, load_backend
+from .routing import Router, load_router
+from src.core.cache import SuggestionCache, CACHE_ENABLED
+from src.core.documents import DocumentStore
+from src.core.payloads import PayloadStore, CLAIM_CHECK
+from src.core.tracing import activate
 from src.core.redis_client import (
     RedisClient,
+    DIRECT_TOPOLOGY,
+    STREAM_DOC_TASKS,
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
     STREAM_SUGGESTIONS_GRAMMAR,
     STREAM_SUGGESTIONS_CLARITY,
     STREAM_SUGGESTIONS_TONE,
@@ -15,87 +30,339 @@ from src.core.redis_client import (
     GROUP_STRUCTURE,
 )
 
+def specialist_input(stream):
+    """Where a specialist reads: its own stream, or the tasks stream in the direct topology."""
+    return STREAM_DOC_TASKS if DIRECT_TOPOLOGY else stream
+
+# specialty -> (input stream, output stream, consumer group)
+SPECIALTIES = {
+    "grammar": (specialist_input(STREAM_DOC_GRAMMAR), STREAM_SUGGESTIONS_GRAMMAR, GROUP_GRAMMAR),
+    "clarity": (specialist_input(STREAM_DOC_CLARITY), STREAM_SUGGESTIONS_CLARITY, GROUP_CLARITY),
+    "tone": (specialist_input(STREAM_DOC_TONE), STREAM_SUGGESTIONS_TONE, GROUP_TONE),
+    "structure": (specialist_input(STREAM_DOC_STRUCTURE), STREAM_SUGGESTIONS_STRUCTURE, GROUP_STRUCTURE),
+}
+
+# Chunk fields copied onto its suggestions, to map them back to the source document
+CHUNK_LOCATION_FIELDS = ("start", "end")
+
+# Micro-batching: chunks per model call (0 = one chunk per call, SpecialistAgent) and how
+# long the first chunk of a batch may wait for more
+MODEL_BATCH_SIZE = int(os.getenv("MODEL_BATCH_SIZE", 0))
+MODEL_BATCH_WAIT_MS = float(os.getenv("MODEL_BATCH_WAIT_MS", 50))
+
+def build_suggestion(specialty, source_agent, data, analysis=None):
+    """Build the suggestion for a chunk from a model's analysis (the dummy one by default)."""
+    text = data.get("text", "")
+    analysis = analysis or dummy_analysis(specialty, text)
+    suggestion = {
+        "doc_id": data.get("doc_id"),
+        "chunk_id": data.get("chunk_id"),
+        "original_text": text[:50] + "...",
+        "suggested_text": analysis["suggested_text"],
+        "explanation": analysis["explanation"],
+        "source_agent": source_agent,
+        "type": specialty,
+        "severity": analysis["severity"],
+        "timestamp": datetime.now().isoformat()
+    }
+    # Where the chunk sits in the source document, when the producer recorded it
+    for field in CHUNK_LOCATION_FIELDS:
+        if field in data:
+            suggestion[field] = data[field]
+    return suggestion
+
+def cached_suggestion(hit, data):
+    """A cached suggestion addressed to this chunk, as the specialist would have written it."""
+    suggestion = {**hit, "doc_id": data.get("doc_id", "unknown"), "chunk_id": data.get("chunk_id", "unknown"),
+                  "timestamp": datetime.now().isoformat(), "cached": "1"}
+    suggestion.update({k: data[k] for k in CHUNK_LOCATION_FIELDS if k in data})
+    return suggestion
+
+def review_chunk(specialty, source_agent, data, payloads, cache=None, claim_check=False, analysis=None):
+    """
+    Build the suggestion for a chunk entry (inline or claim-checked text), cache it,
+    and, in claim-check mode, move the suggested text to the payload store.
+    """
+    if "text" not in data:
+        data = {**data, "text": payloads.field(data, "text")}
+    suggestion = build_suggestion(specialty, source_agent, data, analysis)
+    if claim_check:
+        suggestion = payloads.check_in(suggestion, ("suggested_text",))
+    if cache:
+        cache.put(data, specialty, suggestion)
+    return suggestion
+
+class ConsumerRouting:
+    """
+    The coordinator's routing, done by each specialist in the direct topology. Every group
+    reads every task; `screen` tells whether this specialty reviews the chunk. The decision
+    is the same in every group, so only one records it for the aggregator: the first routed
+    specialty (its own result follows the record), or the first specialty if none is routed.
+    """
+
+    def __init__(self, specialty: str, redis_client, cache: SuggestionCache = None, router: Router = None):
+        self.specialty = specialty
+        self.cache = cache
+        self.router = router or load_router()
+        self.store = DocumentStore(redis_client)
+
+    def screen(self, data):
+        """(routed here, cached suggestion or None): review the chunk only if routed and not cached."""
+        doc_id = data.get("doc_id", "unknown")
+        routes = self.router.route(data, SPECIALTIES)
+        if self.specialty == (routes[0] if routes else next(iter(SPECIALTIES))):
+            self.store.route(doc_id, data.get("chunk_id", "unknown"), len(routes))
+            if not routes:
+                self.store.close_if_complete(doc_id)
+        if self.specialty not in routes:
+            return False, None
+        hit = self.cache.get_many(data, [self.specialty]).get(self.specialty) if self.cache else None
+        return True, (cached_suggestion(hit, data) if hit is not None else None)
+
 class SpecialistAgent(BaseAgent):
-    def __init__(self, specialty: str, input_stream: str, output_stream: str, consumer_group: str, consumer_name: str):
+    def __init__(self, specialty: str, input_stream: str, output_stream: str, consumer_group: str, consumer_name: str,
+                 claim_check: bool = None, **agent_kwargs):
         super().__init__(
             stream_name=input_stream,
             consumer_group=consumer_group,
-            consumer_name=consumer_name
+            consumer_name=consumer_name,
+            **agent_kwargs
         )
         self.specialty = specialty
         self.output_stream = output_stream
+        self.cache = SuggestionCache(self.redis_client) if CACHE_ENABLED else None
+        self.payloads = PayloadStore(self.redis_client)
+        self.claim_check = CLAIM_CHECK if claim_check is None else claim_check
+        # Direct topology: this agent reads the tasks stream and picks its own chunks
+        self.routing = ConsumerRouting(specialty, self.redis_client, self.cache) if input_stream == STREAM_DOC_TASKS else None
+
+    def screen(self, data):
+        """Direct topology: skip the chunks routed elsewhere, answer cached ones. True if handled."""
+        if self.routing is None:
+            return False
+        routed, hit = self.routing.screen(data)
+        if hit is not None:
+            self.emit(self.output_stream, hit)
+            print(f"[{self.consumer_name}] -> Cache hit, pushed to {self.output_stream}")
+        return not routed or hit is not None
 
     def process_message(self, message_id, data):
         """
         Simulate AI processing and return dummy suggestions.
         """
-        doc_id = data.get("doc_id")
         chunk_id = data.get("chunk_id")
-        text = data.get("text", "")
-        
+        if self.screen(data):
+            return
+
         print(f"[{self.consumer_name}] Analyzing chunk {chunk_id} for {self.specialty}...")
         
         # Simulate processing time
         time.sleep(random.uniform(0.5, 1.5))
         
-        # Generate dummy suggestion
-        suggestion = {
-            "doc_id": doc_id,
-            "chunk_id": chunk_id,
-            "original_text": text[:50] + "...",
-            "suggested_text": f"{text}\n[AI SERVICE: {self.specialty.upper()} DONE]",
-            "explanation": f"This is a dummy explanation from the {self.specialty} agent.",
-            "source_agent": self.consumer_name,
-            "type": self.specialty,
-            "severity": random.choice(["low", "medium", "high"]),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Push to output stream
-        # Redis streams are strings, so we dump JSON
-        # Actually, let's keep it flat if possible, but nested JSON is easier to transport as a single field "data"
-        # but standard redis pattern is field-value pairs.
-        # I'll use standard field-value pairs for the top level keys.
-        
-        # Flatten for Redis
-        redis_payload = {k: str(v) for k, v in suggestion.items()}
-        
-        self.redis_client.xadd(self.output_stream, redis_payload)
+        # Generate dummy suggestion and push to output stream
+        redis_payload = review_chunk(self.specialty, self.consumer_name, data, self.payloads, self.cache, self.claim_check)
+
+        self.emit(self.output_stream, redis_payload)
+        print(f"[{self.consumer_name}] -> Suggestion posted to {self.output_stream}")
+
+class BatchedSpecialistAgent(SpecialistAgent):
+    """
+    Specialist with dynamic batching, like an inference server: chunks are gathered until
+    `max_batch` are waiting or the first has waited `max_wait_ms`, reviewed in one backend
+    call, and each chunk's suggestion is then emitted and its entry ACKed on its own.
+    """
+
+    def __init__(self, specialty: str, input_stream: str, output_stream: str, consumer_group: str, consumer_name: str,
+                 max_batch: int = None, max_wait_ms: float = None, backend: ReviewBackend = None, **agent_kwargs):
+        super().__init__(specialty, input_stream, output_stream, consumer_group, consumer_name, **agent_kwargs)
+        if self.workers:
+            raise ValueError("Micro-batched specialists call the backend from the read loop; don't combine with --workers")
+        self.max_batch = max_batch or MODEL_BATCH_SIZE or 1
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else MODEL_BATCH_WAIT_MS) / 1000
+        self.backend = backend or load_backend()
+        self._model_batch = []  # (stream, message_id, data, span)
+        self._model_batch_started = None
+
+    def _start_message(self, stream, message_id, data):
+        span = self.tracer.start(message_id, data)
+        activate(None)  # Made current again when its suggestion is emitted
+        if not self._model_batch:
+            self._model_batch_started = time.monotonic()
+        self._model_batch.append((stream, message_id, data, span))
+        if len(self._model_batch) >= self.max_batch:
+            self.run_batch()
+
+    def _read_count(self):
+        return max(1, self.max_batch - len(self._model_batch))
+
+    def _block_ms(self):
+        block = super()._block_ms()
+        if self._model_batch:
+            remaining = self.max_wait - (time.monotonic() - self._model_batch_started)
+            block = min(block, int(remaining * 1000))
+        return max(1, block)
+
+    def process_pending_messages(self):
+        super().process_pending_messages()
+        # Called every loop iteration: send a partial batch once its first chunk waited long enough
+        if self._model_batch and time.monotonic() - self._model_batch_started >= self.max_wait:
+            self.run_batch()
+
+    def run_batch(self):
+        """One backend call for the gathered chunks; a failed call leaves them all in the PEL."""
+        batch, self._model_batch = self._model_batch, []
+        if self.routing is not None:
+            batch = [entry for entry in batch if not self._screened(*entry)]
+            if not batch:
+                return
+        try:
+            items = [data if "text" in data else {**data, "text": self.payloads.field(data)} for _, _, data, _ in batch]
+            analyses = self.backend.review(self.specialty, [item["text"] for item in items])
+        except Exception as e:
+            for _, _, _, span in batch:
+                self.tracer.failed(span)
+            print(f"[{self.consumer_name}] Error reviewing a batch of {len(batch)} chunks: {e}")
+            return
+
+        for (stream, message_id, _, span), item, analysis in zip(batch, items, analyses):
+            span.processed()
+            activate(span)
+            try:
+                suggestion = review_chunk(self.specialty, self.consumer_name, item, self.payloads, self.cache,
+                                          self.claim_check, analysis)
+                self.emit(self.output_stream, suggestion)
+                self.ack(stream, message_id)
+                self.done(span)
+            except Exception as e:
+                self.tracer.failed(span)
+                print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
+            finally:
+                activate(None)
+        print(f"[{self.consumer_name}] -> {len(batch)} suggestions from one model call posted to {self.output_stream}")
+
+    def _screened(self, stream, message_id, data, span):
+        """Direct topology: ACK a chunk routed elsewhere or answered from the cache right away."""
+        activate(span)
+        try:
+            if not self.screen(data):
+                return False
+            span.processed()
+            self.ack(stream, message_id)
+            self.done(span)
+        except Exception as e:
+            self.tracer.failed(span)
+            print(f"[{self.consumer_name}] Error processing message {message_id}: {e}")
+        finally:
+            activate(None)
+        return True
+
+    def run(self):
+        super().run()
+        # Stopped with a partial batch: finish it rather than leaving it for the recovery sweep
+        if self._model_batch:
+            self.run_batch()
+            self.flush()
+
+class AsyncSpecialistAgent(AsyncBaseAgent):
+    """Specialist whose (simulated) model call is awaited, so N chunks can be in flight per process."""
+
+    def __init__(self, specialty: str, input_stream: str, output_stream: str, consumer_group: str, consumer_name: str,
+                 claim_check: bool = None, **agent_kwargs):
+        super().__init__(
+            stream_name=input_stream,
+            consumer_group=consumer_group,
+            consumer_name=consumer_name,
+            **agent_kwargs
+        )
+        self.specialty = specialty
+        self.output_stream = output_stream
+        # The cache and payload clients are sync; calls are pushed to a thread
+        self.cache = SuggestionCache() if CACHE_ENABLED else None
+        self.payloads = PayloadStore()
+        self.claim_check = CLAIM_CHECK if claim_check is None else claim_check
+        self.routing = ConsumerRouting(specialty, RedisClient.get_instance(), self.cache) if input_stream == STREAM_DOC_TASKS else None
+
+    async def process_message(self, message_id, data):
+        chunk_id = data.get("chunk_id")
+        if self.routing is not None:
+            routed, hit = await asyncio.to_thread(self.routing.screen, data)
+            if hit is not None:
+                await self.emit(self.output_stream, hit)
+                print(f"[{self.consumer_name}] -> Cache hit, pushed to {self.output_stream}")
+            if not routed or hit is not None:
+                return
+
+        print(f"[{self.consumer_name}] Analyzing chunk {chunk_id} for {self.specialty}...")
+
+        # Simulated model call; other chunks keep being read and processed meanwhile
+        await asyncio.sleep(random.uniform(0.5, 1.5))
+
+        redis_payload = await asyncio.to_thread(
+            review_chunk, self.specialty, self.consumer_name, data, self.payloads, self.cache, self.claim_check
+        )
+
+        await self.emit(self.output_stream, redis_payload)
         print(f"[{self.consumer_name}] -> Suggestion posted to {self.output_stream}")
 
 # Factory functions to create specific agents
-def create_grammar_agent(name_suffix="1"):
+def create_grammar_agent(name_suffix="1", **agent_kwargs):
     return SpecialistAgent(
         specialty="grammar",
-        input_stream="doc.review.grammar",
+        input_stream=SPECIALTIES["grammar"][0],
         output_stream=STREAM_SUGGESTIONS_GRAMMAR,
         consumer_group=GROUP_GRAMMAR,
-        consumer_name=f"grammar-{name_suffix}"
+        consumer_name=f"grammar-{name_suffix}",
+        **agent_kwargs
     )
 
-def create_clarity_agent(name_suffix="1"):
+def create_clarity_agent(name_suffix="1", **agent_kwargs):
     return SpecialistAgent(
         specialty="clarity",
-        input_stream="doc.review.clarity",
+        input_stream=SPECIALTIES["clarity"][0],
         output_stream=STREAM_SUGGESTIONS_CLARITY,
         consumer_group=GROUP_CLARITY,
-        consumer_name=f"clarity-{name_suffix}"
+        consumer_name=f"clarity-{name_suffix}",
+        **agent_kwargs
     )
 
-def create_tone_agent(name_suffix="1"):
+def create_tone_agent(name_suffix="1", **agent_kwargs):
     return SpecialistAgent(
         specialty="tone",
-        input_stream="doc.review.tone",
+        input_stream=SPECIALTIES["tone"][0],
         output_stream=STREAM_SUGGESTIONS_TONE,
         consumer_group=GROUP_TONE,
-        consumer_name=f"tone-{name_suffix}"
+        consumer_name=f"tone-{name_suffix}",
+        **agent_kwargs
     )
 
-def create_structure_agent(name_suffix="1"):
+def create_structure_agent(name_suffix="1", **agent_kwargs):
     return SpecialistAgent(
         specialty="structure",
-        input_stream="doc.review.structure",
+        input_stream=SPECIALTIES["structure"][0],
         output_stream=STREAM_SUGGESTIONS_STRUCTURE,
         consumer_group=GROUP_STRUCTURE,
-        consumer_name=f"structure-{name_suffix}"
+        consumer_name=f"structure-{name_suffix}",
+        **agent_kwargs
+    )
+
+def create_batched_specialist_agent(specialty, name_suffix="1", **agent_kwargs):
+    input_stream, output_stream, consumer_group = SPECIALTIES[specialty]
+    return BatchedSpecialistAgent(
+        specialty=specialty,
+        input_stream=input_stream,
+        output_stream=output_stream,
+        consumer_group=consumer_group,
+        consumer_name=f"{specialty}-{name_suffix}",
+        **agent_kwargs
+    )
+
+def create_async_specialist_agent(specialty, name_suffix="1", **agent_kwargs):
+    input_stream, output_stream, consumer_group = SPECIALTIES[specialty]
+    return AsyncSpecialistAgent(
+        specialty=specialty,
+        input_stream=input_stream,
+        output_stream=output_stream,
+        consumer_group=consumer_group,
+        consumer_name=f"{specialty}-{name_suffix}",
+        **agent_kwargs
     )
@@ -0,0 +1,320 @@
+import sys
+import json
+import math
+import time
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import shortuuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+from src.core.codec import CODEC, decode
+from src.core.payloads import CLAIM_CHECK
+from src.core.redis_client import (
+    RedisClient, MESH_TOPOLOGY, STREAM_PARTITIONS, STREAM_REVIEW_SUMMARY, physical_streams, id_ms,
+)
+from src.core.retention import MESH_STREAMS, id_at
+from src.core.tracing import docs_timings
+from src.ingestion.chunking import chunk_paragraphs, paragraphs_from_text
+from src.ingestion.producer import ingest_chunks, priority_fields, specialty_fields
+
+# Synthetic documents: sizes in paragraphs drawn from one of these distributions
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+INGEST_PATHS = ("producer", "api")
+
+WORDS = (
+    "the mesh routes every chunk to the specialists that review its grammar clarity tone and structure "
+    "while an aggregator collects their suggestions into one summary per document which is then "
+    "streamed back to the client wuts up this sentance has a few mistakes in it on purpose ok"
+).split()
+
+def log(message: str):
+    """Progress goes to stderr; stdout is kept for the JSON report."""
+    print(f"[bench] {message}", file=sys.stderr, flush=True)
+
+def document_size(rng: random.Random, mean: int, distribution: str) -> int:
+    """Paragraphs in one synthetic document, at least 1."""
+    if distribution == "fixed":
+        size = mean
+    elif distribution == "uniform":
+        size = rng.randint(1, 2 * mean - 1)
+    elif distribution == "exponential":
+        size = rng.expovariate(1 / mean)
+    elif distribution == "lognormal":
+        # sigma 1: a long tail of big documents, mean `mean`
+        size = rng.lognormvariate(math.log(mean) - 0.5, 1.0)
+    else:
+        raise ValueError(f"Unknown distribution '{distribution}' (expected one of {DISTRIBUTIONS})")
+    return max(1, round(size))
+
+def synthetic_text(rng: random.Random, paragraphs: int, words: int) -> str:
+    """Plain text for /analyze and the producer: one line per paragraph, about one in eight a heading."""
+    lines = []
+    for i in range(paragraphs):
+        if i % 8 == 0:
+            lines.append("# " + " ".join(rng.choices(WORDS, k=4)).capitalize())
+        else:
+            n = max(3, round(rng.gauss(words, words / 4)))
+            lines.append(" ".join(rng.choices(WORDS, k=n)).capitalize() + ".")
+    return "\n".join(lines)
+
+def synthetic_documents(count: int, paragraphs: int, distribution: str, words: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {"doc_id": f"doc-{i}", "text": synthetic_text(rng, document_size(rng, paragraphs, distribution), words)}
+        for i in range(count)
+    ]
+
+def corpus_documents(path: str) -> List[Dict[str, Any]]:
+    """
+    A JSONL corpus: one document per line with "text" (one line per paragraph) and
+    optionally "doc_id", "specialties" (list or comma-separated), "priority" and "tenant".
+    """
+    documents = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            if "text" not in document:
+                raise ValueError(f"{path}:{number}: a corpus document needs a \"text\" field")
+            document.setdefault("doc_id", f"doc-{number}")
+            if isinstance(document.get("specialties"), list):
+                document["specialties"] = ",".join(document["specialties"])
+            documents.append(document)
+    return documents
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """count / avg / p50 / p95 / p99 / max (nearest rank) of a list of milliseconds."""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    rank = lambda q: values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values), 1),
+        "p50_ms": round(rank(0.50), 1),
+        "p95_ms": round(rank(0.95), 1),
+        "p99_ms": round(rank(0.99), 1),
+        "max_ms": round(values[-1], 1),
+    }
+
+class RedisSnapshot:
+    """Server-wide command counters and memory, to diff before / after a run."""
+
+    def __init__(self, redis_client):
+        stats, commands, memory = (redis_client.info(section) for section in ("stats", "commandstats", "memory"))
+        self.at = time.monotonic()
+        self.commands = stats["total_commands_processed"]
+        self.calls = {name.removeprefix("cmdstat_"): entry["calls"] for name, entry in commands.items()}
+        self.used_memory = memory["used_memory"]
+        self.peak_memory = memory["used_memory_peak"]
+
+    def diff(self, before: "RedisSnapshot") -> Dict[str, Any]:
+        elapsed = self.at - before.at
+        calls = {name: n - before.calls.get(name, 0) for name, n in self.calls.items()}
+        commands = self.commands - before.commands
+        return {
+            "commands": commands,
+            "ops_per_sec": round(commands / elapsed, 1) if elapsed > 0 else None,
+            "commandstats": {name: n for name, n in sorted(calls.items(), key=lambda item: -item[1]) if n > 0},
+            "used_memory_start": before.used_memory,
+            "used_memory_end": self.used_memory,
+            "used_memory_peak": self.peak_memory,
+        }
+
+def stream_memory(redis_client) -> Dict[str, int]:
+    """MEMORY USAGE of the mesh streams that exist."""
+    pipe = redis_client.pipeline(transaction=False)
+    for stream in MESH_STREAMS:
+        pipe.memory_usage(stream, samples=0)
+    return {stream: used for stream, used in zip(MESH_STREAMS, pipe.execute()) if used}
+
+class LoadGenerator:
+    """
+    Sends the documents through the producer code or /analyze, each under a fresh ID
+    (a re-upload of a known ID would only send its changed chunks), on a Poisson
+    schedule of `rate` documents/sec (0 = as fast as possible).
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], run_id: str, via: str = "producer", rate: float = 0,
+                 api_url: str = "http://localhost:8000", specialties=None, priority: str = None, seed: int = 0):
+        self.documents = documents
+        self.run_id = run_id
+        self.via = via
+        self.rate = rate
+        self.api_url = api_url.rstrip("/")
+        self.specialties = specialties
+        self.priority = priority
+        self.rng = random.Random(seed)
+        self.planned = [self.doc_id(document) for document in documents]
+        self.sent: Dict[str, float] = {}  # doc_id -> time.time() when its upload started
+        self.chunks: Dict[str, int] = {}
+        self.failed = set()
+        self.rejected = 0
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def expected(self) -> set:
+        """Documents that were or will be sent, without the failed uploads."""
+        with self._lock:
+            return set(self.planned) - self.failed
+
+    def uploads(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.sent)
+
+    def doc_id(self, document: Dict[str, Any]) -> str:
+        return f"bench-{self.run_id}-{document['doc_id']}"
+
+    def _fields(self, document):
+        specialties = document.get("specialties") or (",".join(self.specialties) if self.specialties else None)
+        fields = priority_fields(document.get("priority") or self.priority, document.get("tenant"))
+        fields.update(specialty_fields(specialties.split(",") if specialties else None))
+        return fields
+
+    def _via_producer(self, r, doc_id, document) -> int:
+        chunks = chunk_paragraphs(paragraphs_from_text(document["text"]))
+        return len(ingest_chunks(r, doc_id, chunks, fields=self._fields(document)).changed)
+
+    def _via_api(self, doc_id, document) -> int:
+        fields = self._fields(document)
+        query = {"text": document["text"], "doc_id": doc_id, "priority": fields["priority"]}
+        query.update({k: fields[k] for k in ("specialties", "tenant") if k in fields})
+        request = urllib.request.Request(f"{self.api_url}/analyze?{urllib.parse.urlencode(query)}", method="POST",
+                                         headers={"X-Client-Id": f"bench-{self.run_id}"})
+        while True:
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    return json.load(response)["changed"]
+            except urllib.error.HTTPError as e:
+                if e.code != 429:
+                    raise
+                # Admission control: back off as told and try again
+                self.rejected += 1
+                time.sleep(float(e.headers.get("Retry-After", 1)))
+
+    def run(self):
+        r = RedisClient.get_instance()
+        next_at = time.monotonic()
+        for document in self.documents:
+            if self.rate > 0:
+                next_at += self.rng.expovariate(self.rate)
+                time.sleep(max(0.0, next_at - time.monotonic()))
+            doc_id = self.doc_id(document)
+            with self._lock:
+                self.sent[doc_id] = time.time()
+            try:
+                if self.via == "api":
+                    chunks = self._via_api(doc_id, document)
+                else:
+                    chunks = self._via_producer(r, doc_id, document)
+                with self._lock:
+                    self.chunks[doc_id] = chunks
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(f"{doc_id}: {e}")
+                    self.failed.add(doc_id)
+                    del self.sent[doc_id]
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+def wait_for_summaries(generator: LoadGenerator, sender: threading.Thread, started: float,
+                       timeout: float) -> Dict[str, tuple]:
+    """doc_id -> (status, time.time() of its summary entry), until every sent document has one or `timeout`."""
+    stream_client = RedisClient.get_binary_instance()
+    streams = {stream: id_at(started - 1) for stream in physical_streams(STREAM_REVIEW_SUMMARY)}
+    summaries: Dict[str, tuple] = {}
+    deadline = time.monotonic() + timeout
+    last_report = time.monotonic()
+    while time.monotonic() < deadline:
+        expected = generator.expected()
+        if not sender.is_alive() and expected <= set(summaries):
+            break
+        for stream, entries in stream_client.xread(streams, count=1000, block=500) or []:
+            stream = stream.decode()
+            for message_id, fields in entries:
+                message_id = message_id.decode()
+                streams[stream] = message_id
+                data = decode(fields)
+                doc_id = data.get("doc_id")
+                # A document may get more than one summary (e.g. timed out, then completed): keep the first
+                if doc_id in expected and doc_id not in summaries:
+                    summaries[doc_id] = (data.get("status"), id_ms(message_id) / 1000)
+        if time.monotonic() - last_report >= 5:
+            last_report = time.monotonic()
+            log(f"{len(summaries)}/{len(expected)} documents done")
+    return summaries
+
+def stage_report(doc_ids: List[str]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """stage -> phase -> count / avg / p50 / p95 / p99 (ms, histogram bucket bounds) over the documents."""
+    stages: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for (stage, phase), stats in sorted(docs_timings(RedisClient.get_instance(), doc_ids).items()):
+        stages.setdefault(stage, {})[phase] = {
+            k: (round(v, 1) if v != float("inf") else None) for k, v in stats.items()
+        }
+    return stages
+
+def run_bench(documents: List[Dict[str, Any]], config: Dict[str, Any], via: str = "producer", rate: float = 0,
+              api_url: str = None, specialties=None, priority: str = None, seed: int = 0,
+              timeout: float = 300, settle: float = 2.0) -> Dict[str, Any]:
+    """Send `documents` through a running mesh and measure it. Returns the JSON-ready report."""
+    r = RedisClient.get_instance()
+    run_id = shortuuid.uuid()[:8]
+    generator = LoadGenerator(documents, run_id, via, rate, api_url or "http://localhost:8000", specialties, priority, seed)
+
+    before = RedisSnapshot(r)
+    started = time.time()
+    log(f"run {run_id}: sending {len(documents)} documents via {via}")
+    sender = generator.start()
+    summaries = wait_for_summaries(generator, sender, started, timeout)
+    finished = max([at for _, at in summaries.values()], default=time.time())
+    after = RedisSnapshot(r)
+
+    # Stage timings are published every TRACE_FLUSH_INTERVAL; let the last ones land
+    time.sleep(settle)
+    uploads = generator.uploads()
+    sent = list(uploads)
+    elapsed = finished - started
+    done_chunks = sum(generator.chunks.get(doc_id, 0) for doc_id in summaries)
+    statuses: Dict[str, int] = {}
+    for status, _ in summaries.values():
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "run_id": run_id,
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "config": {
+            **config,
+            "via": via,
+            "rate": rate,
+            "seed": seed,
+            "topology": MESH_TOPOLOGY,
+            "partitions": STREAM_PARTITIONS,
+            "codec": CODEC,
+            "claim_check": CLAIM_CHECK,
+        },
+        "documents": {
+            "sent": len(sent),
+            "chunks": sum(generator.chunks.values()),
+            "summaries": statuses,
+            "missing": len(set(sent) - set(summaries)),
+            "rejected_429": generator.rejected,
+            "errors": generator.errors,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput": {
+            "docs_per_s": round(len(summaries) / elapsed, 2) if elapsed > 0 else None,
+            "chunks_per_s": round(done_chunks / elapsed, 2) if elapsed > 0 else None,
+        },
+        # Upload started -> summary written, per document
+        "end_to_end": percentiles([(at - uploads[doc_id]) * 1000 for doc_id, (_, at) in summaries.items()]),
+        "stages": stage_report(sent),
+        "redis": {**after.diff(before), "stream_memory_bytes": sum(stream_memory(r).values())},
+    }
@@ -0,0 +1,225 @@
+import os
+import time
+import threading
+import redis
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.core.redis_client import (
+    RedisClient, LANED_STREAMS, logical_stream, physical_streams, stream_lane, id_key, id_ms,
+)
+
+# Admission control: new documents are turned away (HTTP 429 + Retry-After) or paced
+# (bounded-lag producers) while the work streams of their lane are backed up. The backlog
+# is read from XINFO GROUPS at most every ADMISSION_CACHE_TTL seconds, not per request.
+# Each limit applies to the most backed-up work stream of the lane; 0 disables it.
+ADMISSION_MAX_LAG = int(os.getenv("ADMISSION_MAX_LAG", 10000))  # entries not yet delivered (Redis >= 7)
+ADMISSION_MAX_PENDING = int(os.getenv("ADMISSION_MAX_PENDING", 2000))  # delivered, not yet ACKed (PEL)
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 60))  # age (s) of the oldest undelivered entry
+ADMISSION_CACHE_TTL = float(os.getenv("ADMISSION_CACHE_TTL", 1))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", 5))  # seconds, scaled by how far over a limit
+ADMISSION_MAX_RETRY_AFTER = float(os.getenv("ADMISSION_MAX_RETRY_AFTER", 60))
+
+# Per-client token bucket on /analyze, in chunks: CLIENT_RATE per second, bursts up to CLIENT_BURST
+CLIENT_RATE = float(os.getenv("CLIENT_RATE", 100))  # 0 = unlimited
+CLIENT_BURST = int(os.getenv("CLIENT_BURST", 1000))
+CLIENT_MAX_TRACKED = int(os.getenv("CLIENT_MAX_TRACKED", 10000))  # buckets kept (least recently used dropped)
+
+def work_streams() -> List[str]:
+    """Every physical work stream: the tasks stream and specialist inputs, all lanes."""
+    return sorted(s for stream in LANED_STREAMS for s in physical_streams(stream))
+
+class Backlog:
+    """The backlog of one lane: worst lag / pending / wait over its logical work streams."""
+
+    def __init__(self, lag: int = 0, pending: int = 0, wait: float = 0.0):
+        self.lag = lag
+        self.pending = pending
+        self.wait = wait
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"lag": self.lag, "pending": self.pending, "wait_s": round(self.wait, 3)}
+
+class AdmissionController:
+    """
+    Cached view of the work streams' backlog per lane, and the admission decision on it.
+    `refresh` (sync) and `refresh_async` fetch it; `check` only reads the cached snapshot.
+    """
+
+    def __init__(self, max_lag: int = None, max_pending: int = None, max_wait: float = None, ttl: float = None):
+        self.max_lag = ADMISSION_MAX_LAG if max_lag is None else max_lag
+        self.max_pending = ADMISSION_MAX_PENDING if max_pending is None else max_pending
+        self.max_wait = ADMISSION_MAX_WAIT if max_wait is None else max_wait
+        self.ttl = ADMISSION_CACHE_TTL if ttl is None else ttl
+        self.streams = work_streams()
+        self.backlog: Dict[str, Backlog] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_lag or self.max_pending or self.max_wait)
+
+    def refresh_due(self) -> bool:
+        return self.enabled and (self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl)
+
+    def _oldest_queries(self, groups_by_stream) -> List[Tuple[str, str]]:
+        """(stream, last-delivered-id) whose first undelivered entry tells the wait."""
+        queries = []
+        for stream, groups in groups_by_stream.items():
+            if isinstance(groups, Exception) or not groups:
+                continue  # Stream or group not created yet
+            # The least advanced group waits the longest
+            last = min((g["last-delivered-id"] for g in groups), key=id_key)
+            queries.append((stream, last))
+        return queries
+
+    def _update(self, groups_by_stream, oldest: Dict[str, Optional[str]]):
+        now_ms = time.time() * 1000
+        totals: Dict[Tuple[str, str], Backlog] = {}
+        for stream, groups in groups_by_stream.items():
+            if isinstance(groups, Exception) or not groups:
+                continue
+            # Fair queues and partitions of one logical stream add up
+            total = totals.setdefault((logical_stream(stream), stream_lane(stream)), Backlog())
+            total.lag += max(g.get("lag") or 0 for g in groups)
+            total.pending += max(g["pending"] for g in groups)
+            if oldest.get(stream):
+                total.wait = max(total.wait, (now_ms - id_ms(oldest[stream])) / 1000)
+
+        backlog: Dict[str, Backlog] = {}
+        for (_, lane), total in totals.items():
+            worst = backlog.setdefault(lane, Backlog())
+            worst.lag = max(worst.lag, total.lag)
+            worst.pending = max(worst.pending, total.pending)
+            worst.wait = max(worst.wait, total.wait)
+        self.backlog = backlog
+
+    def refresh(self, redis_client: redis.Redis, stream_client: redis.Redis = None):
+        """
+        Fetch the backlog (two pipelined round trips); on errors the previous snapshot stays.
+        Entries may be packed, so they are read with `stream_client` (the binary client).
+        """
+        stream_client = stream_client or RedisClient.get_binary_instance()
+        with self._lock:
+            if not self.refresh_due():
+                return  # Another thread just did
+            self._fetched_at = time.monotonic()
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for stream in self.streams:
+                    pipe.xinfo_groups(stream)
+                groups_by_stream = dict(zip(self.streams, pipe.execute(raise_on_error=False)))
+
+                queries = self._oldest_queries(groups_by_stream)
+                pipe = stream_client.pipeline(transaction=False)
+                for stream, last in queries:
+                    pipe.xrange(stream, min=f"({last}", count=1)
+                entries = pipe.execute(raise_on_error=False)
+            except redis.exceptions.RedisError as e:
+                print(f"[admission] Could not read the backlog: {e}")
+                return
+            self._update(groups_by_stream, self._first_ids(queries, entries))
+
+    async def refresh_async(self, redis_client, stream_client):
+        """Same as `refresh`, on asyncio clients."""
+        if not self.refresh_due():
+            return
+        self._fetched_at = time.monotonic()  # Set first, so concurrent requests don't all refresh
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for stream in self.streams:
+                pipe.xinfo_groups(stream)
+            groups_by_stream = dict(zip(self.streams, await pipe.execute(raise_on_error=False)))
+
+            queries = self._oldest_queries(groups_by_stream)
+            pipe = stream_client.pipeline(transaction=False)
+            for stream, last in queries:
+                pipe.xrange(stream, min=f"({last}", count=1)
+            entries = await pipe.execute(raise_on_error=False)
+        except redis.exceptions.RedisError as e:
+            print(f"[admission] Could not read the backlog: {e}")
+            return
+        self._update(groups_by_stream, self._first_ids(queries, entries))
+
+    @staticmethod
+    def _first_ids(queries, entries) -> Dict[str, Optional[str]]:
+        first = {}
+        for (stream, _), result in zip(queries, entries):
+            if result and not isinstance(result, Exception):
+                message_id = result[0][0]
+                first[stream] = message_id.decode() if isinstance(message_id, bytes) else message_id
+        return first
+
+    def overload(self, lane: str) -> float:
+        """How far the lane's backlog is over its worst limit (>= 1 means over)."""
+        b = self.backlog.get(lane)
+        if b is None:
+            return 0.0
+        return max(
+            b.lag / self.max_lag if self.max_lag else 0,
+            b.pending / self.max_pending if self.max_pending else 0,
+            b.wait / self.max_wait if self.max_wait else 0,
+        )
+
+    def check(self, lane: str) -> Optional[float]:
+        """None if a new document may enter `lane`, else the seconds to wait before retrying."""
+        over = self.overload(lane)
+        if over < 1:
+            return None
+        return min(ADMISSION_MAX_RETRY_AFTER, ADMISSION_RETRY_AFTER * over)
+
+    def wait(self, lane: str, redis_client: redis.Redis = None):
+        """Block until `lane` is back under the limits (bounded-lag producers)."""
+        paused = None
+        while True:
+            if self.refresh_due():
+                self.refresh(redis_client or RedisClient.get_instance())
+            delay = self.check(lane)
+            if delay is None:
+                break
+            if paused is None:
+                paused = time.monotonic()
+                print(f"[Producer] Backlog over limit in lane '{lane}' ({self.backlog[lane].as_dict()}), pausing")
+            time.sleep(min(delay, max(self.ttl, 0.1)))
+        if paused is not None:
+            print(f"[Producer] Resuming after {time.monotonic() - paused:.1f}s")
+
+class TokenBucket:
+    """`rate` tokens per second, holding up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, n: float = 1) -> float:
+        """Take `n` tokens: 0 if granted, else the seconds until they would be (nothing is taken)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        n = min(n, self.burst)  # A request bigger than the burst waits for a full bucket
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+class ClientRateLimiter:
+    """A token bucket per client id, for the API process (not shared between replicas)."""
+
+    def __init__(self, rate: float = None, burst: int = None, max_clients: int = None):
+        self.rate = CLIENT_RATE if rate is None else rate
+        self.burst = CLIENT_BURST if burst is None else burst
+        self.max_clients = max_clients or CLIENT_MAX_TRACKED
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, client: str, n: float = 1) -> float:
+        """0 if `client` may send `n` chunks now, else the seconds until it may."""
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+        self._buckets[client] = bucket
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return bucket.take(n)
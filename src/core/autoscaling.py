@@ -0,0 +1,231 @@
+import os
+import math
+import time
+import redis
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from src.core.redis_client import RedisClient, logical_stream, id_key, id_ms
+from src.core.retention import MESH_STREAMS
+
+# Lag exporter: samples XINFO GROUPS / CONSUMERS of every mesh stream and publishes, per
+# consumer group, the backlog, arrival and service rates, the time to drain the backlog
+# and the consumers needed to meet a latency SLO, for an external scaler (KEDA's
+# Prometheus trigger, see `keda-scalers --scaler prometheus`).
+LAG_INTERVAL = float(os.getenv("LAG_INTERVAL", 5))  # seconds between samples
+LAG_RATE_WINDOW = float(os.getenv("LAG_RATE_WINDOW", 60))  # seconds the rates are averaged over
+LAG_SLO_SECONDS = float(os.getenv("LAG_SLO_SECONDS", 30))  # target wait of a new entry (XADD to read)
+LAG_CONSUMER_IDLE = float(os.getenv("LAG_CONSUMER_IDLE", 60))  # seconds without a read before a consumer is gone
+# Before Redis 7 (no "lag" / "entries-read" in XINFO GROUPS) entries are counted with XRANGE,
+# at most this many per stream and sample: a larger lag is reported as the limit.
+LAG_SCAN_LIMIT = int(os.getenv("LAG_SCAN_LIMIT", 10000))
+LAG_MAX_DRAIN = float(os.getenv("LAG_MAX_DRAIN", 86400))  # reported when the backlog is not shrinking
+
+_LABELS = ["stream", "group"]
+GROUP_LAG = Gauge("mesh_group_lag", "Entries not yet delivered to the group", _LABELS)
+GROUP_PENDING = Gauge("mesh_group_pending", "Entries delivered, not yet ACKed (PEL)", _LABELS)
+GROUP_CONSUMERS = Gauge("mesh_group_consumers", "Consumers that read within LAG_CONSUMER_IDLE", _LABELS)
+GROUP_ARRIVAL_RATE = Gauge("mesh_group_arrival_rate", "Entries/s added for the group", _LABELS)
+GROUP_SERVICE_RATE = Gauge("mesh_group_service_rate", "Entries/s the group processed", _LABELS)
+GROUP_CONSUMER_RATE = Gauge("mesh_group_consumer_rate", "Entries/s one busy consumer processes", _LABELS)
+GROUP_OLDEST_WAIT = Gauge("mesh_group_oldest_wait_seconds", "Age of the oldest undelivered entry", _LABELS)
+GROUP_DRAIN = Gauge("mesh_group_drain_seconds", "Estimated time to clear lag + pending at the current rates", _LABELS)
+GROUP_DESIRED = Gauge("mesh_group_desired_consumers", "Consumers needed to keep up and meet LAG_SLO_SECONDS", _LABELS)
+
+def _decoded(message_id) -> str:
+    return message_id.decode() if isinstance(message_id, bytes) else message_id
+
+class GroupSample:
+    """One sample of a consumer group, summed over the physical streams of its logical stream."""
+
+    def __init__(self):
+        self.lag = 0
+        self.pending = 0
+        self.delivered = 0  # entries delivered since the previous sample
+        self.consumers = set()
+        self.oldest_ms: Optional[int] = None  # stream ID time of the oldest undelivered entry
+
+class GroupRates:
+    """Running totals of one group over the last LAG_RATE_WINDOW seconds, and its estimates."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.samples = deque()  # (time, arrived total, served total)
+        self.arrived = 0
+        self.served = 0
+        self.backlog: Optional[int] = None
+        self.pending: Optional[int] = None
+        self.consumer_rate: Optional[float] = None  # learned while the group had a backlog
+
+    def add(self, now: float, sample: GroupSample):
+        if self.backlog is not None:
+            # Whatever was delivered left the lag; what left the PEL was ACKed (or dead-lettered)
+            self.arrived += max(0, sample.lag + sample.delivered - (self.backlog - self.pending))
+            self.served += max(0, sample.delivered - (sample.pending - self.pending))
+        self.backlog = sample.lag + sample.pending
+        self.pending = sample.pending
+        self.samples.append((now, self.arrived, self.served))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+
+    def rates(self) -> Tuple[float, float]:
+        """(arrival, service) in entries/s over the window; zero until two samples exist."""
+        (t0, a0, s0), (t1, a1, s1) = self.samples[0], self.samples[-1]
+        if t1 <= t0:
+            return 0.0, 0.0
+        return (a1 - a0) / (t1 - t0), (s1 - s0) / (t1 - t0)
+
+class LagExporter:
+    """
+    Per-group lag, rates and drain time of the mesh streams, refreshed every `interval`.
+
+    Arrivals and completions are derived from successive samples: entries delivered
+    since the last one (from "entries-read" on Redis 7, else counted with XRANGE between
+    the two last-delivered IDs) plus the change in lag give the arrivals, minus the
+    change in pending the completions. A consumer's throughput is only learned while
+    undelivered entries are waiting, so an idle group doesn't look slow.
+    """
+
+    def __init__(self, streams: List[str] = None, redis_client: redis.Redis = None, interval: float = None,
+                 window: float = None, slo: float = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        self.stream_client = RedisClient.get_binary_instance()
+        self.streams = streams or list(MESH_STREAMS)
+        self.interval = LAG_INTERVAL if interval is None else interval
+        self.window = LAG_RATE_WINDOW if window is None else window
+        self.slo = LAG_SLO_SECONDS if slo is None else slo
+        self.rates: Dict[Tuple[str, str], GroupRates] = {}
+        self.last_delivered: Dict[Tuple[str, str], Tuple[str, Optional[int]]] = {}  # (id, entries-read)
+        self.report: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.should_run = True
+
+    def _groups(self) -> Dict[str, List[Dict[str, Any]]]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for stream in self.streams:
+            pipe.xinfo_groups(stream)
+        results = pipe.execute(raise_on_error=False)
+        # Missing streams and streams nobody consumes have no groups
+        return {s: groups for s, groups in zip(self.streams, results) if groups and not isinstance(groups, Exception)}
+
+    def sample(self) -> Dict[Tuple[str, str], GroupSample]:
+        """Read the groups of every stream: three pipelined round trips."""
+        groups_by_stream = self._groups()
+        info_pipe = self.redis_client.pipeline(transaction=False)
+        range_pipe = self.stream_client.pipeline(transaction=False)
+        counts = []  # (stream, group, what) per XRANGE, in pipeline order
+        for stream, groups in groups_by_stream.items():
+            for g in groups:
+                info_pipe.xinfo_consumers(stream, g["name"])
+                last = g["last-delivered-id"]
+                # The first undelivered entry (and, without "lag", all of them) after last-delivered-id
+                range_pipe.xrange(stream, min=f"({last}", count=1 if g.get("lag") is not None else LAG_SCAN_LIMIT)
+                counts.append((stream, g, "lag"))
+                previous = self.last_delivered.get((stream, g["name"]))
+                if previous and g.get("entries-read") is None and id_key(last) > id_key(previous[0]):
+                    range_pipe.xrange(stream, min=f"({previous[0]}", max=last, count=LAG_SCAN_LIMIT)
+                    counts.append((stream, g, "delivered"))
+        consumers = info_pipe.execute(raise_on_error=False)
+        ranges = range_pipe.execute(raise_on_error=False)
+
+        samples: Dict[Tuple[str, str], GroupSample] = {}
+        pairs = [(stream, g) for stream, groups in groups_by_stream.items() for g in groups]
+        for (stream, g), members in zip(pairs, consumers):
+            sample = samples.setdefault((logical_stream(stream), g["name"]), GroupSample())
+            sample.pending += g["pending"]
+            if not isinstance(members, Exception):
+                sample.consumers.update(c["name"] for c in members if c["idle"] < LAG_CONSUMER_IDLE * 1000)
+            previous = self.last_delivered.get((stream, g["name"]))
+            entries_read = g.get("entries-read")
+            if previous and entries_read is not None and previous[1] is not None:
+                sample.delivered += max(0, entries_read - previous[1])
+            self.last_delivered[(stream, g["name"])] = (g["last-delivered-id"], entries_read)
+
+        for (stream, g, what), entries in zip(counts, ranges):
+            if isinstance(entries, Exception):
+                continue
+            sample = samples[(logical_stream(stream), g["name"])]
+            if what == "delivered":
+                sample.delivered += len(entries)
+                continue
+            sample.lag += g["lag"] if g.get("lag") is not None else len(entries)
+            if entries:
+                oldest = id_ms(_decoded(entries[0][0]))
+                sample.oldest_ms = oldest if sample.oldest_ms is None else min(sample.oldest_ms, oldest)
+        return samples
+
+    def estimate(self, rates: GroupRates, sample: GroupSample, now: float) -> Dict[str, Any]:
+        """Rates, drain time and the consumers needed for the SLO, from the window so far."""
+        arrival, service = rates.rates()
+        consumers = len(sample.consumers)
+        backlog = sample.lag + sample.pending
+        if sample.lag and consumers and service > 0:
+            rates.consumer_rate = service / consumers  # busy consumers: this is their capacity
+
+        # Throughput only shows capacity under load: an idle group drains at its consumers' rate
+        capacity = max(service, (rates.consumer_rate or 0.0) * consumers)
+        if backlog == 0:
+            drain = 0.0
+        elif capacity > arrival:
+            drain = min(LAG_MAX_DRAIN, backlog / (capacity - arrival))
+        else:
+            drain = LAG_MAX_DRAIN
+
+        if rates.consumer_rate:
+            # Keep up with arrivals and clear the current backlog within the SLO
+            desired = math.ceil((arrival + backlog / self.slo) / rates.consumer_rate) if self.slo else consumers
+        else:
+            desired = max(consumers, 1) if backlog else consumers  # capacity unknown yet
+        wait = max(0.0, now - sample.oldest_ms / 1000) if sample.oldest_ms else 0.0
+        return {
+            "lag": sample.lag,
+            "pending": sample.pending,
+            "consumers": consumers,
+            "arrival_rate": round(arrival, 3),
+            "service_rate": round(service, 3),
+            "consumer_rate": round(rates.consumer_rate or 0.0, 3),
+            "oldest_wait_s": round(wait, 3),
+            "drain_s": round(drain, 1),
+            "desired_consumers": desired,
+        }
+
+    def refresh(self):
+        """Take a sample and update the report and the Prometheus gauges."""
+        try:
+            samples = self.sample()
+        except redis.exceptions.RedisError as e:
+            print(f"[exporter] Could not read the consumer groups: {e}")
+            return
+        now = time.time()
+        report = {}
+        for key, sample in samples.items():
+            rates = self.rates.setdefault(key, GroupRates(self.window))
+            rates.add(now, sample)
+            report[key] = estimate = self.estimate(rates, sample, now)
+            stream, group = key
+            GROUP_LAG.labels(stream, group).set(estimate["lag"])
+            GROUP_PENDING.labels(stream, group).set(estimate["pending"])
+            GROUP_CONSUMERS.labels(stream, group).set(estimate["consumers"])
+            GROUP_ARRIVAL_RATE.labels(stream, group).set(estimate["arrival_rate"])
+            GROUP_SERVICE_RATE.labels(stream, group).set(estimate["service_rate"])
+            GROUP_CONSUMER_RATE.labels(stream, group).set(estimate["consumer_rate"])
+            GROUP_OLDEST_WAIT.labels(stream, group).set(estimate["oldest_wait_s"])
+            GROUP_DRAIN.labels(stream, group).set(estimate["drain_s"])
+            GROUP_DESIRED.labels(stream, group).set(estimate["desired_consumers"])
+        self.report = report
+
+    def run(self):
+        print(f"[exporter] Sampling {len(self.streams)} streams every {self.interval}s "
+              f"(rates over {self.window:.0f}s, SLO {self.slo:.0f}s)")
+        while self.should_run:
+            started = time.monotonic()
+            self.refresh()
+            for (stream, group), e in sorted(self.report.items()):
+                print(f"[exporter] {group}@{stream}: lag={e['lag']} pending={e['pending']} "
+                      f"consumers={e['consumers']} in={e['arrival_rate']}/s out={e['service_rate']}/s "
+                      f"drain={e['drain_s']}s desired={e['desired_consumers']}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self.should_run = False
@@ -0,0 +1,124 @@
+import os
+import time
+import json
+import hashlib
+import redis
+from typing import Dict, Any, Iterable, Optional
+
+from src.core.redis_client import RedisClient, tagged
+from src.core.payloads import content_digest
+
+# Content-addressed cache of specialist suggestions
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 24 * 3600))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 100000))
+CACHE_POLICY = os.getenv("CACHE_POLICY", "lru")  # "lru" or "lfu"
+
+CACHE_PREFIX = "cache:suggestion:"
+CACHE_INDEX_KEY = tagged("cache:suggestion-index")  # zset: entry key -> last access (lru) or hit count (lfu)
+CACHE_EXPIRY_KEY = tagged("cache:suggestion-expiry")  # zset: entry key -> when its TTL runs out
+CACHE_STATS_KEY = tagged("cache:suggestion-stats")  # hash: "<specialty>:hits" / "<specialty>:misses"
+
+# Fields that depend only on the chunk content, not on which document/chunk it came from
+CACHED_FIELDS = ("original_text", "suggested_text", "suggested_text_ref", "explanation", "type", "severity", "source_agent")
+
+# Drop index members whose entry has expired (KEYS: index, expiry; ARGV: now, max members); returns the index size
+PRUNE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #expired > 0 then
+    redis.call('ZREM', KEYS[1], unpack(expired))
+    redis.call('ZREM', KEYS[2], unpack(expired))
+end
+return redis.call('ZCARD', KEYS[1])
+"""
+
+def content_key(text_digest: str, language: str, style: str, specialty: str) -> str:
+    """Keyed on the text's sha256, so claim-checked entries can be looked up without their body."""
+    digest = hashlib.sha256("\x1f".join((text_digest, language, style, specialty)).encode("utf-8")).hexdigest()
+    return tagged(CACHE_PREFIX + digest[:32])
+
+class SuggestionCache:
+    """
+    Suggestions keyed on hash(sha256(text), language, style, specialty).
+
+    Entries expire after `ttl` seconds, and the cache holds at most `max_entries`:
+    a sorted-set index ranks entries by last access (LRU) or hit count (LFU) and
+    the lowest-ranked ones are evicted on insert. Expired entries leave the index
+    first, so a once-popular entry that timed out can't outrank the live ones.
+    """
+
+    def __init__(self, redis_client: redis.Redis = None, ttl: int = None, max_entries: int = None, policy: str = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        self.ttl = ttl if ttl is not None else CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else CACHE_MAX_ENTRIES
+        self.policy = policy or CACHE_POLICY
+        self.hits = 0
+        self.misses = 0
+        self._prune = self.redis_client.register_script(PRUNE_SCRIPT)
+
+    @staticmethod
+    def _key(data: Dict[str, Any], specialty: str) -> str:
+        return content_key(content_digest(data), data.get("language", "en"), data.get("style", "standard"), specialty)
+
+    def _touch(self, pipe, key: str):
+        if self.policy == "lfu":
+            pipe.zincrby(CACHE_INDEX_KEY, 1, key)
+        else:
+            pipe.zadd(CACHE_INDEX_KEY, {key: time.time()})
+
+    def get_many(self, data: Dict[str, Any], specialties: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Look up a chunk for several specialties in one round trip: specialty -> cached fields or None."""
+        specialties = list(specialties)
+        keys = [self._key(data, specialty) for specialty in specialties]
+        raw = self.redis_client.mget(keys)
+
+        results = {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for specialty, key, value in zip(specialties, keys, raw):
+            if value is None:
+                results[specialty] = None
+                pipe.hincrby(CACHE_STATS_KEY, f"{specialty}:misses", 1)
+            else:
+                results[specialty] = json.loads(value)
+                pipe.hincrby(CACHE_STATS_KEY, f"{specialty}:hits", 1)
+                self._touch(pipe, key)
+        pipe.execute()
+
+        hits = sum(1 for v in results.values() if v is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put(self, data: Dict[str, Any], specialty: str, suggestion: Dict[str, Any]):
+        """Cache a specialist's suggestion for this chunk content, evicting the coldest entries if full."""
+        key = self._key(data, specialty)
+        value = json.dumps({field: suggestion[field] for field in CACHED_FIELDS if field in suggestion})
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(key, value, ex=self.ttl)
+        self._touch(pipe, key)
+        pipe.zadd(CACHE_EXPIRY_KEY, {key: time.time() + self.ttl})
+        pipe.zcard(CACHE_INDEX_KEY)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            size = self._prune(keys=[CACHE_INDEX_KEY, CACHE_EXPIRY_KEY], args=[time.time(), size])
+        if size > self.max_entries:
+            evicted = [member for member, _ in self.redis_client.zpopmin(CACHE_INDEX_KEY, size - self.max_entries)]
+            if evicted:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.zrem(CACHE_EXPIRY_KEY, *evicted)
+                pipe.delete(*evicted)
+                pipe.execute()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counts and hit ratio per specialty, across all agents."""
+        counters = self.redis_client.hgetall(CACHE_STATS_KEY)
+        stats = {}
+        for field, value in counters.items():
+            specialty, _, kind = field.rpartition(":")
+            stats.setdefault(specialty, {"hits": 0, "misses": 0})[kind] = int(value)
+        for entry in stats.values():
+            total = entry["hits"] + entry["misses"]
+            entry["hit_ratio"] = entry["hits"] / total if total else 0.0
+        return stats
@@ -0,0 +1,97 @@
+import os
+import json
+import msgpack
+from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Tuple, Type, TypeVar, Union
+
+from src.core.models import ReviewSummary
+
+# Wire format of the stream entries this process writes. Readers understand both, so
+# agents can be switched over one at a time:
+# - "flat": one string field per value (nested values as JSON), the original format;
+# - "msgpack": a single binary field holding the whole message.
+CODEC = os.getenv("MESH_CODEC", "flat")
+CODECS = ("flat", "msgpack")
+
+# A packed entry is {PACKED_FIELD: <version byte> + <msgpack map>}
+CODEC_VERSION = 1
+PACKED_FIELD = "m"
+_PACKED_KEYS = (PACKED_FIELD, PACKED_FIELD.encode())
+
+Model = TypeVar("Model", bound=BaseModel)
+
+class CodecError(ValueError):
+    pass
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+def _flat_value(value) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+def as_message(obj: Union[BaseModel, Dict[str, Any]]) -> Dict[str, Any]:
+    """Plain dict of a model or message, without unset (None) values."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", exclude_none=True)
+    return {k: v for k, v in obj.items() if v is not None}
+
+def encode(obj: Union[BaseModel, Dict[str, Any]], codec: str = None) -> Dict[str, Any]:
+    """Stream fields for a model or a plain message, in the `codec` wire format."""
+    message = as_message(obj)
+    codec = codec or CODEC
+    if codec == "msgpack":
+        return {PACKED_FIELD: bytes([CODEC_VERSION]) + msgpack.packb(message, use_bin_type=True)}
+    if codec == "flat":
+        return {k: _flat_value(v) for k, v in message.items()}
+    raise CodecError(f"Unknown codec '{codec}' (expected one of {CODECS})")
+
+def _unpack(packed) -> Dict[str, Any]:
+    if isinstance(packed, str):
+        raise CodecError("Packed entry read with a decoding client; read streams with RedisClient.get_binary_instance()")
+    if not packed or packed[0] != CODEC_VERSION:
+        raise CodecError(f"Unsupported codec version {packed[0] if packed else None} (expected {CODEC_VERSION})")
+    return msgpack.unpackb(packed[1:], raw=False)
+
+def decode(fields: Dict[Any, Any]) -> Dict[str, Any]:
+    """A stream entry as a dict, whichever format wrote it (bytes or str fields)."""
+    if len(fields) == 1:
+        for key in _PACKED_KEYS:
+            if key in fields:
+                return _unpack(fields[key])
+    return {_text(k): _text(v) for k, v in fields.items()}
+
+def decode_model(cls: Type[Model], fields: Dict[Any, Any]) -> Model:
+    """Validate a model from a stream entry; flat string values are coerced by pydantic."""
+    data = decode(fields)
+    return cls.model_validate({k: v for k, v in data.items() if k in cls.model_fields})
+
+def decode_entries(entries) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    """XRANGE / XAUTOCLAIM entries as (id, message); deleted entries keep None."""
+    return [(_text(message_id), decode(fields) if fields is not None else None) for message_id, fields in entries]
+
+def decode_messages(messages) -> List[Tuple[str, List[Tuple[str, Dict[str, Any]]]]]:
+    """An XREAD / XREADGROUP reply with stream names, IDs and entries decoded."""
+    return [(_text(stream), decode_entries(entries)) for stream, entries in messages or []]
+
+def summary_message(summary: ReviewSummary, processed_at: float) -> Dict[str, Any]:
+    """The summary stream's entry for a ReviewSummary (the summary itself under "data")."""
+    return {
+        "type": "review_summary",
+        "doc_id": summary.doc_id,
+        "status": summary.status.value,
+        "data": summary.model_dump(mode="json"),
+        "processed_at": processed_at,
+    }
+
+def decode_summary(fields: Dict[Any, Any]) -> Optional[ReviewSummary]:
+    """The ReviewSummary of a summary stream entry (None for other entries)."""
+    data = decode(fields)
+    if data.get("type") != "review_summary" or "data" not in data:
+        return None
+    body = data["data"]
+    # Flat entries carry it as a JSON string, packed ones as a nested map
+    if isinstance(body, str):
+        return ReviewSummary.model_validate_json(body)
+    return ReviewSummary.model_validate(body)
@@ -0,0 +1,369 @@
+import os
+import time
+import json
+import redis
+from typing import Dict, List, Optional, Iterable
+
+from src.core.redis_client import (
+    RedisClient,
+    STREAM_REVIEW_SUMMARY,
+    STREAM_PARTITIONS,
+    doc_key,
+    partition_key,
+    partition_of,
+    stream_for,
+)
+from src.core.payloads import PayloadStore
+from src.core.codec import encode, summary_message
+from src.core.retention import xadd_cap_args
+from src.core.models import Suggestion, SuggestionType, ReviewSummary, ProcessingStatus
+
+# Per-document aggregation state, shared by all aggregator replicas:
+#   doc:{doc_id}:meta     hash  total_chunks, expected_results, skipped_results, created_at, status, emitted,
+#                               version (bumped on every change the results API shows; its ETag)
+#   doc:{doc_id}:results  hash  "{chunk_id}:{type}" -> Suggestion JSON (idempotent under redelivery)
+#   doc:{doc_id}:chunks   str   JSON [(chunk_id, content_hash, start, end)] of the latest revision, for
+#                               diffing re-uploads and mapping suggestions back to source offsets
+#   doc:{doc_id}:chunk_ids set  chunk ids of the latest revision once its index is known; results and
+#                               routes of any other chunk (an earlier revision's) are ignored
+#   doc:{doc_id}:retracted set  chunk ids removed by a re-upload; their late results are ignored
+#   doc:{doc_id}:routes   hash  chunk_id -> number of specialists the coordinator routed it to
+#   docs:open             zset  doc_id -> deadline for a partial summary if results stop arriving
+#                               (one per stream partition, "docs:open.<p>")
+# With partitioned streams all of a document's keys share its partition's hash tag.
+DOC_TIMEOUT = float(os.getenv("DOC_TIMEOUT", 300))  # seconds without new results
+DOC_TTL = int(os.getenv("DOC_TTL", 7 * 24 * 3600))  # how long state is kept after the summary
+OPEN_DOCS = "docs:open"
+
+SPECIALTY_COUNT = len(SuggestionType)
+
+def meta_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:meta", doc_id)
+
+def results_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:results", doc_id)
+
+def chunks_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:chunks", doc_id)
+
+def chunk_ids_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:chunk_ids", doc_id)
+
+def retracted_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:retracted", doc_id)
+
+def routes_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:routes", doc_id)
+
+def open_docs_key(doc_id: str) -> str:
+    return partition_key(OPEN_DOCS, partition_of(doc_id))
+
+def open_docs_keys(partitions: Iterable[int] = None) -> List[str]:
+    return [partition_key(OPEN_DOCS, p) for p in (range(STREAM_PARTITIONS) if partitions is None else partitions)]
+
+def load_chunk_index(redis_client: redis.Redis, doc_id: str) -> List[tuple]:
+    """(chunk_id, content_hash, start, end) of the document's latest revision; empty for a new document."""
+    raw = redis_client.get(chunks_key(doc_id))
+    return [tuple(entry) for entry in json.loads(raw)] if raw else []
+
+def apply_offsets(suggestions: List[Suggestion], chunk_index: List[tuple]):
+    """Set each suggestion's offsets to its chunk's in the latest revision (carried-over chunks may have moved)."""
+    offsets = {entry[0]: entry[2:4] for entry in chunk_index if len(entry) >= 4}
+    for suggestion in suggestions:
+        if suggestion.chunk_id in offsets:
+            suggestion.start, suggestion.end = offsets[suggestion.chunk_id]
+
+def document_etag(meta: Dict[str, str]) -> str:
+    """ETag of a document's results, from its meta hash: changes with every result, revision and status."""
+    created_ms = int(float(meta.get("created_at", 0)) * 1000)  # A document re-created after expiry starts over
+    return f'"{created_ms:x}-{meta.get("version", 0)}"'
+
+def document_status(meta: Dict[str, str], received: int) -> ProcessingStatus:
+    if meta.get("status"):
+        return ProcessingStatus(meta["status"])
+    return ProcessingStatus.PROCESSING if received else ProcessingStatus.PENDING
+
+def ordered_suggestions(results: Iterable[str], chunk_index: List[tuple]) -> List[Suggestion]:
+    """A document's stored results in source order (chunk position, then specialty), with current offsets."""
+    position = {entry[0]: i for i, entry in enumerate(chunk_index)}
+    specialties = {t: i for i, t in enumerate(SuggestionType)}
+    suggestions = [Suggestion.model_validate_json(raw) for raw in results]
+    suggestions.sort(key=lambda s: (position.get(s.chunk_id, len(position)), s.chunk_id, specialties[s.type]))
+    apply_offsets(suggestions, chunk_index)
+    return suggestions
+
+def register_document(
+    pipe,
+    doc_id: str,
+    chunk_index: Optional[List[tuple]],
+    retracted: Iterable[str] = (),
+    fresh: bool = True,
+    pending: bool = True,
+):
+    """
+    Queue the commands that open a document (revision) for aggregation on `pipe`.
+
+    `chunk_index` is the full (chunk_id, content_hash, start, end) list of the revision. Results of
+    unchanged chunks carry over from the previous revision; results of `retracted`
+    chunks are dropped. Works with sync and asyncio pipelines alike (the caller
+    executes it). Must run before the first chunk of the revision is enqueued.
+
+    A streamed upload whose size is not known yet passes `chunk_index=None`: the
+    document cannot complete until `seal_document` records the final index.
+    """
+    retracted = list(retracted)
+    if fresh:
+        for key in (results_key(doc_id), retracted_key(doc_id), routes_key(doc_id)):
+            pipe.delete(key)  # one key per DEL: cluster pipelines reject multi-key DEL
+        pipe.hdel(meta_key(doc_id), "skipped_results")
+    elif retracted:
+        pipe.hdel(results_key(doc_id), *[f"{chunk_id}:{t.value}" for chunk_id in retracted for t in SuggestionType])
+        pipe.eval(UNROUTE_SCRIPT, 2, routes_key(doc_id), meta_key(doc_id), SPECIALTY_COUNT, *retracted)
+    if retracted:
+        pipe.sadd(retracted_key(doc_id), *retracted)
+        pipe.expire(retracted_key(doc_id), DOC_TTL)
+
+    pipe.hdel(meta_key(doc_id), "emitted", "status")
+    pipe.hsetnx(meta_key(doc_id), "created_at", time.time())
+    pipe.hset(meta_key(doc_id), "updated_at", time.time())
+    pipe.hincrby(meta_key(doc_id), "revision", 1)
+    pipe.hincrby(meta_key(doc_id), "version", 1)
+    if chunk_index is None:
+        pipe.hdel(meta_key(doc_id), "total_chunks", "expected_results")
+        pipe.delete(chunks_key(doc_id))
+        pipe.delete(chunk_ids_key(doc_id))  # Unknown until sealed; seal_document prunes what slipped in
+    else:
+        seal_document(pipe, doc_id, chunk_index)
+    for key in (meta_key(doc_id), results_key(doc_id), routes_key(doc_id)):
+        pipe.persist(key)
+
+    # Nothing to wait for (unchanged re-upload): due now, the next timeout sweep emits the summary
+    deadline = time.time() + DOC_TIMEOUT if pending else time.time()
+    pipe.zadd(open_docs_key(doc_id), {doc_id: deadline})
+
+def seal_document(pipe, doc_id: str, chunk_index: List[tuple]):
+    """Queue the commands that record how many chunks (and results) a document has."""
+    pipe.hset(meta_key(doc_id), mapping={
+        "total_chunks": len(chunk_index),
+        "expected_results": len(chunk_index) * SPECIALTY_COUNT,
+    })
+    pipe.hincrby(meta_key(doc_id), "version", 1)
+    pipe.set(chunks_key(doc_id), json.dumps(chunk_index))
+    pipe.delete(chunk_ids_key(doc_id))
+    if chunk_index:
+        pipe.sadd(chunk_ids_key(doc_id), *[entry[0] for entry in chunk_index])
+    pipe.eval(PRUNE_SCRIPT, 4, results_key(doc_id), routes_key(doc_id), meta_key(doc_id), chunk_ids_key(doc_id),
+              SPECIALTY_COUNT)
+
+# Lua: is ARGV[1] a chunk of the current revision? (true while the index is unknown)
+CURRENT_CHUNK_LUA = """
+local function current_chunk(chunk_ids, chunk_id)
+    return redis.call('EXISTS', chunk_ids) == 0 or redis.call('SISMEMBER', chunk_ids, chunk_id) == 1
+end
+"""
+
+# Every chunk counts for all specialties until the coordinator routes it; routing a
+# chunk to fewer adds the difference to skipped_results, once per chunk.
+ROUTE_SCRIPT = CURRENT_CHUNK_LUA + """
+if not current_chunk(KEYS[3], ARGV[1]) then
+    return 0
+end
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'skipped_results', ARGV[3] - ARGV[2])
+    redis.call('HINCRBY', KEYS[2], 'version', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+# Give back the skipped results of retracted chunks (KEYS: routes, meta; ARGV: specialty count, chunk ids...)
+UNROUTE_SCRIPT = """
+for i = 2, #ARGV do
+    local routed = redis.call('HGET', KEYS[1], ARGV[i])
+    if routed then
+        redis.call('HINCRBY', KEYS[2], 'skipped_results', routed - ARGV[1])
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return 1
+"""
+
+# Drop results and routes of chunks outside the current revision, e.g. late ones of an earlier
+# revision that arrived while a streamed upload's index was unknown
+# (KEYS: results, routes, meta, chunk ids; ARGV: specialty count)
+PRUNE_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 0 then
+    return 0
+end
+local pruned = 0
+for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+    local chunk_id = string.match(field, '^(.*):[^:]*$')
+    if redis.call('SISMEMBER', KEYS[4], chunk_id) == 0 then
+        redis.call('HDEL', KEYS[1], field)
+        pruned = pruned + 1
+    end
+end
+for _, chunk_id in ipairs(redis.call('HKEYS', KEYS[2])) do
+    if redis.call('SISMEMBER', KEYS[4], chunk_id) == 0 then
+        redis.call('HINCRBY', KEYS[3], 'skipped_results', redis.call('HGET', KEYS[2], chunk_id) - ARGV[1])
+        redis.call('HDEL', KEYS[2], chunk_id)
+    end
+end
+return pruned
+"""
+
+# Results still owed: expected_results - skipped_results (-1 if the count is not known yet)
+EXPECTED_LUA = """
+local function expected_results(meta)
+    local fields = redis.call('HMGET', meta, 'expected_results', 'skipped_results')
+    if not fields[1] then
+        return -1
+    end
+    return tonumber(fields[1]) - tonumber(fields[2] or 0)
+end
+"""
+
+# Store one result unless its chunk was retracted or is not part of the current revision.
+# Returns [received, expected] (expected = -1 if the document was never registered).
+RECORD_SCRIPT = EXPECTED_LUA + CURRENT_CHUNK_LUA + """
+if redis.call('SISMEMBER', KEYS[3], ARGV[1]) == 1 or not current_chunk(KEYS[5], ARGV[1]) then
+    return {-1, -1}
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'version', 1)
+end
+redis.call('ZADD', KEYS[4], 'XX', ARGV[5], ARGV[6])
+return {redis.call('HLEN', KEYS[1]), expected_results(KEYS[2])}
+"""
+
+# [received, expected] for a document
+PROGRESS_SCRIPT = EXPECTED_LUA + """
+return {redis.call('HLEN', KEYS[1]), expected_results(KEYS[2])}
+"""
+
+# Emit the summary at most once across replicas: the "emitted" flag, the XADD and
+# closing the document happen atomically. ARGV[6..] is the stream's XADD cap, if any.
+FINALIZE_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], 'emitted', ARGV[3]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+-- ARGV[5] XADD cap arguments, then the encoded entry's field/value pairs
+local xadd = {KEYS[3]}
+local cap_end = 5 + tonumber(ARGV[5])
+for i = 6, cap_end do
+    table.insert(xadd, ARGV[i])
+end
+table.insert(xadd, '*')
+for i = cap_end + 1, #ARGV do
+    table.insert(xadd, ARGV[i])
+end
+redis.call('XADD', unpack(xadd))
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('EXPIRE', KEYS[5], ARGV[4])
+redis.call('EXPIRE', KEYS[6], ARGV[4])
+redis.call('EXPIRE', KEYS[7], ARGV[4])
+return 1
+"""
+
+class DocumentStore:
+    """Incremental per-document aggregation state kept in Redis hashes."""
+
+    def __init__(self, redis_client: redis.Redis = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        self.payloads = PayloadStore(self.redis_client)
+        self._record = self.redis_client.register_script(RECORD_SCRIPT)
+        self._progress = self.redis_client.register_script(PROGRESS_SCRIPT)
+        self._route = self.redis_client.register_script(ROUTE_SCRIPT)
+        self._finalize = self.redis_client.register_script(FINALIZE_SCRIPT)
+
+    def record(self, suggestion: Suggestion) -> bool:
+        """Store one specialist result. Returns True once every expected result is in."""
+        doc_id = suggestion.doc_id
+        received, expected = self._record(
+            keys=[results_key(doc_id), meta_key(doc_id), retracted_key(doc_id), open_docs_key(doc_id),
+                  chunk_ids_key(doc_id)],
+            args=[
+                suggestion.chunk_id,
+                f"{suggestion.chunk_id}:{suggestion.type.value}",
+                suggestion.model_dump_json(),
+                DOC_TTL,  # Orphaned results (unregistered docs) still age out
+                time.time() + DOC_TIMEOUT,  # Sliding deadline: only stalled documents time out
+                doc_id,
+            ],
+        )
+        return expected >= 0 and received >= expected
+
+    def route(self, doc_id: str, chunk_id: str, specialties: int):
+        """Record that a chunk was sent to `specialties` specialists (idempotent under redelivery)."""
+        self._route(keys=[routes_key(doc_id), meta_key(doc_id), chunk_ids_key(doc_id)], args=[chunk_id, specialties, SPECIALTY_COUNT, DOC_TTL])
+
+    def is_complete(self, doc_id: str) -> bool:
+        received, expected = self._progress(keys=[results_key(doc_id), meta_key(doc_id)])
+        return expected >= 0 and received >= expected
+
+    def summarize(self, doc_id: str, status: ProcessingStatus) -> ReviewSummary:
+        meta = self.redis_client.hgetall(meta_key(doc_id))
+        results = self.redis_client.hvals(results_key(doc_id))
+
+        suggestions = sorted(
+            (Suggestion.model_validate_json(raw) for raw in results),
+            key=lambda s: s.created_at
+        )
+        apply_offsets(suggestions, load_chunk_index(self.redis_client, doc_id))
+
+        # The summary is the deliverable: claim-checked texts are inlined into it
+        refs = [s.suggested_text_ref for s in suggestions if s.suggested_text_ref]
+        if refs:
+            bodies = self.payloads.get_many(refs)
+            for suggestion in suggestions:
+                if suggestion.suggested_text_ref:
+                    suggestion.suggested_text = bodies.get(suggestion.suggested_text_ref) or ""
+                    suggestion.suggested_text_ref = None
+        return ReviewSummary(
+            doc_id=doc_id,
+            total_chunks=int(meta.get("total_chunks", 0)),
+            processed_chunks=len({s.chunk_id for s in suggestions}),
+            suggestions=suggestions,
+            status=status,
+        )
+
+    def finalize(self, doc_id: str, status: ProcessingStatus = ProcessingStatus.COMPLETED) -> Optional[ReviewSummary]:
+        """Emit the document's ReviewSummary to the summary stream, unless another replica already did."""
+        summary = self.summarize(doc_id, status)
+        processed_at = time.time()
+        summary_stream = stream_for(STREAM_REVIEW_SUMMARY, doc_id)
+        cap = xadd_cap_args(summary_stream)
+        entry = encode(summary_message(summary, processed_at))
+        emitted = self._finalize(
+            keys=[meta_key(doc_id), results_key(doc_id), summary_stream, open_docs_key(doc_id), chunks_key(doc_id),
+                  routes_key(doc_id), chunk_ids_key(doc_id)],
+            args=[doc_id, status.value, processed_at, DOC_TTL, len(cap), *cap, *[x for pair in entry.items() for x in pair]],
+        )
+        return summary if emitted else None
+
+    def close_if_complete(self, doc_id: str) -> bool:
+        """
+        Make a document that already has all its results due now, so the next
+        timeout sweep emits its summary (results that beat `seal_document` never
+        saw the expected count).
+        """
+        if not self.is_complete(doc_id):
+            return False
+        self.redis_client.zadd(open_docs_key(doc_id), {doc_id: time.time()}, xx=True)
+        return True
+
+    def expired(self, limit: int = 20, partitions: Iterable[int] = None) -> List[str]:
+        """Open documents whose deadline has passed (in the given stream partitions; default all)."""
+        now = time.time()
+        docs = []
+        for key in open_docs_keys(partitions):
+            docs += self.redis_client.zrangebyscore(key, "-inf", now, start=0, num=limit - len(docs))
+            if len(docs) >= limit:
+                break
+        return docs
@@ -8,6 +8,7 @@ class ProcessingStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
+    TIMED_OUT = "timed_out"  # Summary emitted with only the results that arrived in time
     FAILED = "failed"
 
 class DocumentChunk(BaseModel):
@@ -30,10 +31,13 @@ class Suggestion(BaseModel):
     suggestion_id: str = Field(default_factory=lambda: shortuuid.uuid())
     type: SuggestionType
     original_text: str
-    suggested_text: str
+    suggested_text: str = ""
+    suggested_text_ref: Optional[str] = None  # claim-check reference, resolved into suggested_text in summaries
     explanation: str
     severity: str = "medium"  # low, medium, high
     source_agent: str
+    start: Optional[int] = None  # character offsets of the chunk in the source document
+    end: Optional[int] = None
     created_at: float = Field(default_factory=time.time)
 
 class ReviewSummary(BaseModel):
@@ -0,0 +1,108 @@
+import os
+import hashlib
+import threading
+import redis
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional
+
+from src.core.redis_client import RedisClient, tagged, untagged
+
+# Claim-check mode: large text fields are stored once under a content-addressed key and
+# stream entries carry a reference ("<field>_ref") instead. Readers handle both forms,
+# so this only needs to be switched on where entries are written.
+CLAIM_CHECK = os.getenv("CLAIM_CHECK", "false").lower() in ("1", "true", "yes")
+PAYLOAD_TTL = int(os.getenv("PAYLOAD_TTL", 7 * 24 * 3600))  # seconds; matches DOC_TTL by default
+PAYLOAD_CACHE_SIZE = int(os.getenv("PAYLOAD_CACHE_SIZE", 1024))  # bodies kept in-process per agent
+
+PAYLOAD_PREFIX = "payload:"
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def payload_key(text: str) -> str:
+    return tagged(PAYLOAD_PREFIX + text_digest(text))
+
+def ref_field(field: str) -> str:
+    return f"{field}_ref"
+
+def content_digest(data: Dict[str, Any], field: str = "text") -> str:
+    """Digest of a text field, without fetching the body if the entry only holds a reference."""
+    ref = data.get(ref_field(field))
+    if ref:
+        return untagged(ref)[len(PAYLOAD_PREFIX):]
+    return text_digest(data.get(field, ""))
+
+def store_payload(pipe, text: str, ttl: int = None) -> str:
+    """
+    Queue the write of a body on `pipe` and return its reference.
+
+    Works with sync and asyncio pipelines alike; queue it before the XADD that
+    carries the reference, in the same pipeline.
+    """
+    key = payload_key(text)
+    pipe.set(key, text, ex=ttl or PAYLOAD_TTL)
+    return key
+
+def check_in(pipe, fields: Dict[str, Any], names: Iterable[str] = ("text",), ttl: int = None) -> Dict[str, Any]:
+    """Copy of `fields` with each of `names` moved to the payload store (queued on `pipe`)."""
+    fields = dict(fields)
+    for name in names:
+        if name in fields:
+            fields[ref_field(name)] = store_payload(pipe, fields.pop(name), ttl)
+    return fields
+
+class PayloadStore:
+    """Lazy, cached access to claim-checked bodies."""
+
+    def __init__(self, redis_client: redis.Redis = None, cache_size: int = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        self.cache_size = cache_size if cache_size is not None else PAYLOAD_CACHE_SIZE
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()  # agents may read from worker threads
+
+    def _cached(self, ref: str) -> Optional[str]:
+        with self._lock:
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return self._cache[ref]
+        return None
+
+    def _remember(self, ref: str, body: str):
+        with self._lock:
+            self._cache[ref] = body
+            self._cache.move_to_end(ref)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get_many(self, refs: List[str]) -> Dict[str, Optional[str]]:
+        """Bodies for `refs` (None if expired), one MGET for the ones not cached."""
+        found = {ref: self._cached(ref) for ref in refs}
+        missing = [ref for ref, body in found.items() if body is None]
+        if missing:
+            for ref, body in zip(missing, self.redis_client.mget(missing)):
+                found[ref] = body
+                if body is not None:
+                    self._remember(ref, body)
+        return found
+
+    def get(self, ref: str) -> Optional[str]:
+        return self.get_many([ref])[ref]
+
+    def field(self, data: Dict[str, Any], name: str = "text") -> str:
+        """A text field of a stream entry, inline or claim-checked."""
+        if name in data:
+            return data[name]
+        ref = data.get(ref_field(name))
+        if not ref:
+            return ""
+        body = self.get(ref)
+        if body is None:
+            raise KeyError(f"Payload {ref} has expired")
+        return body
+
+    def check_in(self, fields: Dict[str, Any], names: Iterable[str] = ("text",)) -> Dict[str, Any]:
+        """Store `names` of `fields` now and return the entry with references."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        fields = check_in(pipe, fields, names)
+        pipe.execute()
+        return fields
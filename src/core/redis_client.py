@@ -1,7 +1,16 @@
 import redis
+import redis.asyncio as aioredis
+import redis.sentinel
+import redis.asyncio.sentinel
 import os
 import time
-from typing import Optional, List, Any
+import zlib
+import hashlib
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.exceptions import ConnectionError, TimeoutError
+from typing import Optional, List, Any, Dict, Tuple
 from dotenv import load_dotenv
 
 # Load env variables from .env file if present
@@ -11,20 +20,273 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD") or None
+REDIS_SOCKET = os.getenv("REDIS_SOCKET", "")  # unix socket path for a co-located Redis (replaces host/port)
+
+# Topology: "standalone", "sentinel" (REDIS_SENTINELS="host:port,..." + master name) or "cluster"
+REDIS_MODE = os.getenv("REDIS_MODE", "standalone")
+REDIS_SENTINELS = os.getenv("REDIS_SENTINELS", "")
+REDIS_SENTINEL_MASTER = os.getenv("REDIS_SENTINEL_MASTER", "mymaster")
+
+# Hash tag appended to every mesh key, e.g. "doc.review.tasks{mesh}". Multi-stream
+# XREADGROUPs, pipelines and Lua scripts touch several keys at once, which a cluster
+# only allows within one slot; the tag puts them all on the same slot.
+REDIS_HASH_TAG = os.getenv("REDIS_HASH_TAG", "mesh" if REDIS_MODE == "cluster" else "")
+
+# Connection pools, one per role and client kind (sync / asyncio):
+# - "write": commands and writes; short socket timeout, decoded responses.
+# - "read": blocking stream reads (XREADGROUP / XREAD block up to a few seconds), raw
+#   bytes for the codec. Kept apart so a blocked read never holds a connection a write needs.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+REDIS_READ_MAX_CONNECTIONS = int(os.getenv("REDIS_READ_MAX_CONNECTIONS", 8))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_READ_SOCKET_TIMEOUT = float(os.getenv("REDIS_READ_SOCKET_TIMEOUT", 30))  # must exceed the longest BLOCK
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 5))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 20))  # wait for a free connection before failing
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))  # seconds idle before a PING
+REDIS_KEEPALIVE = os.getenv("REDIS_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", 3))  # on timeouts / dropped connections, with backoff
+
+# role -> (max connections, socket timeout, decode responses)
+POOL_ROLES = {
+    "write": (REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT, True),
+    "read": (REDIS_READ_MAX_CONNECTIONS, REDIS_READ_SOCKET_TIMEOUT, False),
+}
+
+# Partitioned streams: with STREAM_PARTITIONS > 1 every mesh stream is split into
+# "<name>.<p>" streams and a document always goes to partition crc32(doc_id) % N, so its
+# entries stay in order. In cluster mode each partition (with the state of its documents)
+# gets its own hash tag, "{mesh-<p>}", so partitions spread over the cluster's nodes.
+STREAM_PARTITIONS = int(os.getenv("STREAM_PARTITIONS", 1))
+# Without partitions every key shares the one "{mesh}" tag, i.e. a single slot on a single shard
+if REDIS_MODE == "cluster" and STREAM_PARTITIONS <= 1:
+    raise ValueError("REDIS_MODE=cluster needs STREAM_PARTITIONS > 1 (otherwise the whole mesh sits on one slot)")
+
+# Priority lanes: the work streams (tasks and the specialists' inputs) are split by priority
+# class, "<lane>:<weight>" from highest to lowest priority. Agents read the lanes by weight, so
+# an interactive request never queues behind a bulk upload and bulk work still progresses.
+# The last lane is the default one and keeps the plain stream name; the others append ".<lane>".
+# One lane by default (the stream layout is unchanged); e.g. "interactive:4,batch:1" opts in.
+PRIORITY_LANES = os.getenv("PRIORITY_LANES", "batch:1")
+
+# Stochastic fair queuing: each lane of a specialist input is split into FAIR_QUEUES streams
+# (".q<n>", queue 0 keeps the lane's name) by a hash of the tenant (or doc_id). Agents take an
+# equal share from every queue, so one huge document only holds up the others in its queue.
+# 1 (the default) turns it off.
+FAIR_QUEUES = int(os.getenv("FAIR_QUEUES", 1))
+
+# Mesh topology:
+# - "coordinator": the coordinator reads doc.review.tasks and copies each chunk into the
+#   input stream of every specialist it is routed to.
+# - "direct": every specialist group reads doc.review.tasks itself and drops the chunks not
+#   routed to it (one write per chunk instead of one per specialist; no coordinator hop).
+MESH_TOPOLOGY = os.getenv("MESH_TOPOLOGY", "coordinator")
+if MESH_TOPOLOGY not in ("coordinator", "direct"):
+    raise ValueError(f"MESH_TOPOLOGY must be 'coordinator' or 'direct', not '{MESH_TOPOLOGY}'")
+DIRECT_TOPOLOGY = MESH_TOPOLOGY == "direct"
+
+def _parse_lanes(spec: str) -> Dict[str, int]:
+    lanes = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition(":")
+        if not name:
+            continue
+        if name.isdigit() or (name[0] == "q" and name[1:].isdigit()):
+            raise ValueError(f"Invalid lane name '{name}' in PRIORITY_LANES (clashes with partition / queue suffixes)")
+        lanes[name] = max(1, int(weight or 1))
+    return lanes or {"batch": 1}
+
+LANES = _parse_lanes(PRIORITY_LANES)  # lane -> weight, highest priority first
+LANE_NAMES = list(LANES)
+DEFAULT_LANE = LANE_NAMES[-1]
+
+def _with_tag(name: str, tag: str) -> str:
+    return f"{name}{{{tag}}}" if tag else name
+
+def tagged(name: str) -> str:
+    """A mesh key name with the cluster hash tag (unchanged when no tag is configured)."""
+    return _with_tag(name, REDIS_HASH_TAG)
+
+def untagged(name: str) -> str:
+    return name.split("{", 1)[0]
+
+def id_key(message_id: str) -> Tuple[int, int]:
+    """Sort key of a stream entry ID ("<ms>-<seq>"; "-" and "+" sort first and last)."""
+    if message_id in ("-", "+"):
+        return (-1, -1) if message_id == "-" else (float("inf"), 0)
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def id_ms(message_id: str) -> int:
+    """The millisecond timestamp of a stream entry ID."""
+    return int(message_id.split("-", 1)[0])
+
+def partition_of(doc_id: str) -> int:
+    return zlib.crc32(doc_id.encode("utf-8")) % STREAM_PARTITIONS
+
+def partition_tag(partition: int) -> str:
+    return f"{REDIS_HASH_TAG}-{partition}" if REDIS_HASH_TAG and STREAM_PARTITIONS > 1 else REDIS_HASH_TAG
+
+def fair_queue_of(key: str) -> int:
+    # Not crc32: queues must not line up with partitions (partition_of) when N and FAIR_QUEUES match
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=4).digest(), "big") % FAIR_QUEUES
+
+def partition_key(name: str, partition: int) -> str:
+    """Partition `partition` of the (untagged) key `name`."""
+    if STREAM_PARTITIONS <= 1:
+        return tagged(name)
+    return _with_tag(f"{name}.{partition}", partition_tag(partition))
+
+def doc_key(name: str, doc_id: str) -> str:
+    """A per-document key, on the same slot as the document's partition streams."""
+    return _with_tag(name, partition_tag(partition_of(doc_id)))
+
+def _physical(name: str, lane: str, queue: int, partition: int) -> str:
+    """"<name>[.<lane>][.q<queue>][.<partition>]" with its hash tag."""
+    if lane != DEFAULT_LANE:
+        name = f"{name}.{lane}"
+    if queue:
+        name = f"{name}.q{queue}"
+    return partition_key(name, partition)
+
+def _split(stream: str) -> Tuple[str, str, int]:
+    """(logical name, lane, fair queue) of a physical stream name."""
+    name = untagged(stream)
+    base, _, suffix = name.rpartition(".")
+    if STREAM_PARTITIONS > 1 and suffix.isdigit():
+        name = base
+    queue = 0
+    base, _, suffix = name.rpartition(".")
+    if FAIR_QUEUES > 1 and suffix[:1] == "q" and suffix[1:].isdigit():
+        name, queue = base, int(suffix[1:])
+    lane = DEFAULT_LANE
+    base, _, suffix = name.rpartition(".")
+    if suffix in LANES and suffix != DEFAULT_LANE:
+        name, lane = base, suffix
+    return name, lane, queue
+
+def stream_for(stream: str, doc_id: str, priority: str = None, tenant: str = None) -> str:
+    """The physical stream a document's entries go to: its lane, fair queue and partition."""
+    if stream not in PARTITIONED_STREAMS:
+        return stream
+    lane = priority if stream in LANED_STREAMS and priority in LANES else DEFAULT_LANE
+    queue = fair_queue_of(tenant or doc_id) if stream in FAIR_QUEUED_STREAMS and FAIR_QUEUES > 1 else 0
+    partition = partition_of(doc_id) if STREAM_PARTITIONS > 1 else 0
+    return _physical(untagged(stream), lane, queue, partition)
+
+def logical_stream(stream: str) -> str:
+    """The untagged name of a physical stream without lane, queue or partition, e.g. for per-stream settings."""
+    return _split(stream)[0]
+
+def stream_lane(stream: str) -> Optional[str]:
+    """The priority lane of a physical stream (None for streams without lanes)."""
+    name, lane, _ = _split(stream)
+    return lane if tagged(name) in LANED_STREAMS else None
+
+def physical_streams(stream: str, partitions=None, lanes=None) -> List[str]:
+    """
+    Every physical stream of a logical one: its lanes (or the given ones), fair queues and
+    partitions (or the given partition numbers). Just the stream for streams that aren't split.
+    """
+    if stream not in PARTITIONED_STREAMS:
+        return [stream]
+    stream_lanes = LANE_NAMES if stream in LANED_STREAMS else [DEFAULT_LANE]
+    queues = range(FAIR_QUEUES) if stream in FAIR_QUEUED_STREAMS else [0]
+    if STREAM_PARTITIONS <= 1:
+        partitions = [0] if partitions is None else partitions[:1]
+    elif partitions is None:
+        partitions = range(STREAM_PARTITIONS)
+    return [
+        _physical(untagged(stream), lane, queue, partition)
+        for lane in stream_lanes if lanes is None or lane in lanes
+        for queue in queues
+        for partition in partitions
+    ]
+
+def _sentinel_hosts() -> List[Tuple[str, int]]:
+    hosts = []
+    for address in REDIS_SENTINELS.split(","):
+        if address.strip():
+            host, _, port = address.strip().partition(":")
+            hosts.append((host, int(port or 26379)))
+    return hosts
+
+def _connection_kwargs(role: str, is_async: bool) -> Dict[str, Any]:
+    _, socket_timeout, decode = POOL_ROLES[role]
+    retry_class = AsyncRetry if is_async else Retry
+    return {
+        "password": REDIS_PASSWORD,
+        "socket_timeout": socket_timeout or None,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_keepalive": REDIS_KEEPALIVE,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "retry": retry_class(ExponentialBackoff(), REDIS_RETRIES),
+        "retry_on_error": [ConnectionError, TimeoutError],
+        "decode_responses": decode,
+    }
+
+def create_client(role: str = "write", is_async: bool = False):
+    """A new client for `role` ("write" or "read") on its own tuned pool, for the configured topology."""
+    if role not in POOL_ROLES:
+        raise ValueError(f"Unknown client role '{role}' (expected one of {sorted(POOL_ROLES)})")
+    max_connections = POOL_ROLES[role][0]
+    kwargs = _connection_kwargs(role, is_async)
+    lib = aioredis if is_async else redis
+
+    if REDIS_MODE == "cluster":
+        cluster_class = aioredis.RedisCluster if is_async else redis.RedisCluster
+        return cluster_class(host=REDIS_HOST, port=REDIS_PORT, max_connections=max_connections, **kwargs)
+
+    if REDIS_MODE == "sentinel":
+        sentinel_lib = aioredis.sentinel if is_async else redis.sentinel
+        sentinel = sentinel_lib.Sentinel(
+            _sentinel_hosts(),
+            sentinel_kwargs={"password": REDIS_PASSWORD, "socket_timeout": REDIS_CONNECT_TIMEOUT},
+            **kwargs,
+        )
+        return sentinel.master_for(REDIS_SENTINEL_MASTER, db=REDIS_DB, max_connections=max_connections)
+
+    if REDIS_MODE != "standalone":
+        raise ValueError(f"Unknown REDIS_MODE '{REDIS_MODE}' (expected standalone, sentinel or cluster)")
+
+    if REDIS_SOCKET:
+        kwargs.pop("socket_keepalive")  # TCP only
+        kwargs.update(connection_class=lib.UnixDomainSocketConnection, path=REDIS_SOCKET)
+    else:
+        kwargs.update(host=REDIS_HOST, port=REDIS_PORT)
+    pool = lib.BlockingConnectionPool(
+        max_connections=max_connections, timeout=REDIS_POOL_TIMEOUT, db=REDIS_DB, **kwargs
+    )
+    return lib.Redis(connection_pool=pool)
 
 class RedisClient:
-    _instance: Optional[redis.Redis] = None
+    """Process-wide clients, one per role and kind, each with its own connection pool."""
+    _clients: Dict[Tuple[str, bool], Any] = {}
+
+    @classmethod
+    def shared(cls, role: str = "write", is_async: bool = False):
+        key = (role, is_async)
+        if key not in cls._clients:
+            cls._clients[key] = create_client(role, is_async)
+        return cls._clients[key]
 
     @classmethod
     def get_instance(cls) -> redis.Redis:
-        if cls._instance is None:
-            cls._instance = redis.Redis(
-                host=REDIS_HOST,
-                port=REDIS_PORT,
-                db=REDIS_DB,
-                decode_responses=True  # Important for string handling
-            )
-        return cls._instance
+        return cls.shared("write")
+
+    @classmethod
+    def get_async_instance(cls) -> aioredis.Redis:
+        """asyncio client with the same settings, for agents built on AsyncBaseAgent."""
+        return cls.shared("write", is_async=True)
+
+    @classmethod
+    def get_binary_instance(cls) -> redis.Redis:
+        """Client returning raw bytes, for reading stream entries (packed ones are binary)."""
+        return cls.shared("read")
+
+    @classmethod
+    def get_async_binary_instance(cls) -> aioredis.Redis:
+        return cls.shared("read", is_async=True)
 
     @staticmethod
     def ensure_streams_exist(streams: List[str]):
@@ -47,18 +309,42 @@ class RedisClient:
                 raise e
 
 # Constants for Stream Names
-STREAM_DOC_TASKS = "doc.review.tasks"
-STREAM_DOC_GRAMMAR = "doc.review.grammar"
-STREAM_DOC_CLARITY = "doc.review.clarity"
-STREAM_DOC_TONE = "doc.review.tone"
-STREAM_DOC_STRUCTURE = "doc.review.structure"
-
-STREAM_SUGGESTIONS_GRAMMAR = "doc.suggestions.grammar"
-STREAM_SUGGESTIONS_CLARITY = "doc.suggestions.clarity"
-STREAM_SUGGESTIONS_TONE = "doc.suggestions.tone"
-STREAM_SUGGESTIONS_STRUCTURE = "doc.suggestions.structure"
-
-STREAM_REVIEW_SUMMARY = "doc.review.summary"
+STREAM_DOC_TASKS = tagged("doc.review.tasks")
+STREAM_DOC_GRAMMAR = tagged("doc.review.grammar")
+STREAM_DOC_CLARITY = tagged("doc.review.clarity")
+STREAM_DOC_TONE = tagged("doc.review.tone")
+STREAM_DOC_STRUCTURE = tagged("doc.review.structure")
+
+STREAM_SUGGESTIONS_GRAMMAR = tagged("doc.suggestions.grammar")
+STREAM_SUGGESTIONS_CLARITY = tagged("doc.suggestions.clarity")
+STREAM_SUGGESTIONS_TONE = tagged("doc.suggestions.tone")
+STREAM_SUGGESTIONS_STRUCTURE = tagged("doc.suggestions.structure")
+
+STREAM_REVIEW_SUMMARY = tagged("doc.review.summary")
+
+# Logical streams that are split when STREAM_PARTITIONS > 1
+PARTITIONED_STREAMS = {
+    STREAM_DOC_TASKS,
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_SUGGESTIONS_GRAMMAR,
+    STREAM_SUGGESTIONS_CLARITY,
+    STREAM_SUGGESTIONS_TONE,
+    STREAM_SUGGESTIONS_STRUCTURE,
+    STREAM_REVIEW_SUMMARY,
+}
+
+# Work streams with priority lanes, and those of them also split into fair queues
+# (the specialists' inputs: the specialist streams, or the tasks stream in the direct topology)
+FAIR_QUEUED_STREAMS = {STREAM_DOC_TASKS} if DIRECT_TOPOLOGY else {
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+}
+LANED_STREAMS = {STREAM_DOC_TASKS} | FAIR_QUEUED_STREAMS
 
 # Constants for Consumer Groups
 GROUP_COORDINATOR = "coordinator-group"
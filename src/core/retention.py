@@ -0,0 +1,209 @@
+import os
+import time
+import redis
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+from src.core.redis_client import (
+    RedisClient,
+    tagged,
+    logical_stream,
+    physical_streams,
+    id_key,
+    STREAM_DOC_TASKS,
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_SUGGESTIONS_GRAMMAR,
+    STREAM_SUGGESTIONS_CLARITY,
+    STREAM_SUGGESTIONS_TONE,
+    STREAM_SUGGESTIONS_STRUCTURE,
+    STREAM_REVIEW_SUMMARY,
+)
+
+# Retention defaults, for every stream. Each can be overridden per stream with the stream
+# name upper-cased and dots as underscores, e.g. STREAM_MAXLEN_DOC_REVIEW_SUMMARY=1000
+# (all plain env vars, so they can live in the mesh-config ConfigMap).
+#
+# - STREAM_MAXLEN / STREAM_MAX_AGE: what the trimmer keeps (entries / seconds; 0 = no limit).
+#   It never removes an entry some consumer group has not acknowledged yet.
+# - STREAM_WRITE_MAXLEN / STREAM_WRITE_MAX_AGE: hard cap applied on every XADD with
+#   MAXLEN ~ / MINID ~. It ignores consumer groups, so keep it well above any backlog.
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 10000))
+STREAM_MAX_AGE = float(os.getenv("STREAM_MAX_AGE", 0))
+STREAM_WRITE_MAXLEN = int(os.getenv("STREAM_WRITE_MAXLEN", 1000000))
+STREAM_WRITE_MAX_AGE = float(os.getenv("STREAM_WRITE_MAX_AGE", 0))
+
+TRIM_INTERVAL = float(os.getenv("TRIM_INTERVAL", 30))  # seconds between trimmer passes
+TRIM_BATCH = int(os.getenv("TRIM_BATCH", 1000))  # max entries scanned per stream and pass for MAXLEN
+
+STREAM_STATS_KEY = tagged("mesh.stats.streams")  # hash: "<stream>:<length|memory_bytes|trimmed>"
+
+MESH_STREAMS = [physical for stream in [
+    STREAM_DOC_TASKS,
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_SUGGESTIONS_GRAMMAR,
+    STREAM_SUGGESTIONS_CLARITY,
+    STREAM_SUGGESTIONS_TONE,
+    STREAM_SUGGESTIONS_STRUCTURE,
+    STREAM_REVIEW_SUMMARY,
+] for physical in physical_streams(stream)]
+
+def _setting(name: str, stream: str, default, cast):
+    value = os.getenv(f"{name}_{logical_stream(stream).upper().replace('.', '_').replace('-', '_')}")
+    return cast(value) if value is not None else default
+
+@dataclass
+class RetentionPolicy:
+    maxlen: int = 0
+    max_age: float = 0
+    write_maxlen: int = 0
+    write_max_age: float = 0
+
+    @classmethod
+    def for_stream(cls, stream: str) -> "RetentionPolicy":
+        return cls(
+            maxlen=_setting("STREAM_MAXLEN", stream, STREAM_MAXLEN, int),
+            max_age=_setting("STREAM_MAX_AGE", stream, STREAM_MAX_AGE, float),
+            write_maxlen=_setting("STREAM_WRITE_MAXLEN", stream, STREAM_WRITE_MAXLEN, int),
+            write_max_age=_setting("STREAM_WRITE_MAX_AGE", stream, STREAM_WRITE_MAX_AGE, float),
+        )
+
+_policies: Dict[str, RetentionPolicy] = {}
+
+def policy(stream: str) -> RetentionPolicy:
+    if stream not in _policies:
+        _policies[stream] = RetentionPolicy.for_stream(stream)
+    return _policies[stream]
+
+def id_at(seconds: float) -> str:
+    """Smallest stream ID at or after a unix timestamp."""
+    return f"{int(seconds * 1000)}-0"
+
+def xadd_kwargs(stream: str) -> Dict[str, Any]:
+    """Write-side cap for redis-py's xadd (MAXLEN ~ takes precedence over MINID ~)."""
+    p = policy(stream)
+    if p.write_maxlen > 0:
+        return {"maxlen": p.write_maxlen, "approximate": True}
+    if p.write_max_age > 0:
+        return {"minid": id_at(time.time() - p.write_max_age), "approximate": True}
+    return {}
+
+def xadd_cap_args(stream: str) -> List[str]:
+    """The same cap as raw XADD arguments, for Lua scripts: e.g. ["MAXLEN", "~", "1000000"]."""
+    kwargs = xadd_kwargs(stream)
+    if "maxlen" in kwargs:
+        return ["MAXLEN", "~", str(kwargs["maxlen"])]
+    if "minid" in kwargs:
+        return ["MINID", "~", kwargs["minid"]]
+    return []
+
+def _next_id(message_id: str) -> str:
+    ms, _, seq = message_id.partition("-")
+    return f"{ms}-{int(seq or 0) + 1}"
+
+def _older(a: str, b: str) -> str:
+    return min(a, b, key=id_key)
+
+class StreamTrimmer:
+    """
+    Trims mesh streams to their retention policy without losing unprocessed work.
+
+    For every consumer group of a stream, entries up to its last-delivered ID that are
+    no longer in its PEL have been acknowledged. The trimmer only removes entries older
+    than the minimum of those bounds across all groups (XTRIM MINID ~), so pending and
+    undelivered entries always survive.
+    """
+
+    def __init__(self, streams: List[str] = None, redis_client: redis.Redis = None, interval: float = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        self.stream_client = RedisClient.get_binary_instance()
+        self.streams = streams or list(MESH_STREAMS)
+        self.interval = interval if interval is not None else TRIM_INTERVAL
+        self.should_run = True
+
+    def safe_id(self, stream: str) -> Optional[str]:
+        """Entries below this ID are acknowledged by every group (None: the stream does not exist)."""
+        try:
+            groups = self.redis_client.xinfo_groups(stream)
+        except redis.exceptions.ResponseError:
+            return None  # Stream does not exist
+
+        bound = None
+        for group in groups:
+            name = group["name"]
+            if group["pending"]:
+                oldest = self.redis_client.xpending(stream, name)["min"]
+            else:
+                # Everything up to last-delivered is ACKed; keep from the next ID on
+                oldest = _next_id(group["last-delivered-id"])
+            bound = oldest if bound is None else _older(bound, oldest)
+
+        # No groups (e.g. the summary stream, read with XREAD): nothing to wait for
+        return bound or "+"
+
+    def target_id(self, stream: str, p: RetentionPolicy) -> Optional[str]:
+        """First ID the policy wants to keep (None: within policy)."""
+        target = None
+        if p.max_age > 0:
+            target = id_at(time.time() - p.max_age)
+        if p.maxlen > 0:
+            excess = self.redis_client.xlen(stream) - p.maxlen
+            if excess > 0:
+                oldest = self.stream_client.xrange(stream, count=min(excess, TRIM_BATCH))
+                if oldest:
+                    by_length = _next_id(oldest[-1][0].decode())
+                    target = by_length if target is None else max(target, by_length, key=id_key)
+        return target
+
+    def trim(self, stream: str) -> int:
+        """One trim pass over `stream`; returns the number of entries removed."""
+        p = policy(stream)
+        target = self.target_id(stream, p)
+        if target is None:
+            return 0
+        safe = self.safe_id(stream)
+        if safe is None:
+            return 0
+
+        threshold = target if safe == "+" else _older(target, safe)
+        return self.redis_client.xtrim(stream, minid=threshold, approximate=True)
+
+    def stats(self, stream: str) -> Dict[str, int]:
+        return {
+            "length": self.redis_client.xlen(stream),
+            "memory_bytes": self.redis_client.memory_usage(stream, samples=0) or 0,
+        }
+
+    def run_once(self) -> Dict[str, int]:
+        """Trim every stream and publish length / memory / trimmed counters."""
+        trimmed = {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for stream in self.streams:
+            try:
+                trimmed[stream] = self.trim(stream)
+                stats = self.stats(stream)
+            except redis.exceptions.RedisError as e:
+                print(f"[trimmer] Could not trim {stream}: {e}")
+                continue
+            pipe.hset(STREAM_STATS_KEY, mapping={f"{stream}:{k}": v for k, v in stats.items()})
+            if trimmed[stream]:
+                pipe.hincrby(STREAM_STATS_KEY, f"{stream}:trimmed", trimmed[stream])
+        pipe.execute()
+        return trimmed
+
+    def run(self):
+        print(f"[trimmer] Trimming {len(self.streams)} streams every {self.interval}s")
+        while self.should_run:
+            trimmed = self.run_once()
+            if any(trimmed.values()):
+                print(f"[trimmer] Trimmed {sum(trimmed.values())} entries: "
+                      f"{ {s: n for s, n in trimmed.items() if n} }")
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.should_run = False
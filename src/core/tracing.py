@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import redis
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from src.core.documents import DOC_TTL
+from src.core.redis_client import doc_key, id_ms
+
+# Trace context: every upload gets a trace_id and its start time, carried on the chunk
+# entries and copied by each agent onto what it emits, from the producer to the aggregator.
+TRACE_FIELDS = ("trace_id", "trace_start")
+
+# Per-message stage timings. Each agent observes, for every entry it handles:
+#   queue    stream ID (XADD time) -> read
+#   process  read -> handler done, minus the time spent writing outputs
+#   write    output XADDs and the ACK (in batch mode: until the batch is flushed)
+# and the aggregator also end_to_end: upload -> result recorded.
+# They go to Prometheus histograms (per process, see serve_metrics) and to a small
+# histogram hash per document, doc:{doc_id}:timings, for `python -m src.main trace`.
+TRACING = os.getenv("TRACING", "true").lower() in ("1", "true", "yes")
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", 1))  # seconds between per-document publishes
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # agents' /metrics port; 0 = not served
+
+PHASES = ("queue", "process", "write", "end_to_end")
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000)
+
+STAGE_SECONDS = Histogram(
+    "mesh_stage_seconds", "Time per message and phase in each mesh stage",
+    ["stage", "phase"], buckets=[b / 1000 for b in BUCKETS_MS],
+)
+MESSAGES = Counter("mesh_messages_total", "Messages handled per stage", ["stage", "outcome"])
+API_SECONDS = Histogram("mesh_api_request_seconds", "API request handling time", ["endpoint"])
+API_REJECTED = Counter("mesh_api_rejected_total", "Uploads answered 429", ["reason"])
+SSE_CLIENTS = Gauge("mesh_sse_clients", "Connected /stream clients")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("mesh_span", default=None)
+
+def timings_key(doc_id: str) -> str:
+    return doc_key(f"doc:{doc_id}:timings", doc_id)
+
+def new_trace() -> Dict[str, str]:
+    """Trace context for a new upload."""
+    return {"trace_id": uuid.uuid4().hex, "trace_start": f"{time.time():.6f}"}
+
+def serve_metrics(port: int = None):
+    """Expose this process's metrics on http://0.0.0.0:<port>/metrics (no-op for port 0)."""
+    port = METRICS_PORT if port is None else port
+    if port:
+        start_http_server(port)
+        print(f"[metrics] Serving /metrics on :{port}")
+
+def bucket_field(ms: float, bounds=BUCKETS_MS) -> str:
+    """The histogram field ("le_<ms>" or "le_inf") a value of `ms` is counted in."""
+    return next((f"le_{b}" for b in bounds if ms <= b), "le_inf")
+
+class Span:
+    """Timings of one input message in one stage."""
+
+    def __init__(self, message_id: str, data: Dict[str, Any]):
+        self.doc_id = data.get("doc_id")
+        self.context = {f: data[f] for f in TRACE_FIELDS if f in data}
+        self.queue = max(0.0, time.time() - id_ms(message_id) / 1000)
+        self.started = time.perf_counter()
+        self.writing = 0.0  # time spent in output XADDs / ACKs so far
+        self.finished: Optional[float] = None
+        self.process = 0.0
+        self.written = 0.0
+
+    def processed(self):
+        """The handler is done: what follows counts as write time."""
+        self.finished = time.perf_counter()
+        self.process = self.finished - self.started - self.writing
+        self.written = self.writing
+
+    def end_to_end(self) -> Optional[float]:
+        start = self.context.get("trace_start")
+        return time.time() - float(start) if start else None
+
+def activate(span: Optional[Span]):
+    """Make `span` current in this thread / task: emits and writes are attributed to it."""
+    _current.set(span)
+
+def propagate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy the current message's trace context onto an output payload."""
+    span = _current.get()
+    if span is None or not span.context:
+        return payload
+    return {**span.context, **payload}
+
+def add_write(seconds: float):
+    span = _current.get()
+    if span is not None:
+        span.writing += seconds
+
+class StageTracer:
+    """Records spans of one stage into Prometheus and, per document, into Redis."""
+
+    def __init__(self, redis_client: redis.Redis, stage: str, interval: float = None, enabled: bool = None):
+        self.redis_client = redis_client
+        self.stage = stage
+        self.interval = interval if interval is not None else TRACE_FLUSH_INTERVAL
+        self.enabled = TRACING if enabled is None else enabled
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._last_flush = time.monotonic()
+
+    def start(self, message_id: str, data: Dict[str, Any]) -> Span:
+        """Open the span of a message about to be handled, and make it current."""
+        span = Span(message_id, data)
+        activate(span)
+        return span
+
+    def finish(self, span: Span, end_to_end: bool = False):
+        """Record a handled message whose outputs and ACK are written."""
+        if span.finished is None:
+            span.processed()
+        write = span.written + (time.perf_counter() - span.finished)
+        phases = {"queue": span.queue, "process": span.process, "write": write}
+        if end_to_end:
+            phases["end_to_end"] = span.end_to_end()
+        MESSAGES.labels(self.stage, "ok").inc()
+        for phase, seconds in phases.items():
+            if seconds is not None:
+                self.observe(span.doc_id, phase, seconds)
+        if _current.get() is span:
+            activate(None)
+
+    def failed(self, span: Span):
+        MESSAGES.labels(self.stage, "error").inc()
+        if _current.get() is span:
+            activate(None)
+
+    def observe(self, doc_id: Optional[str], phase: str, seconds: float):
+        STAGE_SECONDS.labels(self.stage, phase).observe(seconds)
+        if not self.enabled or not doc_id:
+            return
+        ms = seconds * 1000
+        prefix = f"{self.stage}:{phase}"
+        for field, value in ((f"{prefix}:count", 1), (f"{prefix}:sum_ms", ms), (f"{prefix}:{bucket_field(ms)}", 1)):
+            self._pending[(doc_id, field)] = self._pending.get((doc_id, field), 0) + value
+
+    def flush_due(self) -> bool:
+        return bool(self._pending) and time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for (doc_id, field), value in pending.items():
+            if field.endswith(":sum_ms"):
+                pipe.hincrbyfloat(timings_key(doc_id), field, round(value, 3))
+            else:
+                pipe.hincrby(timings_key(doc_id), field, int(value))
+        for doc_id in {doc_id for doc_id, _ in pending}:
+            pipe.expire(timings_key(doc_id), DOC_TTL)
+        try:
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print(f"[tracing] Could not publish timings: {e}")
+
+def _percentile(buckets: List[Tuple[float, int]], count: int, q: float) -> float:
+    """Upper bound (ms) of the histogram bucket holding the q-th quantile."""
+    seen = 0
+    for bound, n in buckets:
+        seen += n
+        if seen >= q * count:
+            return bound
+    return float("inf")
+
+def histogram_report(fields: Dict[str, Any], bounds=BUCKETS_MS,
+                     sum_name: str = "sum_ms") -> Dict[Tuple[str, str], Dict[str, float]]:
+    """
+    Count, average and approximate p50 / p95 / p99 in ms per (a, b), from histogram
+    hash fields "<a>:<b>:<count|`sum_name`|le_<ms>|le_inf>" with the given bucket bounds.
+    """
+    raw: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for field, value in fields.items():
+        a, b, name = field.rsplit(":", 2)
+        raw.setdefault((a, b), {})[name] = float(value)
+
+    report = {}
+    for key, stats in raw.items():
+        count = int(stats.get("count", 0))
+        if not count:
+            continue
+        buckets = [(b, int(stats.get(f"le_{b}", 0))) for b in bounds]
+        buckets.append((float("inf"), int(stats.get("le_inf", 0))))
+        report[key] = {
+            "count": count,
+            "avg_ms": stats.get(sum_name, 0) / count,
+            "p50_ms": _percentile(buckets, count, 0.50),
+            "p95_ms": _percentile(buckets, count, 0.95),
+            "p99_ms": _percentile(buckets, count, 0.99),
+        }
+    return report
+
+def timings_report(fields: Dict[str, Any]) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """(stage, phase) -> count, average and approximate p50 / p95 / p99 in ms, from timings hash fields."""
+    return histogram_report(fields)
+
+def doc_timings(redis_client: redis.Redis, doc_id: str) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """The timings report of one document."""
+    return timings_report(redis_client.hgetall(timings_key(doc_id)))
+
+def docs_timings(redis_client: redis.Redis, doc_ids: List[str]) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """The timings report of several documents together (their histograms added up)."""
+    pipe = redis_client.pipeline(transaction=False)
+    for doc_id in doc_ids:
+        pipe.hgetall(timings_key(doc_id))
+    merged: Dict[str, float] = {}
+    for fields in pipe.execute():
+        for field, value in fields.items():
+            merged[field] = merged.get(field, 0) + float(value)
+    return timings_report(merged)
@@ -0,0 +1,348 @@
+import os
+import time
+import threading
+import redis
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.core.redis_client import (
+    RedisClient,
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_SUGGESTIONS_GRAMMAR,
+    STREAM_SUGGESTIONS_CLARITY,
+    STREAM_SUGGESTIONS_TONE,
+    STREAM_SUGGESTIONS_STRUCTURE,
+    logical_stream,
+    tagged,
+    id_key,
+)
+from src.core.retention import xadd_kwargs
+
+# Where the mesh's internal hops (coordinator -> specialists -> aggregator) travel:
+# - "redis": Redis Streams, agents in any number of processes and hosts;
+# - "local": the hops between coordinator, specialists and aggregator (LOCAL_STREAMS) as
+#   in-process streams, for all agents running as threads of one process (`start-all
+#   --transport local`). Everything else stays on Redis, because other processes share it:
+#   the tasks and summary streams, dead-letter streams, document state, cache, claim-checked
+#   payloads, stage traces, lane stats and partition membership. Those calls are per chunk
+#   too; local mode removes the stream hops, not Redis.
+MESH_TRANSPORT = os.getenv("MESH_TRANSPORT", "redis")
+TRANSPORTS = ("redis", "local")
+
+# Logical streams that go through the local transport in "local" mode
+LOCAL_STREAMS = {
+    STREAM_DOC_GRAMMAR,
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_SUGGESTIONS_GRAMMAR,
+    STREAM_SUGGESTIONS_CLARITY,
+    STREAM_SUGGESTIONS_TONE,
+    STREAM_SUGGESTIONS_STRUCTURE,
+}
+
+# (stream, fields) to add, and stream -> IDs to ACK
+Adds = List[Tuple[str, Dict[str, Any]]]
+Acks = Dict[str, List[str]]
+
+class Transport(ABC):
+    """
+    The stream operations of the agents, with Redis consumer-group semantics: an entry read
+    by a group stays pending for the consumer it was delivered to until ACKed, and pending
+    entries idle long enough may be claimed by another consumer (at-least-once delivery).
+    Entries are codec field dicts; reads return them the way XREADGROUP does.
+    """
+
+    @abstractmethod
+    def create_group(self, stream: str, group: str, start: str = "0") -> bool:
+        """Create `group` on `stream` (and the stream); False if it already exists."""
+
+    @abstractmethod
+    def read_group(self, group: str, consumer: str, streams: List[str], count: int, block: Optional[int] = None):
+        """Up to `count` new entries per stream for `consumer`, waiting up to `block` ms for some."""
+
+    @abstractmethod
+    def add(self, stream: str, fields: Dict[str, Any]) -> str:
+        """Append an entry; returns its ID."""
+
+    @abstractmethod
+    def ack(self, stream: str, group: str, *message_ids: str) -> int:
+        pass
+
+    @abstractmethod
+    def pending(self, stream: str, group: str, min: str = "-", max: str = "+", count: int = 100,
+                consumer: str = None) -> List[Dict[str, Any]]:
+        """Pending entries: message_id, consumer, time_since_delivered (ms), times_delivered."""
+
+    def delivery_counts(self, stream: str, group: str, message_ids: List[str]) -> Dict[str, int]:
+        """Times each pending entry was delivered, by ID (entries no longer pending are left out)."""
+        counts = {}
+        for message_id in message_ids:
+            for p in self.pending(stream, group, min=message_id, max=message_id, count=1):
+                counts[p["message_id"]] = p["times_delivered"]
+        return counts
+
+    @abstractmethod
+    def claim(self, stream: str, group: str, consumer: str, min_idle_ms: int, start_id: str = "0-0",
+              count: int = 100) -> Tuple[Any, list]:
+        """Move pending entries idle >= `min_idle_ms` to `consumer`: (next cursor, [(id, fields)])."""
+
+    def write(self, adds: Adds, acks: Acks = None, group: str = None, transactional: bool = False):
+        """Add entries, then ACK inputs (one round trip where the transport can)."""
+        for stream, fields in adds:
+            self.add(stream, fields)
+        for stream, ids in (acks or {}).items():
+            self.ack(stream, group, *ids)
+
+class RedisTransport(Transport):
+    def __init__(self, redis_client: redis.Redis = None, stream_client: redis.Redis = None):
+        self.redis_client = redis_client or RedisClient.get_instance()
+        # Entries may be packed (binary), so they are read with a non-decoding client
+        self.stream_client = stream_client or RedisClient.get_binary_instance()
+
+    def create_group(self, stream, group, start="0"):
+        try:
+            self.redis_client.xgroup_create(stream, group, id=start, mkstream=True)
+            return True
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                return False
+            raise e
+
+    def read_group(self, group, consumer, streams, count, block=None):
+        return self.stream_client.xreadgroup(
+            groupname=group,
+            consumername=consumer,
+            streams={stream: ">" for stream in streams},
+            count=count,
+            block=block,
+        )
+
+    def add(self, stream, fields):
+        return self.redis_client.xadd(stream, fields, **xadd_kwargs(stream))
+
+    def ack(self, stream, group, *message_ids):
+        return self.redis_client.xack(stream, group, *message_ids)
+
+    def pending(self, stream, group, min="-", max="+", count=100, consumer=None):
+        return self.redis_client.xpending_range(stream, group, min=min, max=max, count=count, consumername=consumer)
+
+    def delivery_counts(self, stream, group, message_ids):
+        # One XPENDING per ID: a range query would also return the other entries pending in between
+        pipe = self.redis_client.pipeline(transaction=False)
+        for message_id in message_ids:
+            pipe.xpending_range(stream, group, min=message_id, max=message_id, count=1)
+        return {p["message_id"]: p["times_delivered"] for pending in pipe.execute() for p in pending}
+
+    def claim(self, stream, group, consumer, min_idle_ms, start_id="0-0", count=100):
+        # Redis 7 also returns the IDs of entries that were trimmed away; it drops those from the PEL itself
+        result = self.stream_client.xautoclaim(
+            stream, group, consumer, min_idle_time=min_idle_ms, start_id=start_id, count=count
+        )
+        return result[0], result[1]
+
+    def write(self, adds, acks=None, group=None, transactional=False):
+        pipe = self.redis_client.pipeline(transaction=transactional)
+        for stream, fields in adds:
+            pipe.xadd(stream, fields, **xadd_kwargs(stream))
+        for stream, ids in (acks or {}).items():
+            pipe.xack(stream, group, *ids)
+        pipe.execute()
+
+class _LocalGroup:
+    def __init__(self, next_pos: int):
+        self.next_pos = next_pos  # position of the first entry not delivered yet
+        # message ID -> [consumer, delivered at (monotonic), times delivered, position], in delivery order
+        self.pending: "OrderedDict[str, list]" = OrderedDict()
+
+    def oldest(self) -> int:
+        """Position of the oldest entry this group still needs (claims keep the delivery order)."""
+        first = next(iter(self.pending.values()), None)
+        return self.next_pos if first is None else first[3]
+
+class _LocalStream:
+    def __init__(self):
+        self.entries: List[Tuple[str, Dict[str, Any]]] = []
+        self.base = 0  # position of entries[0]; entries read and ACKed by every group are dropped
+        self.groups: Dict[str, _LocalGroup] = {}
+
+    def entry(self, pos: int) -> Tuple[str, Dict[str, Any]]:
+        return self.entries[pos - self.base]
+
+    def compact(self):
+        """Drop leading entries every group has read and ACKed."""
+        if not self.groups:
+            return  # A group created later starts from the beginning
+        keep = min(g.oldest() for g in self.groups.values())
+        # In steps, so the list isn't shifted on every ACK
+        if keep - self.base >= 1024 or (keep > self.base and keep - self.base == len(self.entries)):
+            del self.entries[:keep - self.base]
+            self.base = keep
+
+class LocalTransport(Transport):
+    """
+    In-process streams for agents running as threads of one process. Same delivery
+    semantics as Redis (pending entries, ACKs, claims), time-based IDs so queue times
+    still read off the ID; nothing outlives the process.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, _LocalStream] = {}
+        self._changed = threading.Condition()
+        self._last_id = (0, 0)
+
+    def _stream(self, stream: str) -> _LocalStream:
+        return self._streams.setdefault(stream, _LocalStream())
+
+    def _next_id(self) -> str:
+        ms = int(time.time() * 1000)
+        last_ms, seq = self._last_id
+        self._last_id = (ms, 0) if ms > last_ms else (last_ms, seq + 1)
+        return f"{self._last_id[0]}-{self._last_id[1]}"
+
+    def create_group(self, stream, group, start="0"):
+        with self._changed:
+            s = self._stream(stream)
+            if group in s.groups:
+                return False
+            s.groups[group] = _LocalGroup(s.base if start == "0" else s.base + len(s.entries))
+            return True
+
+    def _deliver(self, group, consumer, streams, count):
+        now = time.monotonic()
+        messages = []
+        for name in streams:
+            s = self._streams.get(name)
+            g = s.groups.get(group) if s else None
+            if g is None:
+                raise redis.exceptions.ResponseError(f"NOGROUP No such key '{name}' or consumer group '{group}'")
+            end = min(s.base + len(s.entries), g.next_pos + count)
+            if end <= g.next_pos:
+                continue
+            entries = []
+            for pos in range(g.next_pos, end):
+                message_id, fields = s.entry(pos)
+                g.pending[message_id] = [consumer, now, 1, pos]
+                entries.append((message_id, fields))
+            g.next_pos = end
+            messages.append((name, entries))
+        return messages
+
+    def read_group(self, group, consumer, streams, count, block=None):
+        deadline = None if block is None else time.monotonic() + block / 1000
+        with self._changed:
+            while True:
+                messages = self._deliver(group, consumer, streams, count)
+                if messages or deadline is None:
+                    return messages
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._changed.wait(remaining)
+
+    def _add(self, stream, fields):
+        message_id = self._next_id()
+        self._stream(stream).entries.append((message_id, fields))
+        return message_id
+
+    def add(self, stream, fields):
+        with self._changed:
+            message_id = self._add(stream, fields)
+            self._changed.notify_all()
+        return message_id
+
+    def _ack(self, stream, group, message_ids):
+        s = self._streams.get(stream)
+        g = s.groups.get(group) if s else None
+        if g is None:
+            return 0
+        acked = sum(1 for message_id in message_ids if g.pending.pop(message_id, None) is not None)
+        s.compact()
+        return acked
+
+    def ack(self, stream, group, *message_ids):
+        with self._changed:
+            return self._ack(stream, group, message_ids)
+
+    def pending(self, stream, group, min="-", max="+", count=100, consumer=None):
+        now = time.monotonic()
+        low, high = id_key(str(min)), id_key(str(max))
+        with self._changed:
+            s = self._streams.get(stream)
+            g = s.groups.get(group) if s else None
+            if g is None:
+                return []
+            found = []
+            for message_id, (owner, delivered, times, _) in g.pending.items():
+                if len(found) >= count:
+                    break
+                if low <= id_key(message_id) <= high and consumer in (None, owner):
+                    found.append({
+                        "message_id": message_id,
+                        "consumer": owner,
+                        "time_since_delivered": int((now - delivered) * 1000),
+                        "times_delivered": times,
+                    })
+            return found
+
+    def delivery_counts(self, stream, group, message_ids):
+        with self._changed:
+            s = self._streams.get(stream)
+            g = s.groups.get(group) if s else None
+            if g is None:
+                return {}
+            return {message_id: g.pending[message_id][2] for message_id in message_ids if message_id in g.pending}
+
+    def claim(self, stream, group, consumer, min_idle_ms, start_id="0-0", count=100):
+        now = time.monotonic()
+        start = id_key(start_id.decode() if isinstance(start_id, bytes) else start_id)
+        with self._changed:
+            s = self._streams.get(stream)
+            g = s.groups.get(group) if s else None
+            if g is None:
+                raise redis.exceptions.ResponseError(f"NOGROUP No such key '{stream}' or consumer group '{group}'")
+            claimed, cursor = [], "0-0"
+            for message_id in sorted(g.pending, key=id_key):
+                if id_key(message_id) < start:
+                    continue
+                if len(claimed) >= count:
+                    cursor = message_id
+                    break
+                entry = g.pending[message_id]
+                if (now - entry[1]) * 1000 >= min_idle_ms:
+                    entry[0], entry[1], entry[2] = consumer, now, entry[2] + 1
+                    claimed.append(s.entry(entry[3]))
+            return cursor, claimed
+
+    def write(self, adds, acks=None, group=None, transactional=False):
+        # Always atomic: one lock for the whole batch
+        with self._changed:
+            for stream, fields in adds:
+                self._add(stream, fields)
+            for stream, ids in (acks or {}).items():
+                self._ack(stream, group, ids)
+            self._changed.notify_all()
+
+_transports: Dict[str, Transport] = {}
+
+def use_transport(name: str):
+    """Select the transport of the mesh's internal streams for this process (before agents are built)."""
+    global MESH_TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown transport '{name}' (expected one of {TRANSPORTS})")
+    MESH_TRANSPORT = name
+
+def get_transport(name: str = "redis") -> Transport:
+    if name not in _transports:
+        _transports[name] = LocalTransport() if name == "local" else RedisTransport()
+    return _transports[name]
+
+def transport_for(stream: str) -> Transport:
+    """The transport carrying a physical stream."""
+    if MESH_TRANSPORT == "local" and tagged(logical_stream(stream)) in LOCAL_STREAMS:
+        return get_transport("local")
+    return get_transport("redis")
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List
+
+# Chunk sizes in (estimated) tokens. Small paragraphs are merged into chunks of about
+# the target (boundaries picked by content, see chunk_paragraphs); anything above the
+# max is split on sentence boundaries.
+TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", 256))
+MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 512))
+# A chunk never ends on a content boundary before this fraction of the target
+MIN_FRACTION = 0.25
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SENTENCE_RE = re.compile(r"[^.!?]+(?:[.!?]+[\"')\]]*|$)\s*")
+MARKDOWN_HEADING_RE = re.compile(r"^#{1,6}\s")
+
+def estimate_tokens(text: str) -> int:
+    """Words and punctuation marks; close enough to BPE token counts for sizing chunks."""
+    return len(TOKEN_RE.findall(text))
+
+@dataclass
+class Paragraph:
+    """One source paragraph and where it starts in the document text."""
+    text: str
+    offset: int
+    heading: bool = False
+
+@dataclass
+class Chunk:
+    """
+    A unit of work for the mesh: whole paragraphs, or part of one oversized paragraph.
+
+    `start`/`end` are character offsets into the source document text, and
+    `first_paragraph`/`last_paragraph` the paragraph indexes it covers, so
+    suggestions can be mapped back to the original.
+    """
+    text: str
+    start: int
+    end: int
+    first_paragraph: int
+    last_paragraph: int
+    heading: str = ""
+    tokens: int = 0
+    heading_only: bool = False
+
+    def fields(self) -> Dict[str, str]:
+        """Location and routing-feature fields added to the chunk's stream entry."""
+        return {
+            "start": str(self.start),
+            "end": str(self.end),
+            "paragraphs": f"{self.first_paragraph}-{self.last_paragraph}",
+            "heading": self.heading,
+            "tokens": str(self.tokens),
+            "heading_only": "1" if self.heading_only else "0",
+        }
+
+def paragraphs_from_text(text: str) -> Iterator[Paragraph]:
+    """Non-empty lines of plain text; markdown-style `#` lines are headings."""
+    for match in re.finditer(r"[^\n]+", text):
+        line = match.group()
+        stripped = line.strip()
+        if not stripped:
+            continue
+        yield Paragraph(stripped, match.start() + line.index(stripped), bool(MARKDOWN_HEADING_RE.match(stripped)))
+
+def split_sentences(paragraph: Paragraph) -> List[Paragraph]:
+    """Sentences of a paragraph, each with its own offset."""
+    sentences = []
+    for match in SENTENCE_RE.finditer(paragraph.text):
+        sentence = match.group().rstrip()
+        if sentence.strip():
+            sentences.append(Paragraph(sentence, paragraph.offset + match.start()))
+    return sentences or [paragraph]
+
+def split_words(sentence: Paragraph, max_tokens: int) -> List[Paragraph]:
+    """Last resort for a single sentence above the max: cut between words."""
+    pieces, start, count = [], None, 0
+    for match in re.finditer(r"\S+", sentence.text):
+        if start is None:
+            start = match.start()
+        count += estimate_tokens(match.group())
+        if count >= max_tokens:
+            pieces.append(Paragraph(sentence.text[start:match.end()], sentence.offset + start))
+            start, count = None, 0
+    if start is not None:
+        pieces.append(Paragraph(sentence.text[start:], sentence.offset + start))
+    return pieces
+
+def is_boundary(text: str, tokens: int, target_tokens: int) -> bool:
+    """
+    Whether a chunk may end after this paragraph. Depends only on the paragraph itself:
+    a hash of its text, below a threshold proportional to its size, so chunks average
+    about `target_tokens` past the minimum.
+    """
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    spread = max(target_tokens - int(target_tokens * MIN_FRACTION), 1)
+    return int.from_bytes(digest, "big") < min(tokens / spread, 1.0) * 2 ** 64
+
+def chunk_paragraphs(
+    paragraphs: Iterable[Paragraph],
+    target_tokens: int = None,
+    max_tokens: int = None,
+) -> Iterator[Chunk]:
+    """
+    Pack paragraphs into chunks of about `target_tokens`, streaming.
+
+    - consecutive small paragraphs are merged; a chunk ends after a paragraph whose
+      content makes it a boundary (`is_boundary`) once past the minimum, or before
+      the paragraph that would take it over `max_tokens`. Boundaries follow the text,
+      not the running token count, so editing one paragraph changes the chunk holding
+      it (and at most a neighbour) instead of shifting every later chunk;
+    - a heading always starts a new chunk, and stays with the text that follows it;
+    - a paragraph above `max_tokens` is split on sentence boundaries (between words
+      if a single sentence is still too long).
+    """
+    target_tokens = target_tokens or TARGET_TOKENS
+    max_tokens = max(max_tokens or MAX_TOKENS, target_tokens)
+    min_tokens = int(target_tokens * MIN_FRACTION)
+
+    buffer: List[Paragraph] = []
+    buffer_index = 0
+    buffer_tokens = 0
+    section = ""
+
+    def emit(parts: List[Paragraph], first: int, last: int, tokens: int) -> Chunk:
+        end = parts[-1].offset + len(parts[-1].text)
+        return Chunk(
+            text="\n".join(p.text for p in parts),
+            start=parts[0].offset,
+            end=end,
+            first_paragraph=first,
+            last_paragraph=last,
+            heading=section,
+            tokens=tokens,
+            heading_only=all(p.heading for p in parts),
+        )
+
+    for index, paragraph in enumerate(paragraphs):
+        tokens = estimate_tokens(paragraph.text)
+
+        if paragraph.heading:
+            if buffer:
+                yield emit(buffer, buffer_index, index - 1, buffer_tokens)
+            section = paragraph.text.lstrip("#").strip()
+            buffer, buffer_index, buffer_tokens = [paragraph], index, tokens
+            continue
+
+        if tokens > max_tokens:
+            if buffer:
+                yield emit(buffer, buffer_index, index - 1, buffer_tokens)
+                buffer, buffer_tokens = [], 0
+
+            pieces, piece_tokens = [], 0
+            for sentence in split_sentences(paragraph):
+                sentence_tokens = estimate_tokens(sentence.text)
+                parts = split_words(sentence, max_tokens) if sentence_tokens > max_tokens else [sentence]
+                for part in parts:
+                    part_tokens = estimate_tokens(part.text)
+                    if pieces and piece_tokens + part_tokens > target_tokens:
+                        yield emit([_join(pieces)], index, index, piece_tokens)
+                        pieces, piece_tokens = [], 0
+                    pieces.append(part)
+                    piece_tokens += part_tokens
+            if pieces:
+                yield emit([_join(pieces)], index, index, piece_tokens)
+            continue
+
+        if buffer and buffer_tokens + tokens > max_tokens:
+            yield emit(buffer, buffer_index, index - 1, buffer_tokens)
+            buffer, buffer_tokens = [], 0
+
+        if not buffer:
+            buffer_index = index
+        buffer.append(paragraph)
+        buffer_tokens += tokens
+
+        if buffer_tokens >= min_tokens and is_boundary(paragraph.text, tokens, target_tokens):
+            yield emit(buffer, buffer_index, index, buffer_tokens)
+            buffer, buffer_tokens = [], 0
+
+    if buffer:
+        yield emit(buffer, buffer_index, buffer_index + len(buffer) - 1, buffer_tokens)
+
+def _join(pieces: List[Paragraph]) -> Paragraph:
+    """Contiguous sentences of one paragraph back into a single span."""
+    text = pieces[0].text
+    for previous, piece in zip(pieces, pieces[1:]):
+        gap = piece.offset - (previous.offset + len(previous.text))
+        text += " " * max(gap, 0) + piece.text
+    return Paragraph(text, pieces[0].offset)
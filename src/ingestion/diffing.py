@@ -0,0 +1,56 @@
+import hashlib
+import shortuuid
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import List, Sequence, Tuple, Callable
+
+from src.ingestion.chunking import Chunk
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def new_chunk_id() -> str:
+    return f"p-{shortuuid.uuid()}"
+
+@dataclass
+class RevisionPlan:
+    """What to do with a (re-)uploaded document, relative to its stored chunk index."""
+    index: List[tuple] = field(default_factory=list)               # full new order: (chunk_id, content_hash, start, end)
+    changed: List[Tuple[str, Chunk]] = field(default_factory=list) # (chunk_id, chunk) to enqueue
+    unchanged: List[str] = field(default_factory=list)             # chunk ids whose results carry over
+    retracted: List[str] = field(default_factory=list)             # chunk ids that no longer exist
+    fresh: bool = True                                             # no previous revision
+
+def plan_revision(
+    previous: List[tuple],
+    chunks: Sequence[Chunk],
+    make_id: Callable[[], str] = new_chunk_id,
+) -> RevisionPlan:
+    """
+    Diff the new chunk list against the previous (chunk_id, content_hash, ...) index.
+
+    Unchanged chunks keep their chunk IDs and are not re-enqueued. Inserted and
+    modified chunks get new IDs; the IDs of modified and deleted chunks are
+    retracted, so late results for the old text can never count towards the new revision.
+    """
+    hashes = [content_hash(chunk.text) for chunk in chunks]
+    plan = RevisionPlan(fresh=not previous)
+
+    old_hashes = [entry[1] for entry in previous]
+    matcher = SequenceMatcher(None, old_hashes, hashes, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            # Same text, but offsets move with edits earlier in the document
+            for entry, chunk, h in zip(previous[i1:i2], chunks[j1:j2], hashes[j1:j2]):
+                plan.index.append((entry[0], h, chunk.start, chunk.end))
+                plan.unchanged.append(entry[0])
+            continue
+
+        # replace / delete / insert
+        plan.retracted.extend(entry[0] for entry in previous[i1:i2])
+        for chunk, h in zip(chunks[j1:j2], hashes[j1:j2]):
+            chunk_id = make_id()
+            plan.index.append((chunk_id, h, chunk.start, chunk.end))
+            plan.changed.append((chunk_id, chunk))
+
+    return plan
@@ -1,18 +1,204 @@
-from docx import Document
 import time
-import shortuuid
+import glob
 import click
 import os
-from src.core.redis_client import RedisClient, STREAM_DOC_TASKS
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+from src.core.redis_client import RedisClient, STREAM_DOC_TASKS, LANE_NAMES, DEFAULT_LANE, stream_for
+from src.core.models import SuggestionType
+from src.core.payloads import CLAIM_CHECK, check_in
+from src.core.codec import encode
+from src.core.admission import AdmissionController
+from src.core.retention import xadd_kwargs
+from src.core.tracing import new_trace
+from src.core.documents import DocumentStore, register_document, seal_document, load_chunk_index
+from src.ingestion.diffing import plan_revision, content_hash, new_chunk_id
+from src.ingestion.chunking import Chunk, Paragraph, chunk_paragraphs, paragraphs_from_text
 
-def run_producer(doc_id, paragraphs=None, file_path=None):
+# Bulk ingestion: chunks per pipelined XADD batch, and an optional global rate limit
+BATCH_SIZE = int(os.getenv("PRODUCER_BATCH_SIZE", 200))
+RATE = float(os.getenv("PRODUCER_RATE", 0))  # chunks/sec across all files, 0 = unlimited
+PARALLEL = int(os.getenv("PRODUCER_PARALLEL", 4))  # files ingested at once in directory/glob mode
+
+# Bounded-lag mode: hold back while the lane's work streams are this far behind (0 = off).
+# MAX_LAG needs Redis >= 7 (XINFO GROUPS "lag"); MAX_WAIT works on any version.
+MAX_LAG = int(os.getenv("PRODUCER_MAX_LAG", 0))  # entries not yet delivered
+MAX_WAIT = float(os.getenv("PRODUCER_MAX_WAIT", 0))  # seconds the oldest undelivered entry has waited
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[Paragraph]:
+    """
+    Yield the non-empty paragraphs of a .docx (table cells included) one at a time.
+
+    Parses word/document.xml incrementally instead of building the whole
+    python-docx object model, so memory stays flat for large documents.
+    Offsets are into the document text with paragraphs joined by newlines;
+    Title/Heading styles mark headings.
+    """
+    offset = 0
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        for _, elem in ET.iterparse(xml, events=("end",)):
+            if elem.tag != f"{WORD_NS}p":
+                continue
+            text = "".join(node.text or "" for node in elem.iter(f"{WORD_NS}t"))
+            style = elem.find(f"{WORD_NS}pPr/{WORD_NS}pStyle")
+            style = style.get(f"{WORD_NS}val", "") if style is not None else ""
+            elem.clear()
+            if text.strip():
+                yield Paragraph(text, offset, style == "Title" or style.startswith("Heading"))
+            offset += len(text) + 1
+
+class RateLimiter:
+    """
+    Paces callers to `rate` chunks/sec in total (thread-safe); rate <= 0 disables it.
+    With `admission`, callers are also held while `lane` is backed up (bounded lag).
+    """
+
+    def __init__(self, rate: float = 0, admission: AdmissionController = None, lane: str = None):
+        self.rate = rate
+        self.admission = admission
+        self.lane = lane or DEFAULT_LANE
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int = 1):
+        if self.admission is not None:
+            self.admission.wait(self.lane)
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+def bounded_lag(max_lag: int = None, max_wait: float = None):
+    """Admission limits for a bounded-lag producer (None when both are off)."""
+    max_lag = MAX_LAG if max_lag is None else max_lag
+    max_wait = MAX_WAIT if max_wait is None else max_wait
+    if not (max_lag or max_wait):
+        return None
+    return AdmissionController(max_lag=max_lag, max_pending=0, max_wait=max_wait)
+
+def specialty_fields(specialties=None):
+    """Stream fields opting a document into a subset of specialties (none = all of them)."""
+    return {"specialties": ",".join(specialties)} if specialties else {}
+
+def priority_fields(priority=None, tenant=None):
+    """Stream fields picking the priority lane (default: the lowest) and the fair-queuing tenant (default: doc_id)."""
+    fields = {"priority": priority or DEFAULT_LANE}
+    if tenant:
+        fields["tenant"] = tenant
+    return fields
+
+def send_chunks(r, doc_id: str, chunks: Iterable[Tuple[str, Chunk]], batch_size: int = None, limiter: RateLimiter = None,
+                fields=None, claim_check: bool = None) -> int:
+    """XADD (chunk_id, chunk) pairs to the tasks stream in pipelined batches. Returns the number sent."""
+    batch_size = batch_size or BATCH_SIZE
+    fields = fields or {}
+    stream = stream_for(STREAM_DOC_TASKS, doc_id, fields.get("priority"), fields.get("tenant"))
+    claim_check = CLAIM_CHECK if claim_check is None else claim_check
+    limiter = limiter or RateLimiter()
+    trace = new_trace()  # One trace per upload, carried through every stage
+    sent = 0
+    batch = []
+
+    def flush():
+        limiter.acquire(len(batch))
+        pipe = r.pipeline(transaction=False)
+        for chunk_id, chunk in batch:
+            payload = {
+                "doc_id": doc_id,
+                "chunk_id": chunk_id,
+                "text": chunk.text,
+                "language": "en",
+                "timestamp": time.time(),
+                **trace,
+                **chunk.fields(),
+                **fields
+            }
+            if claim_check:
+                # Body stored once; the tasks and specialist streams only carry text_ref
+                payload = check_in(pipe, payload)
+            pipe.xadd(stream, encode(payload), **xadd_kwargs(stream))
+        pipe.execute()
+        batch.clear()
+
+    for chunk in chunks:
+        batch.append(chunk)
+        sent += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return sent
+
+def ingest_chunks(r, doc_id, chunks, batch_size=None, limiter=None, fields=None):
+    """
+    Register a (re-)uploaded document and enqueue only the chunks that changed
+    since its previous revision. Returns the RevisionPlan.
+    """
+    plan = plan_revision(load_chunk_index(r, doc_id), list(chunks))
+
+    # Tell the aggregator how many chunks to expect before sending any of them
+    pipe = r.pipeline()
+    register_document(pipe, doc_id, plan.index, plan.retracted, fresh=plan.fresh, pending=bool(plan.changed))
+    pipe.execute()
+
+    send_chunks(r, doc_id, plan.changed, batch_size, limiter, fields)
+    return plan
+
+def stream_document(r, doc_id: str, paragraphs: Iterable[Paragraph], batch_size: int = None, limiter: RateLimiter = None, fields=None) -> int:
+    """
+    Chunk and enqueue a new document while its paragraphs are still being read.
+
+    The document is opened with an unknown size and sealed with the final chunk
+    index once the last batch is sent. Re-uploads need the full chunk list to
+    diff against, so they go through `ingest_chunks`. Returns the chunks sent.
+    """
+    chunks = chunk_paragraphs(paragraphs)
+    if load_chunk_index(r, doc_id):
+        return len(ingest_chunks(r, doc_id, chunks, batch_size, limiter, fields).changed)
+
+    pipe = r.pipeline()
+    register_document(pipe, doc_id, None)
+    pipe.execute()
+
+    index: List[tuple] = []
+
+    def numbered():
+        for chunk in chunks:
+            chunk_id = new_chunk_id()
+            index.append((chunk_id, content_hash(chunk.text), chunk.start, chunk.end))
+            yield chunk_id, chunk
+
+    sent = send_chunks(r, doc_id, numbered(), batch_size, limiter, fields)
+
+    pipe = r.pipeline()
+    seal_document(pipe, doc_id, index)
+    pipe.execute()
+    DocumentStore(r).close_if_complete(doc_id)
+    return sent
+
+def report(chunks: int, files: int, elapsed: float):
+    rate = chunks / elapsed if elapsed > 0 else float("inf")
+    print(f"[Producer] {chunks} chunks from {files} file(s) in {elapsed:.2f}s ({rate:.0f} chunks/s)")
+
+def run_producer(doc_id, paragraphs=None, file_path=None, batch_size=None, rate=None, specialties=None,
+                 priority=None, tenant=None, max_lag=None, max_wait=None):
     r = RedisClient.get_instance()
-    
-    texts = []
+    fields = {**specialty_fields(specialties), **priority_fields(priority, tenant)}
+    limiter = RateLimiter(RATE if rate is None else rate, bounded_lag(max_lag, max_wait), fields["priority"])
+    started = time.perf_counter()
+
     if file_path and os.path.exists(file_path):
-        print(f"Reading from file: {file_path}")
-        doc = Document(file_path)
-        texts = [p.text for p in doc.paragraphs if p.text.strip()]
+        print(f"Streaming from file: {file_path}")
+        sent = stream_document(r, doc_id, iter_docx_paragraphs(file_path), batch_size, limiter, fields)
     else:
         print(f"Uploading document {doc_id} with {paragraphs} simulated chunks...")
         sample_texts = [
@@ -23,30 +209,85 @@ def run_producer(doc_id, paragraphs=None, file_path=None):
         ]
         num_to_gen = paragraphs if paragraphs else 3
         texts = [sample_texts[i % len(sample_texts)] for i in range(num_to_gen)]
-    
-    for i, text in enumerate(texts):
-        chunk_id = f"p-{shortuuid.uuid()}"
-        
-        payload = {
-            "doc_id": doc_id,
-            "chunk_id": chunk_id,
-            "text": text,
-            "language": "en",
-            "timestamp": time.time()
-        }
-        
-        msg_id = r.xadd(STREAM_DOC_TASKS, payload)
-        print(f"[Producer] sent chunk {chunk_id} -> {msg_id}")
-        time.sleep(0.5)
 
+        chunks = chunk_paragraphs(paragraphs_from_text("\n".join(texts)))
+        plan = ingest_chunks(r, doc_id, chunks, batch_size, limiter, fields)
+        sent = len(plan.changed)
+        if not plan.fresh:
+            print(f"Revision of {doc_id}: {len(plan.changed)} changed, {len(plan.unchanged)} unchanged, "
+                  f"{len(plan.retracted)} retracted chunks")
+
+    report(sent, 1, time.perf_counter() - started)
     print("Document upload complete.")
 
+def expand_paths(pattern: str) -> List[str]:
+    """A directory means every .docx in it; anything else is a glob pattern."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.docx")
+    return sorted(path for path in glob.glob(pattern, recursive=True) if path.endswith(".docx"))
+
+def bulk_doc_ids(paths: List[str], doc_prefix: str = "doc-") -> Dict[str, str]:
+    """
+    path -> document ID: `<doc_prefix>` and the path relative to the files' common directory,
+    without the extension and with "." between directories ("a/notes.docx" -> "doc-a.notes").
+    """
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    ids, owners = {}, {}
+    for path in paths:
+        relative = os.path.splitext(os.path.relpath(os.path.abspath(path), base))[0]
+        doc_id = doc_prefix + ".".join(relative.split(os.sep))
+        if doc_id in owners:
+            raise ValueError(f"{owners[doc_id]} and {path} would both be document {doc_id}")
+        ids[path] = owners[doc_id] = doc_id
+    return ids
+
+def run_bulk_producer(pattern, doc_prefix="doc-", parallel=None, batch_size=None, rate=None, specialties=None,
+                      priority=None, tenant=None, max_lag=None, max_wait=None):
+    """Ingest many .docx files in parallel; each file becomes its own document (see bulk_doc_ids)."""
+    r = RedisClient.get_instance()
+    paths = expand_paths(pattern)
+    if not paths:
+        print(f"No .docx files match {pattern}")
+        return
+    doc_ids = bulk_doc_ids(paths, doc_prefix)
+
+    fields = {**specialty_fields(specialties), **priority_fields(priority, tenant)}
+    limiter = RateLimiter(RATE if rate is None else rate, bounded_lag(max_lag, max_wait), fields["priority"])
+    print(f"Ingesting {len(paths)} files from {pattern} ({parallel or PARALLEL} in parallel)...")
+
+    def ingest(path):
+        doc_id = doc_ids[path]
+        sent = stream_document(r, doc_id, iter_docx_paragraphs(path), batch_size, limiter, fields)
+        print(f"[Producer] {path} -> {doc_id}: {sent} chunks")
+        return sent
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel or PARALLEL) as pool:
+        total = sum(pool.map(ingest, paths))
+    report(total, len(paths), time.perf_counter() - started)
+
 @click.command()
 @click.option("--doc_id", default="doc-test-1", help="Document ID")
 @click.option("--paragraphs", default=None, type=int, help="Number of paragraphs to simulate (if no file)")
 @click.option("--file", default=None, help="Path to .docx file")
-def produce_document(doc_id, paragraphs, file):
-    run_producer(doc_id, paragraphs, file)
+@click.option("--glob", "pattern", default=None, help="Directory or glob of .docx files to ingest in bulk")
+@click.option("--parallel", default=None, type=int, help="Files ingested at once with --glob")
+@click.option("--batch-size", default=None, type=int, help="Chunks per pipelined XADD batch")
+@click.option("--rate", default=None, type=float, help="Max chunks/sec (0 = unlimited)")
+@click.option("--specialty", "specialties", multiple=True, type=click.Choice([t.value for t in SuggestionType]),
+              help="Only request these reviews (repeatable; default all)")
+@click.option("--priority", default=None, type=click.Choice(LANE_NAMES),
+              help=f"Priority lane (default {DEFAULT_LANE})")
+@click.option("--tenant", default=None, help="Tenant for fair queuing (default: each document on its own)")
+@click.option("--max-lag", default=None, type=int, help="Pause while the lane has more undelivered entries (Redis >= 7)")
+@click.option("--max-wait", default=None, type=float, help="Pause while the lane's oldest undelivered entry is older (s)")
+def produce_document(doc_id, paragraphs, file, pattern, parallel, batch_size, rate, specialties, priority, tenant,
+                     max_lag, max_wait):
+    if pattern:
+        run_bulk_producer(pattern, parallel=parallel, batch_size=batch_size, rate=rate, specialties=specialties,
+                          priority=priority, tenant=tenant, max_lag=max_lag, max_wait=max_wait)
+    else:
+        run_producer(doc_id, paragraphs, file, batch_size, rate, specialties, priority, tenant, max_lag, max_wait)
 
 if __name__ == "__main__":
     produce_document()
@@ -1,92 +1,530 @@
+import os
+import sys
+import json
 import click
+import contextlib
 import multiprocessing
 import time
+import redis
+import threading
 from src.agents.coordinator import CoordinatorAgent
 from src.agents.specialists import (
     create_grammar_agent, 
     create_clarity_agent, 
     create_tone_agent, 
-    create_structure_agent
+    create_structure_agent,
+    create_async_specialist_agent,
+    create_batched_specialist_agent,
+    SPECIALTIES,
+    MODEL_BATCH_SIZE,
 )
 from src.agents.aggregator import AggregatorAgent
+from src.agents.recovery import RECOVERY_STATS_KEY, dead_letter_stream
+from src.core.cache import SuggestionCache
+from src.core.retention import StreamTrimmer, MESH_STREAMS, STREAM_STATS_KEY, policy
+from src.core.redis_client import (
+    RedisClient, STREAM_DOC_TASKS, GROUP_COORDINATOR, STREAM_PARTITIONS, LANE_NAMES, DEFAULT_LANE, DIRECT_TOPOLOGY, MESH_TOPOLOGY,
+    physical_streams, id_key,
+)
+from src.agents.lanes import lane_report
+from src.core.autoscaling import LagExporter
+from src.core.tracing import serve_metrics, doc_timings, PHASES, METRICS_PORT
+from src.core.transport import TRANSPORTS, use_transport
+from src.core import transport as mesh_transport
 from src.ingestion.producer import produce_document as producer_cmd
 
-def run_coordinator():
-    CoordinatorAgent().run()
+# Specialist options the async runtime understands (the rest are batch / worker-pool flags)
+ASYNC_AGENT_KWARGS = ("name_suffix", "claim_check")
+
+AGENT_TYPES = ["coordinator", "grammar", "clarity", "tone", "structure", "aggregator"]
+
+SPECIALIST_FACTORIES = {
+    "grammar": create_grammar_agent,
+    "clarity": create_clarity_agent,
+    "tone": create_tone_agent,
+    "structure": create_structure_agent,
+}
+
+def with_worker_factory(factory, agent_kwargs):
+    """Process pools rebuild the agent inside each worker process, so they need a picklable factory."""
+    if agent_kwargs.get("pool") == "process":
+        agent_kwargs = {**agent_kwargs, "worker_factory": factory}
+    return agent_kwargs
+
+def run_coordinator(metrics_port=None, **agent_kwargs):
+    if DIRECT_TOPOLOGY:
+        print("[coordinator] MESH_TOPOLOGY=direct: the specialists read the tasks stream themselves, nothing to do")
+        return
+    serve_metrics(metrics_port)
+    CoordinatorAgent(**with_worker_factory(CoordinatorAgent, agent_kwargs)).run()
+
+def build_specialist(type_, use_async=False, concurrency=None, model_batch=None, model_wait_ms=None, **agent_kwargs):
+    model_batch = MODEL_BATCH_SIZE if model_batch is None else model_batch
+    if use_async:
+        # The async runtime has its own concurrency model; batch and worker flags don't apply
+        applicable = {k: v for k, v in agent_kwargs.items() if k in ASYNC_AGENT_KWARGS}
+        return create_async_specialist_agent(type_, concurrency=concurrency, **applicable)
+    if model_batch > 0:
+        return create_batched_specialist_agent(type_, max_batch=model_batch, max_wait_ms=model_wait_ms, **agent_kwargs)
+    factory = SPECIALIST_FACTORIES[type_]
+    return factory(**with_worker_factory(factory, agent_kwargs))
+
+def run_specialist(type_, use_async=False, concurrency=None, metrics_port=None, model_batch=None, model_wait_ms=None,
+                   **agent_kwargs):
+    serve_metrics(metrics_port)
+    build_specialist(type_, use_async, concurrency, model_batch, model_wait_ms, **agent_kwargs).run()
+
+def run_aggregator(metrics_port=None, **agent_kwargs):
+    serve_metrics(metrics_port)
+    AggregatorAgent(**with_worker_factory(AggregatorAgent, agent_kwargs)).run()
+
+def require_shared_transport():
+    """Agents in separate processes can only meet on Redis."""
+    if mesh_transport.MESH_TRANSPORT == "local":
+        raise click.UsageError("MESH_TRANSPORT=local only works with start-all, where all agents share one process")
+
+def mesh_types():
+    """The agent types the configured topology runs (the direct topology has no coordinator)."""
+    return [type_ for type_ in AGENT_TYPES if not (DIRECT_TOPOLOGY and type_ == "coordinator")]
+
+def build_agent(type_, replica=1, model_batch=None, model_wait_ms=None, **agent_kwargs):
+    """One replica of an agent type, its consumer name numbered after the replica."""
+    if type_ == "coordinator":
+        return CoordinatorAgent(consumer_name=f"coordinator-{replica}", **with_worker_factory(CoordinatorAgent, agent_kwargs))
+    if type_ == "aggregator":
+        return AggregatorAgent(consumer_name=f"aggregator-{replica}", **with_worker_factory(AggregatorAgent, agent_kwargs))
+    return build_specialist(type_, model_batch=model_batch, model_wait_ms=model_wait_ms, name_suffix=str(replica),
+                            **agent_kwargs)
+
+def _run_quiet(type_, replica, kwargs):
+    """Process target of bench replicas: the agent's per-message logging is discarded."""
+    sys.stdout = open(os.devnull, "w")
+    build_agent(type_, replica, **kwargs).run()
+
+@contextlib.contextmanager
+def mesh_agents(replicas, agent_kwargs, transport="redis", model_batch=None, model_wait_ms=None):
+    """Run `replicas[type]` replicas (default 1) of every agent type for the duration of the block."""
+    plan = [(type_, i) for type_ in mesh_types() for i in range(1, replicas.get(type_, 1) + 1)]
+    batch = {"model_batch": model_batch, "model_wait_ms": model_wait_ms}
+    if transport == "local":
+        use_transport("local")
+        agents = [build_agent(type_, i, **batch, **agent_kwargs(type_)) for type_, i in plan]
+        threads = [threading.Thread(target=agent.run, daemon=True) for agent in agents]
+        for thread in threads:
+            thread.start()
+        try:
+            yield
+        finally:
+            for agent in agents:
+                agent.stop()
+            for thread in threads:
+                thread.join(timeout=5)
+    else:
+        processes = [
+            multiprocessing.Process(target=_run_quiet, args=(type_, i, {**batch, **agent_kwargs(type_)}))
+            for type_, i in plan
+        ]
+        for p in processes:
+            p.start()
+        try:
+            yield
+        finally:
+            for p in processes:
+                p.terminate()
+            for p in processes:
+                p.join()
+
+def start_local(agent_kwargs, model_batch=None, model_wait_ms=None):
+    """Every agent as a thread of this process, the specialist hops (LOCAL_STREAMS) on the local transport."""
+    use_transport("local")
+    serve_metrics()  # One process: a single /metrics port
+    agents = [build_agent(type_, 1, model_batch, model_wait_ms, **agent_kwargs(type_)) for type_ in mesh_types()]
+    agents.append(StreamTrimmer(retained_streams()))
+
+    threads = [threading.Thread(target=agent.run, daemon=True) for agent in agents]
+    for thread in threads:
+        thread.start()
+    print(f"All agents started in one process ({len(threads)} threads, local transport). Press Ctrl+C to stop.")
+    print("In-process: specialist inputs and suggestion streams. On Redis: tasks, summaries, dead letters, "
+          "document state, cache, payloads, traces and lane stats.")
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("Stopping all agents...")
+        for agent in agents:
+            agent.stop()
+        for thread in threads:
+            thread.join(timeout=5)
+
+def consumed_streams():
+    """Every physical stream some agent consumes: tasks, specialist inputs, suggestion streams."""
+    streams = [STREAM_DOC_TASKS]
+    for input_stream, output_stream, _ in SPECIALTIES.values():
+        streams += [input_stream, output_stream]
+    # In the direct topology the specialists' input is the tasks stream
+    return [physical for stream in dict.fromkeys(streams) for physical in physical_streams(stream)]
+
+def retained_streams():
+    """Streams under retention: the mesh streams plus their dead-letter streams."""
+    return MESH_STREAMS + [dead_letter_stream(stream) for stream in consumed_streams()]
+
+def run_trimmer(interval=None):
+    StreamTrimmer(retained_streams(), interval=interval).run()
+
+def redis_streams_triggers(streams, group, address, pending):
+    """One redis-streams trigger per physical stream; KEDA scales on the busiest."""
+    return "".join(f"""
+    - type: redis-streams
+      metadata:
+        address: {address}
+        stream: "{stream}"
+        consumerGroup: {group}
+        pendingEntriesCount: "{pending}\"""" for stream in streams)
+
+def prometheus_trigger(group, server):
+    """A Prometheus trigger on the exporter's desired consumers: one replica per consumer needed."""
+    return f"""
+    - type: prometheus
+      metadata:
+        serverAddress: {server}
+        query: max(mesh_group_desired_consumers{{group="{group}"}})
+        threshold: "1"
+        activationThreshold: "0\""""
+
+def keda_scaled_object(deployment, triggers, max_replicas):
+    """A KEDA ScaledObject for `deployment` with the given triggers."""
+    return f"""apiVersion: keda.sh/v1alpha1
+kind: ScaledObject
+metadata:
+  name: {deployment}-scaler
+  namespace: agentic-mesh
+spec:
+  scaleTargetRef:
+    name: {deployment}
+  minReplicaCount: 0
+  maxReplicaCount: {max_replicas}
+  cooldownPeriod: 30
+  triggers:{triggers}
+"""
+
+def agent_options(f):
+    """Batch-processing flags shared by every agent command."""
+    f = click.option("--transactional/--no-transactional", default=None,
+                     help="Flush each batch in MULTI/EXEC so outputs and ACKs commit together")(f)
+    f = click.option("--flush-interval", default=None, type=float,
+                     help="Max seconds a partial batch waits before being flushed")(f)
+    f = click.option("--batch-size", default=None, type=int,
+                     help="Messages read per XREADGROUP / ACKs per flush")(f)
+    f = click.option("--batched/--no-batched", default=None,
+                     help="Buffer XADD/XACK per read batch and flush them in one pipeline")(f)
+    return f
+
+def worker_options(f):
+    """Worker-pool flags for single-agent commands."""
+    f = click.option("--pool", default=None, type=click.Choice(["thread", "process"]),
+                     help="Pool type used when --workers > 0")(f)
+    f = click.option("--workers", default=None, type=int,
+                     help="Size of the worker pool messages are handed to (0 = process inline)")(f)
+    return f
 
-def run_specialist(type_):
-    if type_ == "grammar":
-        create_grammar_agent().run()
-    elif type_ == "clarity":
-        create_clarity_agent().run()
-    elif type_ == "tone":
-        create_tone_agent().run()
-    elif type_ == "structure":
-        create_structure_agent().run()
+def model_batch_options(f):
+    """Micro-batching flags for specialist commands."""
+    f = click.option("--model-wait-ms", default=None, type=float,
+                     help="Max ms the first chunk of a model batch waits for more (default MODEL_BATCH_WAIT_MS)")(f)
+    f = click.option("--model-batch", default=None, type=int,
+                     help="Chunks per model call (0 = one per call; default MODEL_BATCH_SIZE)")(f)
+    return f
 
-def run_aggregator():
-    AggregatorAgent().run()
+def collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers=None, pool=None):
+    """Keep only the flags that were given so BaseAgent falls back to its env defaults."""
+    kwargs = {
+        "batched": batched,
+        "batch_size": batch_size,
+        "flush_interval": flush_interval,
+        "transactional": transactional,
+        "workers": workers,
+        "pool": pool,
+    }
+    return {k: v for k, v in kwargs.items() if v is not None}
+
+def parse_workers(values):
+    """Parse repeated --workers (or --replicas) values: 'N' for every agent type, or 'TYPE=N' for one type."""
+    per_type = {}
+    for value in values:
+        type_, sep, count = value.rpartition("=")
+        if sep and type_ not in AGENT_TYPES:
+            raise click.BadParameter(f"unknown agent type '{type_}' (expected one of {AGENT_TYPES})")
+        try:
+            count = int(count)
+        except ValueError:
+            raise click.BadParameter(f"'{value}' is not N or TYPE=N")
+        for t in ([type_] if sep else AGENT_TYPES):
+            per_type[t] = count
+    return per_type
 
 @click.group()
 def cli():
     pass
 
 @cli.command()
-def coordinator():
+@agent_options
+@worker_options
+def coordinator(batched, batch_size, flush_interval, transactional, workers, pool):
     """Run the Coordinator Agent"""
-    agent = CoordinatorAgent()
-    agent.run()
+    require_shared_transport()
+    run_coordinator(**collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers, pool))
 
 @cli.command()
 @click.option("--type", required=True, type=click.Choice(["grammar", "clarity", "tone", "structure"]), help="Specialist type")
-def specialist(type):
+@click.option("--async", "use_async", is_flag=True, help="Use the asyncio runtime (many chunks in flight per process)")
+@click.option("--concurrency", default=None, type=int, help="Max in-flight chunks for --async (default: AGENT_CONCURRENCY)")
+@model_batch_options
+@agent_options
+@worker_options
+def specialist(type, use_async, concurrency, model_batch, model_wait_ms, batched, batch_size, flush_interval, transactional,
+               workers, pool):
     """Run a Specialist Agent"""
-    if type == "grammar":
-        agent = create_grammar_agent()
-    elif type == "clarity":
-        agent = create_clarity_agent()
-    elif type == "tone":
-        agent = create_tone_agent()
-    elif type == "structure":
-        agent = create_structure_agent()
-    
-    agent.run()
+    require_shared_transport()
+    agent_kwargs = collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers, pool)
+    run_specialist(type, use_async, concurrency, model_batch=model_batch, model_wait_ms=model_wait_ms, **agent_kwargs)
 
 @cli.command()
-def aggregator():
+@agent_options
+@worker_options
+def aggregator(batched, batch_size, flush_interval, transactional, workers, pool):
     """Run the Aggregator Agent"""
-    agent = AggregatorAgent()
-    agent.run()
+    require_shared_transport()
+    run_aggregator(**collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers, pool))
+
+@cli.command()
+def recovery_stats():
+    """Show PEL recovery counters and dead-letter stream sizes"""
+    r = RedisClient.get_instance()
+    for field, value in sorted(r.hgetall(RECOVERY_STATS_KEY).items()):
+        print(f"{field:<40}{value:>10}")
+
+    for stream in consumed_streams():
+        dlq = dead_letter_stream(stream)
+        print(f"{dlq:<40}{r.xlen(dlq):>10}")
+
+@cli.command()
+@click.option("--interval", default=None, type=float, help="Seconds between passes (default TRIM_INTERVAL)")
+@click.option("--once", is_flag=True, help="Run a single pass and exit")
+def trimmer(interval, once):
+    """Trim streams to their retention policy (never past unacknowledged entries)"""
+    if once:
+        for stream, count in StreamTrimmer(retained_streams()).run_once().items():
+            print(f"{stream:<40}{count:>10}")
+    else:
+        run_trimmer(interval)
+
+@cli.command()
+@click.option("--apply", is_flag=True, help="Create the new groups and destroy the retired ones (default: dry run)")
+def switch_topology(apply):
+    """Hand the tasks stream over to the groups of MESH_TOPOLOGY (run with the old agents stopped and drained)"""
+    specialist_groups = [group for _, _, group in SPECIALTIES.values()]
+    active, retired = (specialist_groups, [GROUP_COORDINATOR]) if DIRECT_TOPOLOGY else ([GROUP_COORDINATOR], specialist_groups)
+    r = RedisClient.get_instance()
+    print(f"MESH_TOPOLOGY={MESH_TOPOLOGY}: {STREAM_DOC_TASKS} is read by {', '.join(active)}")
+    for stream in physical_streams(STREAM_DOC_TASKS):
+        try:
+            groups = {g["name"]: g for g in r.xinfo_groups(stream)}
+        except redis.exceptions.ResponseError:
+            continue  # Stream not created yet: the agents create their groups from the start
+        old = [groups[name] for name in retired if name in groups]
+        if not old:
+            continue
+        # New groups start where the retired ones stopped, instead of replaying the retained entries
+        start = min((g["last-delivered-id"] for g in old), key=id_key)
+        pending = sum(g["pending"] for g in old)
+        for name in active:
+            if name not in groups:
+                print(f"{stream}: create {name} at {start}")
+                if apply:
+                    r.xgroup_create(stream, name, id=start)
+        for g in old:
+            # A retired group would hold back trimming of the stream forever
+            print(f"{stream}: destroy {g['name']}" + (f" ({g['pending']} entries still pending!)" if g["pending"] else ""))
+            if apply:
+                r.xgroup_destroy(stream, g["name"])
+        if pending and not apply:
+            print(f"{stream}: drain the pending entries first, they are not handed over")
+    if not apply:
+        print("Dry run; pass --apply to make the changes")
+
+@cli.command()
+def stream_stats():
+    """Show length, memory and retention policy per stream (as last published by the trimmer)"""
+    stats = RedisClient.get_instance().hgetall(STREAM_STATS_KEY)
+    print(f"{'stream':<40}{'length':>10}{'memory KB':>12}{'trimmed':>10}{'maxlen':>10}{'max age':>10}")
+    for stream in retained_streams():
+        p = policy(stream)
+        print(f"{stream:<40}{stats.get(f'{stream}:length', '-'):>10}"
+              f"{int(stats.get(f'{stream}:memory_bytes', 0)) / 1024:>12.0f}"
+              f"{stats.get(f'{stream}:trimmed', '0'):>10}{p.maxlen or '-':>10}{p.max_age or '-':>10}")
+
+@cli.command()
+@click.option("--address", default="redis.agentic-mesh.svc.cluster.local:6379", help="Redis address KEDA polls")
+@click.option("--pending", default=50, help="Pending entries per replica (per lane / fair queue / partition)")
+@click.option("--max-replicas", default=10, help="Replica cap (at most one replica per partition is busy)")
+@click.option("--scaler", default="redis-streams", type=click.Choice(["redis-streams", "prometheus"]),
+              help="Scale on pending entries, or on the lag exporter's desired consumers (latency SLO)")
+@click.option("--prometheus", default="http://prometheus.monitoring.svc.cluster.local:9090",
+              help="Prometheus scraping the lag exporter (--scaler prometheus)")
+def keda_scalers(address, pending, max_replicas, scaler, prometheus):
+    """Print KEDA ScaledObjects for the specialists, on pending entries or on the lag exporter's estimates"""
+    if STREAM_PARTITIONS > 1:
+        max_replicas = min(max_replicas, STREAM_PARTITIONS)
+    objects = []
+    for specialty, (input_stream, _, group) in SPECIALTIES.items():
+        if scaler == "prometheus":
+            triggers = prometheus_trigger(group, prometheus)
+        else:
+            # A trigger per lane, fair queue and partition
+            triggers = redis_streams_triggers(physical_streams(input_stream), group, address, pending)
+        objects.append(keda_scaled_object(f"{specialty}-agent", triggers, max_replicas))
+    flag = " --scaler prometheus" if scaler == "prometheus" else ""
+    print(f"# Generated by `python -m src.main keda-scalers{flag}` for STREAM_PARTITIONS={STREAM_PARTITIONS}")
+    print("---\n".join(objects), end="")
+
+@cli.command()
+@click.option("--port", default=None, type=int, help="/metrics port (default METRICS_PORT)")
+@click.option("--interval", default=None, type=float, help="Seconds between samples (default LAG_INTERVAL)")
+@click.option("--window", default=None, type=float, help="Seconds the rates are averaged over (default LAG_RATE_WINDOW)")
+@click.option("--slo", default=None, type=float, help="Target seconds from XADD to read (default LAG_SLO_SECONDS)")
+@click.option("--once", is_flag=True, help="Take two samples --interval apart, print the estimates and exit")
+def exporter(port, interval, window, slo, once):
+    """Export per-group lag, arrival / service rates, drain time and desired consumers for autoscaling"""
+    lag_exporter = LagExporter(consumed_streams(), interval=interval, window=window, slo=slo)
+    if not once:
+        serve_metrics(port)
+        lag_exporter.run()
+        return
+    lag_exporter.refresh()
+    time.sleep(lag_exporter.interval)
+    lag_exporter.refresh()
+    print(f"{'group':<20}{'stream':<24}{'lag':>8}{'pending':>9}{'consumers':>11}{'in/s':>9}{'out/s':>9}"
+          f"{'drain s':>10}{'desired':>9}")
+    for (stream, group), e in sorted(lag_exporter.report.items()):
+        print(f"{group:<20}{stream:<24}{e['lag']:>8}{e['pending']:>9}{e['consumers']:>11}{e['arrival_rate']:>9.1f}"
+              f"{e['service_rate']:>9.1f}{e['drain_s']:>10.0f}{e['desired_consumers']:>9}")
+
+@cli.command()
+def lane_stats():
+    """Show queue wait (XADD to read) per consumer group and priority lane"""
+    print(f"{'group':<20}{'lane':<14}{'entries':>10}{'avg ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for (group, lane), stats in lane_report(RedisClient.get_instance()).items():
+        print(f"{group:<20}{lane:<14}{stats['count']:>10}{stats['avg_ms']:>10.0f}"
+              f"{stats['p50_ms']:>10.0f}{stats['p95_ms']:>10.0f}{stats['p99_ms']:>10.0f}")
+
+@cli.command()
+@click.option("--doc-id", required=True, help="Document to report on")
+def trace(doc_id):
+    """Show queue / process / write time per stage (p50/p95/p99) for one document"""
+    report = doc_timings(RedisClient.get_instance(), doc_id)
+    if not report:
+        print(f"No timings for {doc_id} (unknown document, expired, or TRACING=false)")
+        return
+    stages = ["coordinator"] + list(SPECIALTIES) + ["aggregator"]
+    order = lambda key: (stages.index(key[0]) if key[0] in stages else len(stages), PHASES.index(key[1]))
+    print(f"{'stage':<14}{'phase':<12}{'entries':>10}{'avg ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for (stage, phase), stats in sorted(report.items(), key=lambda item: order(item[0])):
+        print(f"{stage:<14}{phase:<12}{stats['count']:>10}{stats['avg_ms']:>10.0f}"
+              f"{stats['p50_ms']:>10.0f}{stats['p95_ms']:>10.0f}{stats['p99_ms']:>10.0f}")
+
+@cli.command()
+def cache_stats():
+    """Show suggestion-cache hit/miss ratios per specialty"""
+    print(f"{'specialty':<12}{'hits':>10}{'misses':>10}{'hit ratio':>12}")
+    for specialty, entry in sorted(SuggestionCache().stats().items()):
+        print(f"{specialty:<12}{entry['hits']:>10}{entry['misses']:>10}{entry['hit_ratio']:>12.1%}")
 
 @cli.command()
 @click.option("--doc_id", default="doc-demo-1")
 @click.option("--paragraphs", default=3)
 @click.option("--file", default=None, help="Path to .docx file")
-def produce(doc_id, paragraphs, file):
-    """Produce a test document"""
-    from src.ingestion.producer import run_producer
-    run_producer(doc_id, paragraphs, file)
+@click.option("--glob", "pattern", default=None, help="Directory or glob of .docx files to ingest in bulk")
+@click.option("--doc-prefix", default="doc-", help="Document ID prefix for --glob (followed by the file path, see README)")
+@click.option("--parallel", default=None, type=int, help="Files ingested at once with --glob")
+@click.option("--batch-size", default=None, type=int, help="Chunks per pipelined XADD batch")
+@click.option("--rate", default=None, type=float, help="Max chunks/sec (0 = unlimited)")
+@click.option("--specialty", "specialties", multiple=True, type=click.Choice(list(SPECIALIST_FACTORIES)),
+              help="Only request these reviews (repeatable; default all)")
+@click.option("--priority", default=None, type=click.Choice(LANE_NAMES), help=f"Priority lane (default {DEFAULT_LANE})")
+@click.option("--tenant", default=None, help="Tenant for fair queuing (default: each document on its own)")
+@click.option("--max-lag", default=None, type=int, help="Pause while the lane has more undelivered entries (Redis >= 7)")
+@click.option("--max-wait", default=None, type=float, help="Pause while the lane's oldest undelivered entry is older (s)")
+def produce(doc_id, paragraphs, file, pattern, doc_prefix, parallel, batch_size, rate, specialties, priority, tenant,
+            max_lag, max_wait):
+    """Produce a test document (or a directory of them)"""
+    from src.ingestion.producer import run_producer, run_bulk_producer
+    if pattern:
+        run_bulk_producer(pattern, doc_prefix, parallel, batch_size, rate, specialties, priority, tenant, max_lag, max_wait)
+    else:
+        run_producer(doc_id, paragraphs, file, batch_size, rate, specialties, priority, tenant, max_lag, max_wait)
 
 @cli.command()
-def start_all():
+@click.option("--async-specialists", is_flag=True, help="Run specialists on the asyncio runtime")
+@click.option("--concurrency", default=None, type=int, help="Max in-flight chunks per async specialist")
+@click.option("--workers", "workers_spec", multiple=True,
+              help="Worker pool size: N for every agent, or TYPE=N (e.g. --workers grammar=4). Repeatable.")
+@click.option("--pool", default=None, type=click.Choice(["thread", "process"]), help="Pool type used by --workers")
+@click.option("--transport", default=None, type=click.Choice(TRANSPORTS),
+              help="Specialist input and suggestion streams on Redis (one process per agent) or local "
+                   "(agents as threads of one process; tasks, summaries and state stay on Redis)")
+@model_batch_options
+@agent_options
+def start_all(async_specialists, concurrency, workers_spec, pool, transport, model_batch, model_wait_ms, batched,
+              batch_size, flush_interval, transactional):
     """Run all agents in parallel (demo mode)"""
     processes = []
+    workers = parse_workers(workers_spec)
+
+    if (transport or mesh_transport.MESH_TRANSPORT) == "local":
+        if async_specialists:
+            raise click.UsageError("--async-specialists read Redis directly and can't use --transport local")
+        start_local(
+            lambda type_: collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers.get(type_), pool),
+            model_batch, model_wait_ms,
+        )
+        return
+
+    def agent_kwargs(type_):
+        kwargs = collect_agent_kwargs(batched, batch_size, flush_interval, transactional, workers.get(type_), pool)
+        if METRICS_PORT:
+            # One /metrics port per process: METRICS_PORT + index in AGENT_TYPES
+            kwargs["metrics_port"] = METRICS_PORT + AGENT_TYPES.index(type_)
+        return kwargs
     
-    # 1 Coordinator
-    p_coord = multiprocessing.Process(target=run_coordinator)
-    p_coord.start()
-    processes.append(p_coord)
+    # 1 Coordinator (the direct topology has none)
+    if DIRECT_TOPOLOGY:
+        print(f"MESH_TOPOLOGY={MESH_TOPOLOGY}: specialists read {STREAM_DOC_TASKS} directly, no coordinator")
+    else:
+        p_coord = multiprocessing.Process(target=run_coordinator, kwargs=agent_kwargs("coordinator"))
+        p_coord.start()
+        processes.append(p_coord)
     
     # 4 Specialists
     for type_ in ["grammar", "clarity", "tone", "structure"]:
-        p = multiprocessing.Process(target=run_specialist, args=(type_,))
+        p = multiprocessing.Process(
+            target=run_specialist,
+            args=(type_, async_specialists, concurrency),
+            kwargs={**agent_kwargs(type_), "model_batch": model_batch, "model_wait_ms": model_wait_ms}
+        )
         p.start()
         processes.append(p)
         
     # 1 Aggregator
-    p_agg = multiprocessing.Process(target=run_aggregator)
+    p_agg = multiprocessing.Process(target=run_aggregator, kwargs=agent_kwargs("aggregator"))
     p_agg.start()
     processes.append(p_agg)
+
+    # Stream retention
+    p_trim = multiprocessing.Process(target=run_trimmer)
+    p_trim.start()
+    processes.append(p_trim)
     
     print("All agents started. Press Ctrl+C to stop.")
     
@@ -99,5 +537,63 @@ def start_all():
         for p in processes:
             p.terminate()
 
+@cli.command()
+@click.option("--docs", default=20, help="Synthetic documents to send")
+@click.option("--paragraphs", default=20, help="Mean paragraphs per synthetic document")
+@click.option("--distribution", default="fixed", type=click.Choice(["fixed", "uniform", "exponential", "lognormal"]),
+              help="Distribution of synthetic document sizes")
+@click.option("--words", default=40, help="Mean words per paragraph")
+@click.option("--corpus", default=None, type=click.Path(exists=True), help="Replay a JSONL corpus instead (one {\"text\": ...} per line)")
+@click.option("--seed", default=1, help="Seed for document contents, sizes and arrivals")
+@click.option("--rate", default=0.0, help="Documents/sec, Poisson arrivals (0 = all at once)")
+@click.option("--via", default="producer", type=click.Choice(["producer", "api"]), help="Send through the producer code or POST /analyze")
+@click.option("--api-url", default="http://localhost:8000", help="API for --via api")
+@click.option("--replicas", "replicas_spec", multiple=True, help="Replicas: N for every agent, or TYPE=N. Repeatable.")
+@click.option("--transport", default=None, type=click.Choice(TRANSPORTS), help="Agents as processes on Redis, or threads on the local transport")
+@click.option("--external", is_flag=True, help="Don't start agents: measure the mesh that is already running")
+@click.option("--specialty", "specialties", multiple=True, type=click.Choice(list(SPECIALIST_FACTORIES)),
+              help="Only request these reviews (repeatable; default all)")
+@click.option("--priority", default=None, type=click.Choice(LANE_NAMES), help=f"Priority lane (default {DEFAULT_LANE})")
+@click.option("--warmup", default=2.0, help="Seconds for the agents to start before sending")
+@click.option("--timeout", default=300.0, help="Max seconds to wait for every summary")
+@click.option("--output", default=None, help="Write the JSON report here instead of stdout")
+@model_batch_options
+@agent_options
+def bench(docs, paragraphs, distribution, words, corpus, seed, rate, via, api_url, replicas_spec, transport, external,
+          specialties, priority, warmup, timeout, output, model_batch, model_wait_ms, batched, batch_size, flush_interval,
+          transactional):
+    """Load-test the mesh and report throughput, latency percentiles, Redis ops and memory as JSON"""
+    from src.bench import run_bench, synthetic_documents, corpus_documents, log
+    documents = corpus_documents(corpus) if corpus else synthetic_documents(docs, paragraphs, distribution, words, seed)
+    replicas = parse_workers(replicas_spec)
+    transport = transport or mesh_transport.MESH_TRANSPORT
+    if transport == "local" and external:
+        raise click.UsageError("--external measures agents in other processes; it can't use --transport local")
+
+    config = {
+        "documents": {"corpus": corpus} if corpus else
+                     {"docs": docs, "paragraphs": paragraphs, "distribution": distribution, "words": words},
+        "replicas": None if external else {type_: replicas.get(type_, 1) for type_ in mesh_types()},
+        "transport": transport,
+        "agent_flags": collect_agent_kwargs(batched, batch_size, flush_interval, transactional),
+        "model_batch": model_batch,
+    }
+    agents = contextlib.nullcontext() if external else mesh_agents(
+        replicas, lambda type_: collect_agent_kwargs(batched, batch_size, flush_interval, transactional),
+        transport, model_batch, model_wait_ms,
+    )
+    # In local mode the agents log from this process: keep their output off the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), agents:
+        time.sleep(warmup)
+        report = run_bench(documents, config, via, rate, api_url, specialties, priority, seed, timeout)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        log(f"Report written to {output}")
+    else:
+        click.echo(text)
+
 if __name__ == "__main__":
     cli()
@@ -1,112 +1,457 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.staticfiles import StaticFiles
 from sse_starlette.sse import EventSourceResponse
 import asyncio
-import redis.asyncio as aioredis
 import json
+import math
 import os
+import re
 import shortuuid
 import time
+from collections import OrderedDict, deque
 from src.core.redis_client import (
+    RedisClient, stream_for, physical_streams, logical_stream, tagged, LANE_NAMES, id_key,
     STREAM_DOC_TASKS, STREAM_REVIEW_SUMMARY, 
     STREAM_DOC_GRAMMAR, STREAM_DOC_CLARITY, STREAM_DOC_TONE, STREAM_DOC_STRUCTURE
 )
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set
+from src.core.models import Suggestion, SuggestionType
+from src.core.documents import (
+    register_document, chunks_key, meta_key, results_key,
+    document_etag, document_status, ordered_suggestions
+)
+from src.core.payloads import CLAIM_CHECK, check_in
+from src.core.codec import encode, decode_entries, decode_messages
+from src.core.retention import xadd_kwargs, id_at
+from src.core.admission import AdmissionController, ClientRateLimiter
+from src.core.tracing import new_trace, API_SECONDS, API_REJECTED, SSE_CLIENTS
+from src.agents.partitions import slot_groups, PARTITION_POLL_MS
+from src.ingestion.diffing import plan_revision
+from src.ingestion.chunking import chunk_paragraphs, paragraphs_from_text
 
 app = FastAPI()
 
-# Redis Clients
-redis_client = aioredis.from_url(
-    f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}",
-    encoding="utf-8", decode_responses=True
-)
+# Redis Clients (same factory and pools as the agents)
+redis_client = RedisClient.get_async_instance()
+# Blocking XREADs on the read pool; entries may be packed (binary) and are decoded with the codec
+stream_client = RedisClient.get_async_binary_instance()
+
+# Backpressure: cached backlog per lane, and a token bucket (in chunks) per client
+admission = AdmissionController()
+client_limits = ClientRateLimiter()
+
+# Live events (/stream): one shared reader per process fans out to every connected client
+SSE_STREAMS = [physical for stream in [
+    STREAM_DOC_TASKS,     # Coordinator Input
+    STREAM_DOC_GRAMMAR,   # Specialist Inputs
+    STREAM_DOC_CLARITY,
+    STREAM_DOC_TONE,
+    STREAM_DOC_STRUCTURE,
+    STREAM_REVIEW_SUMMARY # Final Output
+] for physical in physical_streams(stream)]
+SSE_READ_BATCH = int(os.getenv("SSE_READ_BATCH", 500))  # entries per stream and XREAD
+SSE_CLIENT_QUEUE = int(os.getenv("SSE_CLIENT_QUEUE", 1000))  # events buffered per client
+SSE_SLOW_CLIENT = os.getenv("SSE_SLOW_CLIENT", "coalesce")  # "coalesce" or "drop" once a client's buffer is full
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))  # seconds between keep-alive comments
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", 1000))  # entries per stream replayed on resume
+
+ENTRY_ID = re.compile(r"^\d+-\d+$")
+
+class MeshEvent(NamedTuple):
+    stream: str
+    id: str
+    doc_id: Optional[str]
+    source: str  # logical stream
+    sse: Dict[str, Any]  # encoded once, sent to every client as is
+
+def mesh_event(stream: str, msg_id: str, data: Dict[str, Any]) -> MeshEvent:
+    # Construct event for frontend
+    event_type = "unknown"
+    source = tagged(logical_stream(stream))
+    if source == STREAM_DOC_TASKS: event_type = "coordinator_job"
+    elif source in [STREAM_DOC_GRAMMAR, STREAM_DOC_CLARITY, STREAM_DOC_TONE, STREAM_DOC_STRUCTURE]: event_type = "specialist_job"
+    elif source == STREAM_REVIEW_SUMMARY: event_type = "aggregator_result"
+
+    sse = {
+        "id": msg_id,
+        "event": "message",
+        "data": json.dumps({
+            "type": event_type,
+            "stream": stream,
+            "id": msg_id,
+            "content": data
+        })
+    }
+    return MeshEvent(stream, msg_id, data.get("doc_id"), source, sse)
+
+class Subscriber:
+    """
+    One /stream client's buffer. When it is full the client is too slow: its further
+    events are coalesced to the latest one per document and stream, or it is dropped.
+    """
+
+    def __init__(self, doc_id: Optional[str] = None, maxsize: int = None):
+        self.doc_id = doc_id
+        self.maxsize = maxsize or SSE_CLIENT_QUEUE
+        self.events: Deque[MeshEvent] = deque()
+        self.coalesced: "OrderedDict[tuple, MeshEvent]" = OrderedDict()
+        self.dropped = False
+        self.wake = asyncio.Event()
+
+    def push(self, event: MeshEvent):
+        if self.dropped:
+            return
+        if len(self.events) < self.maxsize and not self.coalesced:
+            self.events.append(event)
+        elif SSE_SLOW_CLIENT == "drop":
+            self.dropped = True
+            self.events.clear()
+        else:
+            key = (event.doc_id, event.source)
+            self.coalesced.pop(key, None)
+            self.coalesced[key] = event
+            if len(self.coalesced) > self.maxsize:
+                self.coalesced.popitem(last=False)
+        self.wake.set()
+
+    async def next(self) -> Optional[MeshEvent]:
+        """The next event to send; None once the client has been dropped."""
+        while not self.events and not self.coalesced:
+            if self.dropped:
+                return None
+            self.wake.clear()
+            await self.wake.wait()
+        if self.events:
+            return self.events.popleft()
+        return self.coalesced.popitem(last=False)[1]
+
+class StreamBroadcaster:
+    """
+    A single background reader per server process: XREADs the mesh streams in large
+    batches and fans each event out to the subscribers of its document (and to those
+    without a filter). Started by the first subscriber, stopped when the last one leaves.
+    """
+
+    def __init__(self, streams: List[str]):
+        self.streams = streams
+        self.subscribers: Dict[Optional[str], Set[Subscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, doc_id: Optional[str] = None) -> Subscriber:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        subscriber = Subscriber(doc_id)
+        self.subscribers.setdefault(doc_id, set()).add(subscriber)
+        SSE_CLIENTS.inc()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.doc_id, set())
+        if subscriber in subscribers:
+            SSE_CLIENTS.dec()
+        subscribers.discard(subscriber)
+        if not subscribers:
+            self.subscribers.pop(subscriber.doc_id, None)
+        if not self.subscribers and self._task is not None:
+            # Nobody is listening: stop reading until the next subscriber
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, event: MeshEvent):
+        for subscriber in self.subscribers.get(None, ()):
+            subscriber.push(event)
+        if event.doc_id is not None:
+            for subscriber in self.subscribers.get(event.doc_id, ()):
+                subscriber.push(event)
+
+    async def _run(self):
+        # From now on; explicit IDs rather than "$" since cluster slots are polled separately
+        now = id_at(time.time())
+        positions = {stream: now for stream in self.streams}
+        # A cluster can't XREAD across slots: poll each slot's streams without blocking instead
+        groups = slot_groups(self.streams)
+        block = 5000 if len(groups) == 1 else None
+
+        while True:
+            try:
+                messages = []
+                for group in groups:
+                    messages += decode_messages(await stream_client.xread(
+                        {s: positions[s] for s in group}, count=SSE_READ_BATCH, block=block
+                    ))
+
+                events = []
+                for stream, entries in messages:
+                    positions[stream] = entries[-1][0]
+                    events += [mesh_event(stream, msg_id, data) for msg_id, data in entries]
+                # Across streams in ID order, so a client's Last-Event-ID is a safe resume point
+                events.sort(key=lambda e: id_key(e.id))
+                for event in events:
+                    self.publish(event)
+
+                if block is None and not events:
+                    await asyncio.sleep(PARTITION_POLL_MS / 1000)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"SSE Error: {e}")
+                await asyncio.sleep(1)
+
+    async def replay(self, last_event_id: str, doc_id: Optional[str] = None) -> List[MeshEvent]:
+        """Entries after `last_event_id` on every stream (up to SSE_REPLAY_LIMIT each), in ID order."""
+        pipe = stream_client.pipeline(transaction=False)
+        for stream in self.streams:
+            pipe.xrange(stream, min=f"({last_event_id}", count=SSE_REPLAY_LIMIT)
+        events = [
+            mesh_event(stream, msg_id, data)
+            for stream, entries in zip(self.streams, await pipe.execute())
+            for msg_id, data in decode_entries(entries)
+        ]
+        return sorted((e for e in events if doc_id is None or e.doc_id == doc_id), key=lambda e: id_key(e.id))
+
+broadcaster = StreamBroadcaster(SSE_STREAMS)
+
+def too_many_requests(detail: str, retry_after: float):
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this API process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/analyze")
-async def analyze_document(text: str):
+async def analyze_document(request: Request, text: str, doc_id: Optional[str] = None, specialties: Optional[str] = None,
+                           priority: Optional[str] = None, tenant: Optional[str] = None, language: str = "en"):
     """
     Simulate uploading a document for analysis.
-    Chunk text (dummy chunking) and push to TASKS stream.
+    Chunk text (one line per paragraph, `#` lines are headings) and push to TASKS stream.
+    Re-uploading with an existing doc_id only sends the chunks that changed.
+    `specialties` (comma-separated, e.g. "grammar,tone") limits which reviews run.
+    `priority` picks the lane (default: the highest, i.e. interactive); `tenant` groups
+    documents for fair queuing (default: each document on its own). `language` is the
+    document's language code, used for routing and caching (default "en").
+    Answers 429 with Retry-After when the client is over its rate or the lane is backed up.
     """
-    doc_id = f"doc-{shortuuid.uuid()}"
+    with API_SECONDS.labels("analyze").time():
+        return await _analyze(request, text, doc_id, specialties, priority, tenant, language)
+
+async def _analyze(request: Request, text: str, doc_id: Optional[str], specialties: Optional[str],
+                   priority: Optional[str], tenant: Optional[str], language: str = "en"):
+    doc_id = doc_id or f"doc-{shortuuid.uuid()}"
+
+    priority = priority or LANE_NAMES[0]
+    if priority not in LANE_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority '{priority}' (expected one of {LANE_NAMES})")
+
+    requested = [s.strip() for s in specialties.split(",") if s.strip()] if specialties else []
+    unknown = set(requested) - {t.value for t in SuggestionType}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown specialties: {sorted(unknown)}")
     
-    # Process text into simple chunks (by line for demo)
-    chunks = [c.strip() for c in text.split('\n') if c.strip()]
+    chunks = list(chunk_paragraphs(paragraphs_from_text(text)))
     if not chunks:
-        chunks = [text] # If single line
+        raise HTTPException(status_code=400, detail="Document is empty")
 
     print(f"Received doc {doc_id} with {len(chunks)} chunks.")
 
-    for i, chunk_text in enumerate(chunks):
-        chunk_id = f"p-{i}"
+    raw_index = await redis_client.get(chunks_key(doc_id))
+    plan = plan_revision([tuple(entry) for entry in json.loads(raw_index)] if raw_index else [], chunks)
+
+    if plan.changed:
+        # The lane's backlog as of the last refresh, then the client's rate (rejected uploads cost no tokens)
+        await admission.refresh_async(redis_client, stream_client)
+        retry_after = admission.check(priority)
+        if retry_after is not None:
+            API_REJECTED.labels("backlog").inc()
+            raise too_many_requests(f"Lane '{priority}' is backed up: {admission.backlog[priority].as_dict()}", retry_after)
+        client = request.headers.get("x-client-id") or tenant or (request.client.host if request.client else "-")
+        wait = client_limits.take(client, len(plan.changed))
+        if wait:
+            API_REJECTED.labels("rate").inc()
+            raise too_many_requests(f"Rate limit exceeded for client '{client}'", wait)
+
+    # Tell the aggregator how many chunks to expect before sending any of them
+    pipe = redis_client.pipeline()
+    register_document(pipe, doc_id, plan.index, plan.retracted, fresh=plan.fresh, pending=bool(plan.changed))
+    await pipe.execute()
+
+    # Every changed chunk (and its claim-checked body) in one round trip
+    tasks_stream = stream_for(STREAM_DOC_TASKS, doc_id, priority, tenant)
+    trace = new_trace()
+    pipe = redis_client.pipeline(transaction=False)
+    for chunk_id, chunk in plan.changed:
         payload = {
             "doc_id": doc_id,
             "chunk_id": chunk_id,
-            "text": chunk_text,
-            "language": "en",
-            "timestamp": time.time()
+            "text": chunk.text,
+            "language": language,
+            "timestamp": time.time(),
+            "priority": priority,
+            **trace,
+            **chunk.fields()
         }
-        await redis_client.xadd(STREAM_DOC_TASKS, payload)
+        if requested:
+            payload["specialties"] = ",".join(requested)
+        if tenant:
+            payload["tenant"] = tenant
 
-    return {"doc_id": doc_id, "status": "processing", "chunks": len(chunks)}
+        if CLAIM_CHECK:
+            # Body stored once; the tasks and specialist streams only carry text_ref
+            payload = check_in(pipe, payload)
+        pipe.xadd(tasks_stream, encode(payload), **xadd_kwargs(tasks_stream))
+    if plan.changed:
+        await pipe.execute()
+
+    return {
+        "doc_id": doc_id,
+        "status": "processing",
+        "priority": priority,
+        "trace_id": trace["trace_id"],
+        "chunks": len(chunks),
+        "changed": len(plan.changed),
+        "unchanged": len(plan.unchanged),
+        "retracted": len(plan.retracted),
+    }
 
 
 @app.get("/stream")
-async def stream_events():
+async def stream_events(request: Request, doc_id: Optional[str] = None, last_event_id: Optional[str] = None):
     """
     SSE endpoint to push updates from Redis Streams to the browser.
-    Listens to ALL relevant streams to visualize the flow.
+    Events come from the process-wide StreamBroadcaster; `doc_id` limits them to one
+    document. The `Last-Event-ID` header (or `last_event_id`) resumes after that entry.
     """
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    subscriber = broadcaster.subscribe(doc_id)
+
     async def event_generator():
-        # Subscribe to all streams we care about
-        streams = {
-            STREAM_DOC_TASKS: '$',     # Coordinator Input
-            STREAM_DOC_GRAMMAR: '$',   # Specialist Inputs
-            STREAM_DOC_CLARITY: '$',
-            STREAM_DOC_TONE: '$',
-            STREAM_DOC_STRUCTURE: '$',
-            STREAM_REVIEW_SUMMARY: '$' # Final Output
-        }
+        try:
+            # Replayed entries may arrive again live (we subscribed first): skip those per stream
+            replayed = {}
+            if resume_from and ENTRY_ID.match(resume_from):
+                for event in await broadcaster.replay(resume_from, doc_id):
+                    replayed[event.stream] = id_key(event.id)
+                    yield event.sse
 
-        while True:
-            try:
-                # Poll Redis Streams (XREAD)
-                # This could be more efficient with XREAD non-blocking loop per stream
-                # For demo, simple read works.
-                messages = await redis_client.xread(streams, count=1, block=5000)
-                
-                if messages:
-                    for stream, msgs in messages:
-                        # Update last ID for next poll
-                        streams[stream] = msgs[-1][0] 
-                        
-                        for msg_id, data in msgs:
-                            # Construct event for frontend
-                            event_type = "unknown"
-                            if stream == STREAM_DOC_TASKS: event_type = "coordinator_job"
-                            elif stream in [STREAM_DOC_GRAMMAR, STREAM_DOC_CLARITY, STREAM_DOC_TONE, STREAM_DOC_STRUCTURE]: event_type = "specialist_job"
-                            elif stream == STREAM_REVIEW_SUMMARY: event_type = "aggregator_result"
-                            
-                            yield {
-                                "event": "message",
-                                "data": json.dumps({
-                                    "type": event_type,
-                                    "stream": stream,
-                                    "id": msg_id,
-                                    "content": data
-                                })
-                            }
-                
-                # Heartbeat to keep connection alive
-                yield {"event": "ping", "data": "keep-alive"}
-                await asyncio.sleep(0.1)
+            while True:
+                event = await subscriber.next()
+                if event is None:
+                    # Dropped for being too slow; the browser reconnects and resumes from Last-Event-ID
+                    break
+                if event.stream in replayed and id_key(event.id) <= replayed[event.stream]:
+                    continue
+                yield event.sse
+        finally:
+            broadcaster.unsubscribe(subscriber)
 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"SSE Error: {e}")
-                await asyncio.sleep(1)
+    # Comment-line heartbeats on a timer keep idle connections (and proxies) alive
+    return EventSourceResponse(event_generator(), ping=SSE_HEARTBEAT)
+
+# Results API: reads the aggregator's per-document hashes (doc:{id}:meta / doc:{id}:results).
+# Every response carries an ETag from the document's version counter; a matching
+# If-None-Match is answered 304 after reading only the meta hash.
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", 100))
+RESULTS_MAX_PAGE_SIZE = int(os.getenv("RESULTS_MAX_PAGE_SIZE", 1000))
+
+async def document_meta(doc_id: str) -> Dict[str, str]:
+    meta = await redis_client.hgetall(meta_key(doc_id))
+    if not meta:
+        raise HTTPException(status_code=404, detail=f"Unknown document '{doc_id}' (never uploaded, or expired)")
+    return meta
+
+def not_modified(request: Request, etag: str) -> bool:
+    tags = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    return etag in tags or "*" in tags
+
+async def document_results(doc_id: str) -> List[Suggestion]:
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hvals(results_key(doc_id))
+    pipe.get(chunks_key(doc_id))
+    results, raw_index = await pipe.execute()
+    return ordered_suggestions(results, [tuple(entry) for entry in json.loads(raw_index)] if raw_index else [])
+
+@app.get("/documents/{doc_id}")
+async def get_document(doc_id: str, request: Request, response: Response):
+    """Status and progress of a document, with its suggestion counts per type and severity."""
+    meta = await document_meta(doc_id)
+    etag = document_etag(meta)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    suggestions = await document_results(doc_id)
+    by_type: Dict[str, int] = {}
+    by_severity: Dict[str, int] = {}
+    for suggestion in suggestions:
+        by_type[suggestion.type.value] = by_type.get(suggestion.type.value, 0) + 1
+        by_severity[suggestion.severity] = by_severity.get(suggestion.severity, 0) + 1
+    expected = int(meta.get("expected_results", 0)) - int(meta.get("skipped_results", 0))
+
+    response.headers["ETag"] = etag
+    return {
+        "doc_id": doc_id,
+        "status": document_status(meta, len(suggestions)).value,
+        "revision": int(meta.get("revision", 0)),
+        "total_chunks": int(meta["total_chunks"]) if "total_chunks" in meta else None,
+        "processed_chunks": len({s.chunk_id for s in suggestions}),
+        "results": len(suggestions),
+        "expected_results": expected if "expected_results" in meta else None,
+        "suggestions": {"by_type": by_type, "by_severity": by_severity},
+        "created_at": float(meta.get("created_at", 0)),
+        "updated_at": float(meta.get("updated_at", 0)),
+        "completed_at": float(meta["emitted"]) if "emitted" in meta else None,
+    }
+
+@app.get("/documents/{doc_id}/suggestions")
+async def get_suggestions(
+    doc_id: str,
+    request: Request,
+    response: Response,
+    types: Optional[List[SuggestionType]] = Query(None, alias="type"),
+    severity: Optional[List[str]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    A document's suggestions in source order, a page at a time (`offset` / `limit`).
+    `type` and `severity` filter them and may be repeated (e.g. ?type=grammar&type=tone).
+    """
+    meta = await document_meta(doc_id)
+    etag = document_etag(meta)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    limit = min(limit or RESULTS_PAGE_SIZE, RESULTS_MAX_PAGE_SIZE)
+    suggestions = await document_results(doc_id)
+    status = document_status(meta, len(suggestions))
+    matching = [
+        s for s in suggestions
+        if (not types or s.type in types) and (not severity or s.severity in severity)
+    ]
+    page = matching[offset:offset + limit]
+
+    # Claim-checked texts are inlined, for this page only
+    refs = [s.suggested_text_ref for s in page if s.suggested_text_ref]
+    if refs:
+        bodies = dict(zip(refs, await redis_client.mget(refs)))
+        for suggestion in page:
+            if suggestion.suggested_text_ref:
+                suggestion.suggested_text = bodies.get(suggestion.suggested_text_ref) or ""
+                suggestion.suggested_text_ref = None
+
+    response.headers["ETag"] = etag
+    return {
+        "doc_id": doc_id,
+        "status": status.value,
+        "total": len(matching),
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < len(matching) else None,
+        "suggestions": [s.model_dump(exclude={"suggested_text_ref"}) for s in page],
+    }
 
-    return EventSourceResponse(event_generator())
 
 # Serve static files (HTML/JS/CSS)
 app.mount("/", StaticFiles(directory="src/web", html=True), name="static")
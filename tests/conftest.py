@@ -0,0 +1,23 @@
+import fakeredis
+import pytest
+
+from src.core import transport
+from src.core.redis_client import RedisClient
+
+@pytest.fixture
+def r():
+    """A fresh in-memory Redis (with Lua) per test, decoding responses like the mesh's write pool."""
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+@pytest.fixture
+def mesh(r, monkeypatch):
+    """Point the process-wide clients (and the transports built on them) at the `r` server, for agents."""
+    server = r.connection_pool.connection_kwargs["server"]
+    monkeypatch.setattr(RedisClient, "_clients", {
+        ("write", False): r,
+        ("read", False): fakeredis.FakeRedis(server=server),
+        ("write", True): fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+        ("read", True): fakeredis.FakeAsyncRedis(server=server),
+    })
+    monkeypatch.setattr(transport, "_transports", {})
+    return r
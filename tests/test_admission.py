@@ -0,0 +1,61 @@
+import pytest
+
+from src.core import admission
+from src.core.admission import ClientRateLimiter, TokenBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+def test_bucket_starts_full_and_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=4)
+    assert bucket.take(4) == 0
+    assert bucket.take(1) == pytest.approx(0.5)
+
+    clock.now += 1
+    assert bucket.take(2) == 0
+    assert bucket.take(1) == pytest.approx(0.5)
+
+def test_refusals_take_nothing(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.take(2)
+    assert bucket.take(2) == pytest.approx(2)
+
+    clock.now += 2
+    assert bucket.take(2) == 0
+
+def test_refill_is_capped_at_the_burst(clock):
+    bucket = TokenBucket(rate=10, burst=3)
+    clock.now += 60
+    assert bucket.take(3) == 0
+    assert bucket.take(1) == pytest.approx(0.1)
+
+def test_requests_above_the_burst_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.take(1)
+    assert bucket.take(10) == pytest.approx(1)
+
+    clock.now += 1
+    assert bucket.take(10) == 0
+
+def test_clients_have_separate_buckets(clock):
+    limiter = ClientRateLimiter(rate=1, burst=1, max_clients=2)
+    assert limiter.take("a") == 0
+    assert limiter.take("a") > 0
+    assert limiter.take("b") == 0
+
+    limiter.take("c")  # evicts "a", the least recently seen
+    assert limiter.take("a") == 0
+
+def test_zero_rate_disables_the_limit(clock):
+    limiter = ClientRateLimiter(rate=0, burst=1)
+    assert all(limiter.take("a", 100) == 0 for _ in range(3))
@@ -0,0 +1,49 @@
+from src.core.cache import CACHE_EXPIRY_KEY, CACHE_INDEX_KEY, SuggestionCache
+
+SUGGESTION = {"original_text": "t", "suggested_text": "T", "explanation": "why", "type": "grammar",
+              "severity": "low", "source_agent": "grammar-1"}
+
+def chunk(text):
+    return {"doc_id": "d1", "chunk_id": "c1", "text": text}
+
+def expire(r, cache, text):
+    """What Redis does when the entry's TTL runs out: the key goes, its index members stay."""
+    key = cache._key(chunk(text), "grammar")
+    r.delete(key)
+    r.zadd(CACHE_EXPIRY_KEY, {key: 0})
+
+def cached(cache, text):
+    return cache.get_many(chunk(text), ["grammar"])["grammar"] is not None
+
+def test_lfu_evicts_the_least_used(r):
+    cache = SuggestionCache(r, max_entries=2, policy="lfu")
+    cache.put(chunk("a"), "grammar", SUGGESTION)
+    cache.put(chunk("b"), "grammar", SUGGESTION)
+    for _ in range(3):
+        cached(cache, "a")
+    cache.put(chunk("c"), "grammar", SUGGESTION)
+
+    assert [cached(cache, t) for t in "abc"] == [True, False, True]
+    assert r.zcard(CACHE_INDEX_KEY) == r.zcard(CACHE_EXPIRY_KEY) == 2
+
+def test_expired_entries_leave_the_index_before_live_ones_are_evicted(r):
+    cache = SuggestionCache(r, max_entries=2, policy="lfu")
+    cache.put(chunk("hot"), "grammar", SUGGESTION)
+    for _ in range(10):
+        cached(cache, "hot")
+    expire(r, cache, "hot")
+
+    cache.put(chunk("b"), "grammar", SUGGESTION)
+    cache.put(chunk("c"), "grammar", SUGGESTION)
+
+    assert cached(cache, "b") and cached(cache, "c")
+    assert r.zcard(CACHE_INDEX_KEY) == 2
+
+def test_lru_evicts_the_least_recent(r):
+    cache = SuggestionCache(r, max_entries=2, policy="lru")
+    cache.put(chunk("a"), "grammar", SUGGESTION)
+    cache.put(chunk("b"), "grammar", SUGGESTION)
+    r.zadd(CACHE_INDEX_KEY, {cache._key(chunk("a"), "grammar"): 0})  # last used long ago
+    cache.put(chunk("c"), "grammar", SUGGESTION)
+
+    assert [cached(cache, t) for t in "abc"] == [False, True, True]
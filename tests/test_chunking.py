@@ -0,0 +1,71 @@
+import random
+
+from src.ingestion.chunking import chunk_paragraphs, estimate_tokens, paragraphs_from_text
+from src.ingestion.diffing import plan_revision
+
+def chunk(text, target_tokens=10, max_tokens=20):
+    return list(chunk_paragraphs(paragraphs_from_text(text), target_tokens, max_tokens))
+
+def test_small_paragraphs_merge_into_chunks():
+    text = "one two three\nfour five six\nseven eight nine ten eleven"
+    chunks = chunk(text)
+
+    assert [c.text for c in chunks] == ["one two three\nfour five six", "seven eight nine ten eleven"]
+    assert [(c.first_paragraph, c.last_paragraph) for c in chunks] == [(0, 1), (2, 2)]
+
+def test_offsets_point_into_the_source():
+    text = "alpha beta\n\n  gamma delta epsilon zeta eta theta iota\nkappa"
+    for c in chunk(text):
+        first_line = c.text.split("\n")[0]
+        assert text[c.start:c.start + len(first_line)] == first_line
+        assert text[c.start:c.end].endswith(c.text.split("\n")[-1])
+
+def test_headings_start_a_chunk_and_stay_with_their_text():
+    text = "intro text\n# Methods\nwe measured things carefully here"
+    chunks = chunk(text)
+
+    assert [c.text for c in chunks] == ["intro text", "# Methods\nwe measured things carefully here"]
+    assert chunks[1].heading == "Methods" and not chunks[1].heading_only
+    assert chunks[0].heading == ""
+
+def test_oversized_paragraphs_split_on_sentences():
+    sentence = "Each of these sentences fits in a chunk."
+    text = " ".join([sentence] * 4)
+    chunks = chunk(text)
+
+    assert len(chunks) == 4
+    assert all(c.text == sentence for c in chunks)
+    assert all(c.first_paragraph == c.last_paragraph == 0 for c in chunks)
+    assert [c.start for c in chunks] == [i * (len(sentence) + 1) for i in range(4)]
+
+def test_a_sentence_above_the_max_splits_between_words():
+    text = " ".join(f"w{i}" for i in range(50))
+    chunks = chunk(text)
+
+    assert all(c.tokens <= 20 for c in chunks)
+    assert " ".join(c.text for c in chunks) == text
+    assert estimate_tokens(text) == sum(c.tokens for c in chunks)
+
+def document(rng, paragraphs=300):
+    words = "the mesh reads a stream and each agent reviews one chunk of text".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 120))) for _ in range(paragraphs)]
+
+def test_chunks_stay_within_the_max():
+    chunks = list(chunk_paragraphs(paragraphs_from_text("\n".join(document(random.Random(0)))), 256, 512))
+
+    assert all(c.tokens <= 512 for c in chunks)
+    assert 100 < sum(c.tokens for c in chunks) / len(chunks) < 400
+
+def test_one_edit_changes_a_constant_number_of_chunks():
+    rng = random.Random(1)
+    paragraphs = document(rng)
+    index = plan_revision([], chunk("\n".join(paragraphs), 256, 512)).index
+
+    for position in (0, 10, 50, 150, 299):
+        edited = list(paragraphs)
+        edited[position] = "a much shorter paragraph"
+        plan = plan_revision(index, chunk("\n".join(edited), 256, 512))
+        assert 1 <= len(plan.changed) <= 2
+
+        inserted = paragraphs[:position] + [" ".join(["new"] * 60)] + paragraphs[position:]
+        assert len(plan_revision(index, chunk("\n".join(inserted), 256, 512)).changed) <= 2
@@ -0,0 +1,53 @@
+import fakeredis
+import pytest
+
+from src.core.codec import CodecError, PACKED_FIELD, decode, decode_model, decode_summary, encode, summary_message
+from src.core.models import DocumentChunk, ReviewSummary, Suggestion, SuggestionType
+
+SUGGESTION = Suggestion(doc_id="d1", chunk_id="c1", type=SuggestionType.TONE, original_text="hey",
+                        suggested_text="Hello", explanation="formal", source_agent="tone", start=0, end=3)
+
+@pytest.fixture
+def binary():
+    """A client returning raw bytes, like the mesh's stream read pool."""
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+@pytest.mark.parametrize("codec", ["flat", "msgpack"])
+def test_models_round_trip_through_a_stream(binary, codec):
+    binary.xadd("s", encode(SUGGESTION, codec))
+    (_, fields), = binary.xrange("s")
+
+    assert decode_model(Suggestion, fields) == SUGGESTION
+
+@pytest.mark.parametrize("codec", ["flat", "msgpack"])
+def test_summaries_round_trip(binary, codec):
+    summary = ReviewSummary(doc_id="d1", total_chunks=1, processed_chunks=1, suggestions=[SUGGESTION])
+    binary.xadd("s", encode(summary_message(summary, 1.5), codec))
+    (_, fields), = binary.xrange("s")
+
+    assert decode_summary(fields) == summary
+
+def test_flat_entries_decode_from_str_fields():
+    chunk = DocumentChunk(doc_id="d1", chunk_id="c1", text="Some text.", language="de")
+    fields = encode(chunk, "flat")
+
+    assert all(isinstance(v, str) for v in fields.values())
+    assert decode_model(DocumentChunk, fields) == chunk
+
+def test_unset_values_are_left_out():
+    assert "suggested_text_ref" not in encode(SUGGESTION, "flat")
+    assert "skip" not in decode(encode({"doc_id": "d1", "skip": None}, "msgpack"))
+
+def test_packed_entries_need_a_binary_client():
+    packed = encode({"doc_id": "d1"}, "msgpack")[PACKED_FIELD]
+    with pytest.raises(CodecError):
+        decode({PACKED_FIELD: packed.decode("latin-1")})
+    with pytest.raises(CodecError):
+        decode({PACKED_FIELD: b"\x09" + packed[1:]})
+
+def test_unknown_codec():
+    with pytest.raises(CodecError):
+        encode(SUGGESTION, "json")
+
+def test_other_entries_are_not_summaries():
+    assert decode_summary(encode({"type": "progress", "doc_id": "d1"}, "flat")) is None
@@ -0,0 +1,49 @@
+from itertools import count
+
+from src.ingestion.chunking import Chunk
+from src.ingestion.diffing import content_hash, plan_revision
+
+def chunks(*texts):
+    result, offset = [], 0
+    for i, text in enumerate(texts):
+        result.append(Chunk(text=text, start=offset, end=offset + len(text), first_paragraph=i, last_paragraph=i))
+        offset += len(text) + 1
+    return result
+
+def ids():
+    n = count(1)
+    return lambda: f"p-{next(n)}"
+
+def test_first_upload_enqueues_everything():
+    plan = plan_revision([], chunks("a", "b"), make_id=ids())
+
+    assert plan.fresh
+    assert [chunk_id for chunk_id, _ in plan.changed] == ["p-1", "p-2"]
+    assert plan.index == [("p-1", content_hash("a"), 0, 1), ("p-2", content_hash("b"), 2, 3)]
+    assert plan.unchanged == [] and plan.retracted == []
+
+def test_unchanged_chunks_keep_their_ids_and_new_offsets():
+    previous = plan_revision([], chunks("a", "b", "c"), make_id=ids()).index
+    plan = plan_revision(previous, chunks("new", "a", "b", "c"), make_id=lambda: "p-new")
+
+    assert not plan.fresh
+    assert plan.unchanged == ["p-1", "p-2", "p-3"]
+    assert [chunk_id for chunk_id, _ in plan.changed] == ["p-new"]
+    assert plan.retracted == []
+    assert plan.index[1] == ("p-1", content_hash("a"), 4, 5)
+
+def test_edited_and_deleted_chunks_are_retracted():
+    previous = plan_revision([], chunks("a", "b", "c"), make_id=ids()).index
+    plan = plan_revision(previous, chunks("a", "B"), make_id=lambda: "p-edit")
+
+    assert plan.unchanged == ["p-1"]
+    assert sorted(plan.retracted) == ["p-2", "p-3"]
+    assert [chunk_id for chunk_id, _ in plan.changed] == ["p-edit"]
+    assert [entry[0] for entry in plan.index] == ["p-1", "p-edit"]
+
+def test_identical_upload_changes_nothing():
+    previous = plan_revision([], chunks("a", "b"), make_id=ids()).index
+    plan = plan_revision(previous, chunks("a", "b"))
+
+    assert plan.changed == [] and plan.retracted == []
+    assert plan.index == previous
@@ -0,0 +1,119 @@
+import pytest
+
+from src.core import documents
+from src.core.codec import decode_summary
+from src.core.documents import (
+    DocumentStore,
+    meta_key,
+    open_docs_key,
+    ordered_suggestions,
+    register_document,
+    results_key,
+    seal_document,
+)
+from src.core.models import ProcessingStatus, Suggestion, SuggestionType
+from src.core.redis_client import STREAM_REVIEW_SUMMARY, stream_for
+
+INDEX = [("c1", "h1", 0, 10), ("c2", "h2", 11, 20)]
+
+def suggestion(chunk_id, type_=SuggestionType.GRAMMAR, doc_id="d1", **kwargs):
+    return Suggestion(doc_id=doc_id, chunk_id=chunk_id, type=type_, original_text="text",
+                      explanation="why", source_agent="test", **kwargs)
+
+def register(r, doc_id="d1", chunk_index=INDEX, **kwargs):
+    pipe = r.pipeline(transaction=False)
+    register_document(pipe, doc_id, chunk_index, **kwargs)
+    pipe.execute()
+
+@pytest.fixture
+def store(r):
+    return DocumentStore(r)
+
+def test_complete_once_every_routed_result_is_in(r, store):
+    register(r)
+    store.route("d1", "c1", 4)
+    store.route("d1", "c2", 1)  # 3 specialties skipped
+
+    for type_ in SuggestionType:
+        assert not store.record(suggestion("c1", type_))
+    assert store.record(suggestion("c2"))
+    assert store.is_complete("d1")
+
+def test_redelivery_is_idempotent(r, store):
+    register(r)
+    store.route("d1", "c1", 1)
+    store.route("d1", "c1", 1)
+    assert r.hget(meta_key("d1"), "skipped_results") == "3"
+
+    store.record(suggestion("c1"))
+    store.record(suggestion("c1"))
+    assert r.hlen(results_key("d1")) == 1
+
+def test_results_of_other_revisions_are_ignored(r, store):
+    register(r)
+    store.route("d1", "old", 1)
+    assert not store.record(suggestion("old"))
+    assert r.hlen(results_key("d1")) == 0
+    assert r.hget(meta_key("d1"), "skipped_results") is None
+
+def test_retracted_chunks_drop_their_results(r, store):
+    register(r)
+    store.record(suggestion("c2"))
+    register(r, chunk_index=[INDEX[0], ("c3", "h3", 11, 20)], retracted=["c2"], fresh=False)
+
+    assert r.hlen(results_key("d1")) == 0
+    assert not store.record(suggestion("c2", SuggestionType.TONE))
+
+def test_seal_prunes_results_that_beat_the_index(r, store):
+    register(r, chunk_index=None)
+    assert not store.record(suggestion("stale"))  # count unknown: never complete yet
+    store.route("d1", "stale", 1)
+    for type_ in SuggestionType:
+        store.record(suggestion("c1", type_))
+
+    pipe = r.pipeline(transaction=False)
+    seal_document(pipe, "d1", INDEX[:1])
+    pipe.execute()
+
+    assert sorted(r.hkeys(results_key("d1"))) == sorted(f"c1:{t.value}" for t in SuggestionType)
+    assert r.hget(meta_key("d1"), "skipped_results") == "0"
+    assert store.close_if_complete("d1")
+    assert store.expired() == ["d1"]
+
+def test_stalled_documents_time_out(r, store, monkeypatch):
+    register(r)
+    assert store.expired() == []
+    assert not store.close_if_complete("d1")
+
+    monkeypatch.setattr(documents, "DOC_TIMEOUT", -1)
+    store.record(suggestion("c1"))  # slides the deadline
+    assert store.expired() == ["d1"]
+
+def test_finalize_emits_once(r, store):
+    register(r)
+    store.record(suggestion("c1"))
+
+    summary = store.finalize("d1", ProcessingStatus.TIMED_OUT)
+    assert summary.status == ProcessingStatus.TIMED_OUT
+    assert summary.processed_chunks == 1
+    assert store.finalize("d1") is None
+
+    entries = r.xrange(stream_for(STREAM_REVIEW_SUMMARY, "d1"))
+    assert len(entries) == 1
+    emitted = decode_summary(entries[0][1])
+    assert emitted.doc_id == "d1" and len(emitted.suggestions) == 1
+    assert r.hget(meta_key("d1"), "status") == ProcessingStatus.TIMED_OUT.value
+    assert r.zscore(open_docs_key("d1"), "d1") is None
+
+def test_ordered_suggestions_follow_the_source(r):
+    results = [
+        suggestion("c2", SuggestionType.TONE),
+        suggestion("c1", SuggestionType.STRUCTURE),
+        suggestion("c1", SuggestionType.GRAMMAR),
+    ]
+    ordered = ordered_suggestions([s.model_dump_json() for s in results], INDEX)
+
+    assert [(s.chunk_id, s.type) for s in ordered] == [
+        ("c1", SuggestionType.GRAMMAR), ("c1", SuggestionType.STRUCTURE), ("c2", SuggestionType.TONE),
+    ]
+    assert (ordered[2].start, ordered[2].end) == (11, 20)
@@ -0,0 +1,29 @@
+from collections import Counter
+
+from src.agents.lanes import LaneScheduler
+
+def firsts(scheduler, reads):
+    return [scheduler.order()[0] for _ in range(reads)]
+
+def test_lanes_lead_in_proportion_to_their_weights():
+    scheduler = LaneScheduler({"interactive": 4, "batch": 1})
+    assert Counter(firsts(scheduler, 50)) == {"interactive": 40, "batch": 10}
+
+def test_the_low_priority_lane_is_never_starved():
+    scheduler = LaneScheduler({"interactive": 4, "batch": 1})
+    assert firsts(scheduler, 5).count("batch") == 1
+    assert firsts(scheduler, 5).count("batch") == 1
+
+def test_smooth_interleaving():
+    scheduler = LaneScheduler({"a": 2, "b": 1, "c": 1})
+    assert firsts(scheduler, 4) == ["a", "b", "c", "a"]
+
+def test_the_other_lanes_follow_in_priority_order():
+    scheduler = LaneScheduler({"interactive": 4, "normal": 2, "batch": 1})
+    for order in (scheduler.order() for _ in range(7)):
+        assert sorted(order) == sorted(["interactive", "normal", "batch"])
+        rest = order[1:]
+        assert rest == [lane for lane in ["interactive", "normal", "batch"] if lane in rest]
+
+def test_a_single_lane_always_leads():
+    assert firsts(LaneScheduler({"batch": 1}), 3) == ["batch"] * 3
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from src.ingestion.producer import bulk_doc_ids
+
+def test_files_in_one_directory_keep_their_names():
+    assert bulk_doc_ids(["corpus/a.docx", "corpus/b.docx"]) == {"corpus/a.docx": "doc-a", "corpus/b.docx": "doc-b"}
+
+def test_same_name_in_different_directories():
+    paths = ["corpus/notes.docx", os.path.join("corpus", "a", "notes.docx"), os.path.join("corpus", "b", "notes.docx")]
+    assert list(bulk_doc_ids(paths, "x-").values()) == ["x-notes", "x-a.notes", "x-b.notes"]
+
+def test_colliding_ids_are_refused():
+    with pytest.raises(ValueError):
+        bulk_doc_ids(["corpus/a.b.docx", os.path.join("corpus", "a", "b.docx")])
@@ -0,0 +1,87 @@
+import asyncio
+
+from src.agents.async_base import AsyncBaseAgent
+from src.agents.base import BaseAgent
+from src.agents.lanes import LaneScheduler
+from src.agents.reading import StreamReading
+from src.agents.recovery import PendingRecovery
+from src.core.redis_client import STREAM_DOC_GRAMMAR
+
+class Plan(StreamReading):
+    """Read-side state without an agent: two lanes, the first with two fair queues."""
+
+    def __init__(self):
+        self.lanes = LaneScheduler({"interactive": 1, "batch": 1})
+        self._lane_groups = {"interactive": [["i.q0", "i.q1"]], "batch": [["b"]]}
+        self._streams = ["i.q0", "i.q1", "b"]
+        self._read_groups = [self._streams]
+        self._rotation = 0
+
+def run(plan, replies):
+    """Drive a read plan with canned replies; returns (calls, messages)."""
+    calls, reply = [], None
+    try:
+        while True:
+            calls.append(plan.send(reply))
+            reply = replies.pop(0)
+    except StopIteration as done:
+        return calls, done.value
+
+def test_lanes_share_the_budget_and_stop_when_it_is_spent():
+    calls, messages = run(Plan().read_plan(10, 2000), [[("i.q0", [1] * 6), ("i.q1", [1] * 4)]])
+    assert calls == [(["i.q0", "i.q1"], 5, None)]
+    assert len(messages) == 2
+
+def test_lanes_are_read_in_weighted_order_without_blocking():
+    calls, messages = run(Plan().read_plan(10, 2000), [[("i.q0", [1])], [("b", [1])]])
+    assert calls == [(["i.q0", "i.q1"], 5, None), (["b"], 9, None)]
+    assert messages == [("i.q0", [1]), ("b", [1])]
+
+def test_blocks_on_everything_when_nothing_waits():
+    calls, messages = run(Plan().read_plan(9, 2000), [[], [], []])
+    assert calls[-1] == (["i.q0", "i.q1", "b"], 3, 2000)
+    assert messages == []
+
+class Echo(BaseAgent):
+    def process_message(self, message_id, data):
+        pass
+
+class AsyncEcho(AsyncBaseAgent):
+    async def process_message(self, message_id, data):
+        pass
+
+def test_sync_and_async_agents_read_alike(mesh):
+    sync_agent = Echo(STREAM_DOC_GRAMMAR, "sync-group", "sync-1")
+    async_agent = AsyncEcho(STREAM_DOC_GRAMMAR, "async-group", "async-1")
+    asyncio.run(async_agent.ensure_group(STREAM_DOC_GRAMMAR))
+    ids = [mesh.xadd(STREAM_DOC_GRAMMAR, {"n": str(i)}) for i in range(3)]
+
+    sync_agent.rebalance()
+    sync_read = sync_agent.read(2, 1)
+
+    async def read_async():
+        await async_agent.rebalance()
+        return await async_agent.read(2, 1)
+    async_read = asyncio.run(read_async())
+
+    for reply in (sync_read, async_read):
+        (stream, entries), = reply
+        assert [message_id.decode() for message_id, _ in entries] == ids[:2]
+
+def test_async_agents_retry_reclaimed_entries(mesh):
+    agent = AsyncEcho(STREAM_DOC_GRAMMAR, "async-group", "async-1")
+    message_id = mesh.xadd(STREAM_DOC_GRAMMAR, {"n": "0"})
+    mesh.xgroup_create(STREAM_DOC_GRAMMAR, "async-group", id="0")
+    mesh.xreadgroup("async-group", "crashed", {STREAM_DOC_GRAMMAR: ">"})
+    mesh.xclaim(STREAM_DOC_GRAMMAR, "async-group", "crashed", 0, [message_id], idle=120000)
+
+    async def recover():
+        await agent.rebalance()
+        agent.recovery = PendingRecovery(mesh, "async-group", "async-1", agent._streams, backoff_base=0)
+        await agent.process_pending_messages()  # sweep: reclaimed and queued for retry
+        await agent.process_pending_messages()  # retried
+        await asyncio.gather(*agent._in_flight)
+    asyncio.run(recover())
+
+    assert mesh.xpending(STREAM_DOC_GRAMMAR, "async-group")["pending"] == 0
+    assert agent.recovery.stats()["retried"] == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from src.agents.recovery import PendingRecovery, dead_letter_stream
+from src.core.codec import decode
+from src.core.redis_client import STREAM_DOC_GRAMMAR
+
+STREAM = STREAM_DOC_GRAMMAR
+
+@pytest.fixture
+def stream(mesh):
+    """Five entries delivered to consumer c1, none ACKed; returns their IDs."""
+    ids = [mesh.xadd(STREAM, {"n": str(i)}) for i in range(5)]
+    mesh.xgroup_create(STREAM, "g", id="0")
+    mesh.xreadgroup("g", "c1", {STREAM: ">"})
+    return ids
+
+def recovery(mesh, **kwargs):
+    return PendingRecovery(mesh, "g", "r", [STREAM], min_idle_ms=60000, max_deliveries=5, backoff_base=0, **kwargs)
+
+def stall(mesh, ids, deliveries, consumer="c1"):
+    """Make `ids` look idle for two minutes after `deliveries` deliveries."""
+    mesh.xclaim(STREAM, "g", consumer, 0, ids, idle=120000, retrycount=deliveries)
+
+def test_stalled_entries_are_retried(mesh, stream):
+    stall(mesh, stream[:2], 1)
+    rec = recovery(mesh)
+    rec.sweep()
+
+    assert [message_id for _, message_id, _ in rec.due_retries()] == stream[:2]
+    assert rec.counters["dead_lettered"] == 0
+
+def test_poison_entries_are_dead_lettered(mesh, stream):
+    stall(mesh, [stream[0]], 5)
+    recovery(mesh).sweep()
+
+    (_, fields), = mesh.xrange(dead_letter_stream(STREAM))
+    assert decode(fields)["dlq_message_id"] == stream[0]
+    assert [p["message_id"] for p in mesh.xpending_range(STREAM, "g", "-", "+", 10)] == stream[1:]
+
+def test_counts_ignore_our_other_pending_entries(mesh, stream):
+    """Entries of ours waiting for a retry between the claimed ones don't hide their counts."""
+    mesh.xclaim(STREAM, "g", "r", 0, stream[1:4])  # in our PEL, not idle
+    stall(mesh, [stream[0], stream[4]], 5)
+    rec = recovery(mesh)
+    rec.sweep()
+
+    assert rec.counters == {"reclaimed": 2, "retried": 0, "dead_lettered": 2}
+    assert [decode(f)["dlq_message_id"] for _, f in mesh.xrange(dead_letter_stream(STREAM))] == [stream[0], stream[4]]
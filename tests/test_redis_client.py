@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+from src.core.redis_client import id_key, id_ms
+
+def test_id_key_orders_stream_ids():
+    ids = ["+", "10-2", "9-10", "-", "10-0", "10"]
+    assert sorted(ids, key=id_key) == ["-", "9-10", "10-0", "10", "10-2", "+"]
+    assert id_ms("1700000000123-4") == 1700000000123
+
+def _import_with(**env):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run([sys.executable, "-c", "import src.core.redis_client"], capture_output=True, text=True,
+                          cwd=root, env={**os.environ, "REDIS_HASH_TAG": "", **env})
+
+def test_cluster_mode_needs_partitions():
+    refused = _import_with(REDIS_MODE="cluster", STREAM_PARTITIONS="1")
+    assert refused.returncode != 0 and "STREAM_PARTITIONS" in refused.stderr
+    assert _import_with(REDIS_MODE="cluster", STREAM_PARTITIONS="4").returncode == 0
@@ -0,0 +1,54 @@
+from src.core.redis_client import STREAM_DOC_TASKS
+from src.core.retention import StreamTrimmer
+
+STREAM = STREAM_DOC_TASKS
+
+def trimmer(r):
+    return StreamTrimmer([STREAM], redis_client=r)
+
+def add(r, n):
+    return [r.xadd(STREAM, {"n": i}) for i in range(n)]
+
+def test_missing_stream_has_no_safe_id(r):
+    assert trimmer(r).safe_id(STREAM) is None
+
+def test_stream_without_groups_can_be_trimmed_freely(r):
+    add(r, 3)
+    assert trimmer(r).safe_id(STREAM) == "+"
+
+def test_safe_id_stops_at_the_oldest_pending_entry(r):
+    ids = add(r, 4)
+    r.xgroup_create(STREAM, "g", id="0")
+    r.xreadgroup("g", "c1", {STREAM: ">"}, count=3)
+    r.xack(STREAM, "g", ids[0])
+
+    assert trimmer(r).safe_id(STREAM) == ids[1]
+
+def test_safe_id_after_everything_delivered_is_acked(r):
+    ids = add(r, 2)
+    r.xgroup_create(STREAM, "g", id="0")
+    r.xreadgroup("g", "c1", {STREAM: ">"})
+    r.xack(STREAM, "g", *ids)
+
+    ms, seq = ids[-1].split("-")
+    assert trimmer(r).safe_id(STREAM) == f"{ms}-{int(seq) + 1}"
+
+def test_the_slowest_group_wins(r):
+    ids = add(r, 4)
+    r.xgroup_create(STREAM, "fast", id="0")
+    r.xgroup_create(STREAM, "slow", id="0")
+    r.xreadgroup("fast", "c1", {STREAM: ">"})
+    r.xack(STREAM, "fast", *ids)
+    r.xreadgroup("slow", "c1", {STREAM: ">"}, count=2)
+    r.xack(STREAM, "slow", ids[0])
+
+    assert trimmer(r).safe_id(STREAM) == ids[1]
+
+def test_undelivered_entries_are_kept(r):
+    ids = add(r, 3)
+    r.xgroup_create(STREAM, "g", id="0")
+    r.xreadgroup("g", "c1", {STREAM: ">"}, count=1)
+    r.xack(STREAM, "g", ids[0])
+
+    ms, seq = ids[0].split("-")
+    assert trimmer(r).safe_id(STREAM) == f"{ms}-{int(seq) + 1}"
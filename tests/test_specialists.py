@@ -0,0 +1,55 @@
+from src.agents.inference import ReviewBackend
+from src.agents.specialists import create_batched_specialist_agent
+from src.core.codec import decode_messages, encode
+from src.core.redis_client import GROUP_GRAMMAR, STREAM_SUGGESTIONS_GRAMMAR, physical_streams
+
+def chunk(i):
+    return encode({"doc_id": "d1", "chunk_id": f"c{i}", "text": f"Chunk number {i}."})
+
+def step(agent):
+    """One iteration of BaseAgent.run without blocking."""
+    agent.rebalance()
+    messages = agent.read(agent._read_count(), 1)
+    if messages:
+        for stream, msgs in decode_messages(messages):
+            for message_id, data in msgs:
+                agent._start_message(stream, message_id, data)
+    else:
+        agent.flush()
+    agent._block_ms()
+    agent.process_pending_messages()
+    if agent._flush_due():
+        agent.flush()
+
+def test_model_batching_with_batched_writes(mesh):
+    agent = create_batched_specialist_agent("grammar", batched=True, flush_interval=0, max_batch=4, max_wait_ms=0,
+                                            backend=ReviewBackend())
+    stream = agent.input_streams[0]
+    for i in range(2):
+        mesh.xadd(stream, chunk(i))
+
+    step(agent)  # reads both; the partial model batch is due at once (max_wait_ms=0) and its writes flushed
+    step(agent)  # nothing new: flushes again with an empty model batch
+
+    suggestions = [s for out in physical_streams(STREAM_SUGGESTIONS_GRAMMAR) for s in mesh.xrange(out)]
+    assert len(suggestions) == 2
+    assert mesh.xpending(stream, GROUP_GRAMMAR)["pending"] == 0
+
+def test_write_flush_keeps_a_partial_model_batch(mesh):
+    """Flushing the write batch must not reset the timer of a partial model batch."""
+    agent = create_batched_specialist_agent("grammar", batched=True, max_batch=4, max_wait_ms=60000,
+                                            backend=ReviewBackend())
+    stream = agent.input_streams[0]
+    mesh.xadd(stream, chunk(0))
+
+    step(agent)
+    agent.emit(STREAM_SUGGESTIONS_GRAMMAR, {"doc_id": "d0", "note": "other output"})
+    agent.flush()  # the base write batch is sent; the model batch is still waiting
+    step(agent)
+    step(agent)
+
+    assert len(agent._model_batch) == 1
+    assert 1 <= agent._block_ms() <= 60000
+    agent.run_batch()
+    agent.flush()
+    assert mesh.xpending(stream, GROUP_GRAMMAR)["pending"] == 0
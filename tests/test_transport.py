@@ -0,0 +1,86 @@
+import fakeredis
+import pytest
+import redis
+
+from src.core.codec import decode_messages
+from src.core.transport import LocalTransport, RedisTransport
+
+STREAM = "s"
+
+@pytest.fixture(params=["local", "redis"])
+def transport(request):
+    """The in-process transport, and Redis (fakeredis) as the reference for its semantics."""
+    if request.param == "local":
+        return LocalTransport()
+    server = fakeredis.FakeServer()
+    return RedisTransport(fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server))
+
+def read(transport, consumer="c1", count=10, group="g"):
+    messages = decode_messages(transport.read_group(group, consumer, [STREAM], count))
+    return [(message_id, fields["n"]) for _, entries in messages for message_id, fields in entries]
+
+def fill(transport, n):
+    transport.create_group(STREAM, "g")
+    return [transport.add(STREAM, {"n": str(i)}) for i in range(n)]
+
+def test_create_group_once(transport):
+    assert transport.create_group(STREAM, "g")
+    assert not transport.create_group(STREAM, "g")
+
+def test_each_entry_is_delivered_once_per_group(transport):
+    ids = fill(transport, 3)
+    transport.create_group(STREAM, "other")
+
+    assert read(transport, "c1", count=2) == [(ids[0], "0"), (ids[1], "1")]
+    assert read(transport, "c2") == [(ids[2], "2")]
+    assert read(transport, "c1") == []
+    assert [n for _, n in read(transport, group="other")] == ["0", "1", "2"]
+
+def test_delivered_entries_stay_pending_until_acked(transport):
+    ids = fill(transport, 3)
+    read(transport, "c1", count=2)
+    read(transport, "c2")
+
+    pending = transport.pending(STREAM, "g")
+    assert [(p["message_id"], p["consumer"], p["times_delivered"]) for p in pending] == [
+        (ids[0], "c1", 1), (ids[1], "c1", 1), (ids[2], "c2", 1),
+    ]
+    assert [p["message_id"] for p in transport.pending(STREAM, "g", consumer="c2")] == [ids[2]]
+    assert [p["message_id"] for p in transport.pending(STREAM, "g", min=ids[1], max=ids[1])] == [ids[1]]
+
+    assert transport.ack(STREAM, "g", ids[0], ids[0]) == 1
+    assert [p["message_id"] for p in transport.pending(STREAM, "g")] == ids[1:]
+
+def test_claim_moves_idle_entries(transport):
+    ids = fill(transport, 3)
+    read(transport, "c1")
+
+    assert transport.claim(STREAM, "g", "c2", min_idle_ms=60000)[1] == []
+    cursor, claimed = transport.claim(STREAM, "g", "c2", min_idle_ms=0, start_id=ids[1], count=1)
+    assert [message_id for message_id, _ in decode_messages([(STREAM, claimed)])[0][1]] == [ids[1]]
+    assert (cursor.decode() if isinstance(cursor, bytes) else cursor) == ids[2]
+
+    owners = {p["message_id"]: (p["consumer"], p["times_delivered"]) for p in transport.pending(STREAM, "g")}
+    assert owners == {ids[0]: ("c1", 1), ids[1]: ("c2", 2), ids[2]: ("c1", 1)}
+
+def test_write_adds_and_acks(transport):
+    ids = fill(transport, 1)
+    transport.create_group("out", "g")
+    read(transport)
+
+    transport.write([("out", {"n": "x"})], {STREAM: [ids[0]]}, group="g")
+    assert transport.pending(STREAM, "g") == []
+    assert len(transport.read_group("g", "c1", ["out"], 10)[0][1]) == 1
+
+def test_reading_without_a_group_fails(transport):
+    transport.add(STREAM, {"n": "0"})
+    with pytest.raises(redis.exceptions.ResponseError):
+        transport.read_group("missing", "c1", [STREAM], 10)
+
+def test_delivery_counts_by_id(transport):
+    ids = fill(transport, 3)
+    read(transport, "c1")
+    transport.claim(STREAM, "g", "c2", min_idle_ms=0, start_id=ids[1], count=1)
+    transport.ack(STREAM, "g", ids[2])
+
+    assert transport.delivery_counts(STREAM, "g", ids) == {ids[0]: 1, ids[1]: 2}